@@ -0,0 +1,204 @@
+"""
+Local stand-ins for the backend's external services, plus synthetic data
+
+Everything here runs in-process: MongoDB is mongomock-motor (or a real local
+server via BENCH_MONGO_URL), SMTP is an aiosmtpd sink on 127.0.0.1, DNS is a
+stubbed resolver and the LLM is the `fake` content provider.
+"""
+
+import logging
+import os
+import random
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+TITLES = ["CEO", "CTO", "VP Sales", "Director of Marketing", "Engineer", "Analyst", "Head of Growth", "Consultant"]
+INDUSTRIES = ["Technology", "Finance", "Healthcare", "Education", "Marketing", "Other"]
+TIMEZONES = ["UTC", "America/New_York", "America/Los_Angeles", "Europe/London", "Europe/Berlin", "Asia/Kolkata"]
+
+
+def parse_scale(value: str) -> int:
+    value = value.strip().lower()
+    if value in SCALES:
+        return SCALES[value]
+    return int(value)
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ---------- synthetic data ----------
+
+def iter_leads(n: int, seed: int = 42, domains: int = 5000) -> Iterator[Dict[str, Any]]:
+    """Yield `n` synthetic leads; ~10% use unresolvable domains"""
+    rng = random.Random(seed)
+    for i in range(n):
+        d = rng.randrange(domains)
+        domain = f"company{d}.invalid" if d % 10 == 0 else f"company{d}.example.com"
+        yield {
+            "name": f"Lead {i}",
+            "email": f"lead{i}@{domain}",
+            "domain": domain,
+            "company": f"Company {d}",
+            "title": rng.choice(TITLES),
+            "industry": rng.choice(INDUSTRIES),
+            "linkedin_url": f"https://www.linkedin.com/in/lead-{i}" if rng.random() < 0.7 else None,
+        }
+
+
+def iter_contacts(n: int, seed: int = 42) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(seed)
+    for lead in iter_leads(n, seed=seed):
+        yield {
+            "name": lead["name"],
+            "email": lead["email"],
+            "company": lead["company"],
+            "title": lead["title"],
+            "linkedin_url": lead["linkedin_url"],
+            "timezone": rng.choice(TIMEZONES),
+        }
+
+
+def contacts_csv(n: int, seed: int = 42) -> bytes:
+    rows = ["name,email,company,title,linkedin_url,timezone"]
+    for c in iter_contacts(n, seed=seed):
+        rows.append(f"{c['name']},{c['email']},{c['company']},{c['title']},{c['linkedin_url'] or ''},{c['timezone']}")
+    return ("\n".join(rows) + "\n").encode("utf-8")
+
+
+def sequence_doc(sequence_id: str, contacts: List[Dict[str, Any]], steps: int = 3) -> Dict[str, Any]:
+    return {
+        "sequence_id": sequence_id,
+        "name": f"bench {sequence_id}",
+        "status": "active",
+        "contacts": contacts,
+        "steps": [
+            {
+                "step_id": f"{sequence_id}-step-{i}",
+                "type": "email",
+                "delay_days": 0 if i == 0 else 3,
+                "subject": "Idea for {company}",
+                "content": "Hi {name}, quick question about {company}.",
+                "send_time": "09:00",
+            }
+            for i in range(steps)
+        ],
+        "metrics": {"sent": 0, "opened": 0, "replied": 0, "positive": 0},
+    }
+
+
+# ---------- fake services ----------
+
+class StubResolver:
+    """Replaces dns.resolver.resolve: `.invalid` domains fail, others resolve"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.calls = 0
+
+    def __call__(self, domain: str, rdtype: str = "MX", *args, **kwargs):
+        import dns.resolver
+
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if domain.endswith(".invalid"):
+            raise dns.resolver.NXDOMAIN()
+        return [f"mx.{domain}"]
+
+
+class SmtpSink:
+    """aiosmtpd server that accepts any login and counts delivered messages"""
+
+    def __init__(self):
+        self.port = free_port()
+        self.received = 0
+        self._controller = None
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+    def start(self):
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.smtp import AuthResult
+
+        def accept_all(server, session, envelope, mechanism, auth_data):
+            return AuthResult(success=True)
+
+        self._controller = Controller(
+            self,
+            hostname="127.0.0.1",
+            port=self.port,
+            authenticator=accept_all,
+            auth_require_tls=False,
+        )
+        self._controller.start()
+        return self
+
+    def stop(self):
+        if self._controller is not None:
+            self._controller.stop()
+
+
+def configure_environment(smtp_port: Optional[int] = None, llm_latency_ms: float = 0.0):
+    """Point the backend at the local stand-ins; must run before importing `server`"""
+    if os.getenv("BENCH_MONGO_URL"):
+        os.environ["MONGO_URL"] = os.environ["BENCH_MONGO_URL"]
+    else:
+        os.environ.setdefault("MONGO_URL", "mongodb://127.0.0.1:27017")
+    os.environ["DB_NAME"] = os.getenv("BENCH_DB_NAME", "saasquatch_bench")
+    os.environ["AI_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(llm_latency_ms)
+    os.environ.pop("OPENAI_API_KEY", None)
+    os.environ.pop("GEMINI_API_KEY", None)
+    os.environ["SEND_SPREAD_MINUTES"] = "0"
+    if smtp_port is not None:
+        os.environ.update({
+            "DRY_RUN": "false",
+            "SMTP_HOST": "127.0.0.1",
+            "SMTP_PORT": str(smtp_port),
+            "SMTP_USER": "bench",
+            "SMTP_PASS": "bench",
+            "SMTP_FROM": "bench@example.com",
+            "SMTP_STARTTLS": "false",
+        })
+
+    if not os.getenv("BENCH_MONGO_URL"):
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+
+def load_server(resolver_latency_ms: float = 0.0):
+    """Import the FastAPI app with DNS stubbed; returns (server module, resolver)"""
+    import dns.resolver
+
+    resolver = StubResolver(resolver_latency_ms)
+    dns.resolver.resolve = resolver
+    import server
+
+    # per-message SMTP sink and dispatch logs would dominate the timings
+    logging.getLogger("mail.log").setLevel(logging.ERROR)
+    logging.getLogger("server").setLevel(logging.WARNING)
+
+    # unthrottled: the benchmark measures dispatch cost, not provider budgets
+    server.send_rate_limiter.configure({
+        "default_domain": {"rate_per_minute": 1e9, "burst": 1e9},
+        "account": {"rate_per_minute": 1e9, "burst": 1e9},
+        "domains": {d: None for d in list(server.send_rate_limiter.limits["domains"])},
+    })
+    return server, resolver
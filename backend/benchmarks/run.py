@@ -0,0 +1,290 @@
+"""
+Backend benchmark / load-test runner
+
+    cd backend
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.run run --scales 1k,100k --output bench.json
+    python -m benchmarks.run compare base.json bench.json
+    python -m benchmarks.run import-time
+
+Results are written as JSON so runs from different commits can be compared.
+"""
+
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import typer
+
+from benchmarks import harness
+
+app = typer.Typer(help="Reproducible backend benchmarks")
+
+BENCHMARKS = ("score_batch", "csv_upload", "enqueue", "scheduler")
+
+
+def _result(name: str, scale: int, seconds: float, ops: int, unit: str, **extra) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "scale": scale,
+        "seconds": round(seconds, 4),
+        "ops": ops,
+        "unit": unit,
+        "throughput": round(ops / seconds, 2) if seconds > 0 else None,
+        **extra,
+    }
+
+
+async def bench_score_batch(server, n: int, batch_size: int) -> Dict[str, Any]:
+    """POST /api/ai/score-leads-batch in chunks of `batch_size` leads"""
+    import httpx
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        chunk: List[Dict[str, Any]] = []
+        requests = 0
+        start = time.perf_counter()
+        for lead in harness.iter_leads(n):
+            chunk.append(lead)
+            if len(chunk) >= batch_size:
+                res = await http.post("/api/ai/score-leads-batch", json={"leads": chunk})
+                res.raise_for_status()
+                requests += 1
+                chunk = []
+        if chunk:
+            res = await http.post("/api/ai/score-leads-batch", json={"leads": chunk})
+            res.raise_for_status()
+            requests += 1
+        elapsed = time.perf_counter() - start
+    return _result("score_batch", n, elapsed, n, "leads/s", requests=requests, batch_size=batch_size)
+
+
+async def bench_csv_upload(server, n: int) -> Dict[str, Any]:
+    """POST /api/sequences/upload-csv and track peak Python heap during the request"""
+    import httpx
+
+    data = harness.contacts_csv(n)
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        tracemalloc.start()
+        start = time.perf_counter()
+        res = await http.post("/api/sequences/upload-csv", files={"file": ("contacts.csv", data, "text/csv")})
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    res.raise_for_status()
+    return _result(
+        "csv_upload", n, elapsed, n, "rows/s",
+        csv_mb=round(len(data) / 2**20, 2),
+        peak_mb=round(peak / 2**20, 2),
+    )
+
+
+async def bench_enqueue(server, n: int) -> Dict[str, Any]:
+    """enqueue_sequence_sends for one 3-step sequence with `n` contacts"""
+    sequence_id = f"bench-{uuid.uuid4()}"
+    seq = harness.sequence_doc(sequence_id, list(harness.iter_contacts(n)))
+    seq["started_at"] = datetime.now(timezone.utc).isoformat()
+    start = time.perf_counter()
+    stats = await server.enqueue_sequence_sends(seq)
+    elapsed = time.perf_counter() - start
+    items = await server.db.sequence_queue.count_documents({"sequence_id": sequence_id})
+    await server.db.sequence_queue.delete_many({"sequence_id": sequence_id})
+    await server.contact_claims.release_sequence(sequence_id)
+    return _result("enqueue", n, elapsed, items, "items/s", stats=stats)
+
+
+async def bench_scheduler(server, sink: harness.SmtpSink, n: int, batch_size: int) -> Dict[str, Any]:
+    """Drain `n` due email items through the scheduler into the local SMTP sink"""
+    sequence_id = f"bench-{uuid.uuid4()}"
+    due = (datetime.now(timezone.utc)).isoformat()
+    await server.db.sequences.insert_one(harness.sequence_doc(sequence_id, []))
+    docs = []
+    for c in harness.iter_contacts(n):
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "sequence_id": sequence_id,
+            "contact": c,
+            "step_id": f"{sequence_id}-step-0",
+            "channel": "email",
+            "subject": "Benchmark",
+            "content": "Hello from the benchmark",
+            "scheduled_at": due,
+            "status": "pending",
+            "email_norm": c["email"].lower(),
+        })
+        if len(docs) >= 10_000:
+            await server.db.sequence_queue.insert_many(docs)
+            docs = []
+    if docs:
+        await server.db.sequence_queue.insert_many(docs)
+
+    received_before = sink.received
+    iterations = 0
+    start = time.perf_counter()
+    while await server.run_scheduler_iteration(batch_size):
+        iterations += 1
+    elapsed = time.perf_counter() - start
+    sent = sink.received - received_before
+    await server.db.sequence_queue.delete_many({"sequence_id": sequence_id})
+    await server.db.sequences.delete_one({"sequence_id": sequence_id})
+    return _result("scheduler", n, elapsed, sent, "sends/s", iterations=iterations, batch_size=batch_size)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=harness.BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _run_all(
+    scales: List[int],
+    selected: List[str],
+    batch_size: int,
+    scheduler_batch: int,
+    scheduler_max: int,
+    dns_latency_ms: float,
+    llm_latency_ms: float,
+) -> List[Dict[str, Any]]:
+    sink = harness.SmtpSink().start() if "scheduler" in selected else None
+    harness.configure_environment(smtp_port=sink.port if sink else None, llm_latency_ms=llm_latency_ms)
+    server, resolver = harness.load_server(resolver_latency_ms=dns_latency_ms)
+    runners: Dict[str, Callable] = {
+        "score_batch": lambda n: bench_score_batch(server, n, batch_size),
+        "csv_upload": lambda n: bench_csv_upload(server, n),
+        "enqueue": lambda n: bench_enqueue(server, n),
+        "scheduler": lambda n: bench_scheduler(server, sink, min(n, scheduler_max), scheduler_batch),
+    }
+    results = []
+    try:
+        for name in selected:
+            for n in scales:
+                typer.echo(f"running {name} @ {n}", err=True)
+                results.append(await runners[name](n))
+    finally:
+        if sink:
+            sink.stop()
+    return results
+
+
+@app.command()
+def run(
+    scales: str = typer.Option("1k,100k", help="Comma separated: 1k, 10k, 100k, 1m or integers"),
+    only: Optional[str] = typer.Option(None, help=f"Comma separated subset of {', '.join(BENCHMARKS)}"),
+    output: Optional[Path] = typer.Option(None, help="Write JSON results here (default: stdout)"),
+    batch_size: int = typer.Option(1000, help="Leads per /score-leads-batch request"),
+    scheduler_batch: int = typer.Option(50, help="Items claimed per scheduler iteration"),
+    scheduler_max: int = typer.Option(10_000, help="Cap on scheduler items, SMTP is slow at 1M"),
+    dns_latency_ms: float = typer.Option(0.0, help="Simulated MX lookup latency"),
+    llm_latency_ms: float = typer.Option(0.0, help="Simulated fake-LLM latency"),
+    label: str = typer.Option("", help="Free-form label stored with the results"),
+):
+    """Run the benchmarks and emit machine-readable JSON"""
+    selected = [b.strip() for b in only.split(",")] if only else list(BENCHMARKS)
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        raise typer.BadParameter(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    scale_values = [harness.parse_scale(s) for s in scales.split(",") if s.strip()]
+    results = asyncio.run(_run_all(
+        scale_values, selected, batch_size, scheduler_batch, scheduler_max, dns_latency_ms, llm_latency_ms
+    ))
+    report = {
+        "meta": {
+            "label": label,
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "dns_latency_ms": dns_latency_ms,
+            "llm_latency_ms": llm_latency_ms,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, default=str)
+    if output:
+        output.write_text(text)
+        typer.echo(f"wrote {output}", err=True)
+    else:
+        typer.echo(text)
+
+
+def _import_times(module: str) -> Dict[str, int]:
+    """Cumulative import time (µs) per module from one `python -X importtime` run"""
+    env = dict(os.environ)
+    env.setdefault("MONGO_URL", "mongodb://127.0.0.1:27017")
+    env.setdefault("DB_NAME", "saasquatch_bench")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=harness.BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    times: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@app.command("import-time")
+def import_time(
+    module: str = typer.Option("server", help="Module to import cold"),
+    repeat: int = typer.Option(5, help="Fresh interpreters to run; the median is reported"),
+    top: int = typer.Option(10, help="Slowest imported modules to list"),
+    output: Optional[Path] = typer.Option(None, help="Write JSON results here (default: stdout)"),
+):
+    """Measure cold-start import time with `python -X importtime`"""
+    runs = [_import_times(module) for _ in range(repeat)]
+    totals = sorted(r.get(module, 0) for r in runs)
+    median = totals[len(totals) // 2]
+    slowest = sorted(runs[0].items(), key=lambda kv: kv[1], reverse=True)[1:top + 1]
+    report = {
+        "meta": {"git_commit": _git_commit(), "python": platform.python_version(), "module": module},
+        "results": [_result("import_time", 1, median / 1e6, 1, "imports/s", runs_us=totals)],
+        "slowest_modules_us": dict(slowest),
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        output.write_text(text)
+    else:
+        typer.echo(text)
+
+
+@app.command()
+def compare(
+    base: Path,
+    head: Path,
+    threshold: float = typer.Option(0.10, help="Relative throughput drop that counts as a regression"),
+):
+    """Compare two result files; exits non-zero if any throughput regressed past the threshold"""
+    base_rows = {(r["name"], r["scale"]): r for r in json.loads(base.read_text())["results"]}
+    head_rows = {(r["name"], r["scale"]): r for r in json.loads(head.read_text())["results"]}
+    regressed = False
+    typer.echo(f"{'benchmark':<14}{'scale':>10}{'base':>14}{'head':>14}{'change':>10}")
+    for key in sorted(base_rows.keys() & head_rows.keys()):
+        b, h = base_rows[key]["throughput"], head_rows[key]["throughput"]
+        if not b or not h:
+            continue
+        change = (h - b) / b
+        flag = ""
+        if change < -threshold:
+            regressed = True
+            flag = "  REGRESSION"
+        typer.echo(f"{key[0]:<14}{key[1]:>10}{b:>14.1f}{h:>14.1f}{change:>+10.1%}{flag}")
+    raise typer.Exit(code=1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    app()
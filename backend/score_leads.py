@@ -0,0 +1,279 @@
+"""
+Offline bulk lead scoring over CSV/Parquet
+
+Reads the input in fixed-size chunks, resolves each chunk's unique domains
+concurrently through a cache shared by the whole run, scores rows across a
+process pool and appends results to the output as it goes. A checkpoint file
+next to the output makes interrupted runs resumable.
+
+    python score_leads.py leads.csv scored.csv
+    python score_leads.py leads.parquet scored/ --chunk-size 200000 --workers 8
+"""
+
+import io
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import typer
+
+from services.ai_services import AILeadScoring
+
+logger = logging.getLogger("score_leads")
+
+cli = typer.Typer(help="Score a lead file offline with the lead scoring engine")
+
+SCORE_COLUMNS = ["confidence_score", "status", "confidence_reason", "breakdown"]
+
+_worker_scorer: Optional[AILeadScoring] = None
+
+
+def score_records(rows: List[Tuple], domain_valid: Dict[str, bool]) -> List[Tuple]:
+    """
+    Pure-CPU scoring of one slice; runs inside pool processes.
+    Rows are compact (email, domain, linkedin_url, title, company) tuples to keep
+    pickling cheap.
+    """
+    global _worker_scorer
+    if _worker_scorer is None:
+        _worker_scorer = AILeadScoring()
+    out = []
+    for email, domain, linkedin_url, title, company in rows:
+        result = _worker_scorer.calculate_confidence_score(
+            email=email,
+            domain=domain,
+            linkedin_url=linkedin_url,
+            title=title,
+            company=company,
+            domain_valid=domain_valid.get(domain, False) if domain else None,
+        )
+        out.append((
+            result["confidence_score"],
+            result["status"],
+            result["confidence_reason"],
+            json.dumps(result["breakdown"]),
+        ))
+    return out
+
+
+def _column(frame: pd.DataFrame, name: str) -> List[Optional[str]]:
+    if name not in frame.columns:
+        return [None] * len(frame)
+    return [v or None for v in frame[name].tolist()]
+
+
+def frame_rows(frame: pd.DataFrame) -> List[Tuple]:
+    emails = [e or "" for e in _column(frame, "email")]
+    domains = []
+    for email, domain in zip(emails, _column(frame, "domain")):
+        if not domain and "@" in email:
+            domain = email.rsplit("@", 1)[1]
+        domains.append((domain or "").strip().lower())
+    return list(zip(emails, domains, _column(frame, "linkedin_url"), _column(frame, "title"), _column(frame, "company")))
+
+
+class DomainCache:
+    """MX results shared across chunks; unseen domains are resolved concurrently"""
+
+    def __init__(self, concurrency: int):
+        self.scorer = AILeadScoring()
+        self.results: Dict[str, bool] = {}
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+
+    def resolve(self, domains) -> Dict[str, bool]:
+        missing = [d for d in set(domains) if d and d not in self.results]
+        for domain, ok in zip(missing, self.pool.map(self.scorer.verify_domain, missing)):
+            self.results[domain] = ok
+        return self.results
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+def _csv_records(f, limit: int) -> bytes:
+    """
+    Up to `limit` raw CSV records from binary file `f`. A line ends a record
+    only outside quotes, so quoted fields may span lines; an escaped quote
+    ("") flips the state twice and cancels out.
+    """
+    lines: List[bytes] = []
+    records = 0
+    quoted = False
+    while records < limit:
+        line = f.readline()
+        if not line:
+            break
+        lines.append(line)
+        if line.count(b'"') % 2:
+            quoted = not quoted
+        if not quoted:
+            records += 1
+    return b"".join(lines)
+
+
+def iter_chunks(path: Path, chunk_size: int, skip_rows: int, offset: int) -> Iterator[Tuple[pd.DataFrame, Optional[int]]]:
+    """
+    Chunks of the input, each with the CSV byte offset just past it (None
+    for Parquet). A CSV resumes by seeking to `offset`; Parquet skips
+    `skip_rows`.
+    """
+    if path.suffix.lower() in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+
+        source = pq.ParquetFile(path)
+        # whole row groups already done are never read
+        first_group = 0
+        while first_group < source.num_row_groups and source.metadata.row_group(first_group).num_rows <= skip_rows:
+            skip_rows -= source.metadata.row_group(first_group).num_rows
+            first_group += 1
+        row_groups = list(range(first_group, source.num_row_groups))
+        if not row_groups:
+            return
+        for batch in source.iter_batches(batch_size=chunk_size, row_groups=row_groups):
+            if skip_rows >= batch.num_rows:
+                skip_rows -= batch.num_rows
+                continue
+            frame = batch.slice(skip_rows).to_pandas()
+            skip_rows = 0
+            yield frame.where(frame.notna(), "").astype(str), None
+    else:
+        # record boundaries are found here, so finished rows are skipped by seeking, not parsing
+        with open(path, "rb") as f:
+            header = _csv_records(f, 1)
+            if offset:
+                f.seek(offset)
+            while True:
+                records = _csv_records(f, chunk_size)
+                if not records:
+                    return
+                frame = pd.read_csv(io.BytesIO(header + records), dtype=str, keep_default_na=False)
+                if len(frame):
+                    yield frame, f.tell()
+
+
+class OutputWriter:
+    """Appends scored chunks to one CSV file, or to Parquet part files in a directory"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.csv = path.suffix.lower() == ".csv"
+        if not self.csv:
+            path.mkdir(parents=True, exist_ok=True)
+
+    def position(self) -> int:
+        if self.csv:
+            return self.path.stat().st_size if self.path.exists() else 0
+        return len(list(self.path.glob("part-*.parquet")))
+
+    def rewind(self, position: int):
+        """Drop anything written after the last checkpoint"""
+        if self.csv:
+            if self.path.exists():
+                with open(self.path, "r+b") as f:
+                    f.truncate(position)
+        else:
+            for part in self.path.glob("part-*.parquet"):
+                if int(part.stem.split("-")[1]) >= position:
+                    part.unlink()
+
+    def write(self, frame: pd.DataFrame, chunk_index: int):
+        if self.csv:
+            header = not self.path.exists() or self.path.stat().st_size == 0
+            frame.to_csv(self.path, mode="a", header=header, index=False)
+        else:
+            frame.to_parquet(self.path / f"part-{chunk_index:05d}.parquet", index=False)
+
+
+def fresh_state(input_path: Path, chunk_size: int) -> Dict[str, Any]:
+    return {
+        "input": str(input_path.resolve()), "chunk_size": chunk_size,
+        "chunks_done": 0, "rows_done": 0, "input_offset": 0, "position": 0,
+    }
+
+
+def load_checkpoint(path: Path, input_path: Path, chunk_size: int) -> Dict[str, Any]:
+    if path.exists():
+        state = json.loads(path.read_text())
+        if state.get("input") == str(input_path.resolve()) and state.get("chunk_size") == chunk_size and "input_offset" in state:
+            return state
+        logger.warning("Checkpoint belongs to a different input, chunk size or format; starting over")
+    return fresh_state(input_path, chunk_size)
+
+
+def save_checkpoint(path: Path, state: Dict[str, Any]):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, path)
+
+
+@cli.command()
+def run(
+    input_path: Path = typer.Argument(..., exists=True, dir_okay=False, help="CSV or Parquet lead file"),
+    output_path: Path = typer.Argument(..., help="Output .csv file, or a directory for Parquet parts"),
+    chunk_size: int = typer.Option(100_000, help="Rows read, resolved and written per chunk"),
+    workers: int = typer.Option(os.cpu_count() or 1, help="Scoring processes (1 scores inline)"),
+    dns_concurrency: int = typer.Option(64, help="Concurrent MX lookups"),
+    resume: bool = typer.Option(True, help="Continue from the checkpoint if one exists"),
+):
+    """Score every row of INPUT_PATH and write results to OUTPUT_PATH"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    writer = OutputWriter(output_path)
+    checkpoint_path = Path(str(output_path).rstrip("/") + ".checkpoint.json")
+    state = load_checkpoint(checkpoint_path, input_path, chunk_size) if resume else fresh_state(input_path, chunk_size)
+    if state["chunks_done"]:
+        logger.info(f"Resuming after {state['rows_done']} rows ({state['chunks_done']} chunks)")
+    writer.rewind(state["position"])
+
+    domains = DomainCache(dns_concurrency)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    started = time.perf_counter()
+    rows_this_run = 0
+    try:
+        for frame, input_offset in iter_chunks(input_path, chunk_size, state["rows_done"], state["input_offset"]):
+            chunk_start = time.perf_counter()
+            rows = frame_rows(frame)
+            chunk_domains = {row[1] for row in rows if row[1]}
+            resolved = domains.resolve(chunk_domains)
+            domain_valid = {d: resolved[d] for d in chunk_domains}
+
+            if pool is None:
+                scored = score_records(rows, domain_valid)
+            else:
+                step = max(-(-len(rows) // workers), 1)
+                slices = [rows[i:i + step] for i in range(0, len(rows), step)]
+                scored = [row for part in pool.map(score_records, slices, [domain_valid] * len(slices)) for row in part]
+
+            frame = frame.assign(**{col: [row[i] for row in scored] for i, col in enumerate(SCORE_COLUMNS)})
+            writer.write(frame, state["chunks_done"])
+
+            state["chunks_done"] += 1
+            state["rows_done"] += len(frame)
+            state["input_offset"] = input_offset or 0
+            state["position"] = writer.position()
+            save_checkpoint(checkpoint_path, state)
+
+            rows_this_run += len(frame)
+            elapsed = time.perf_counter() - started
+            typer.echo(
+                f"chunk {state['chunks_done']}: {len(frame)} rows in {time.perf_counter() - chunk_start:.2f}s | "
+                f"total {state['rows_done']} rows | {rows_this_run / elapsed:,.0f} rows/s | "
+                f"{len(domains.results)} domains cached",
+                err=True,
+            )
+    finally:
+        domains.close()
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    rate = rows_this_run / elapsed if elapsed > 0 else 0.0
+    typer.echo(f"done: {state['rows_done']} rows scored, {rows_this_run} this run in {elapsed:.1f}s ({rate:,.0f} rows/s)", err=True)
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,7 +1,9 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 import os
 import logging
 from pathlib import Path
@@ -9,11 +11,39 @@ from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional, Dict, Any, Literal
 import uuid
 from datetime import datetime, timezone, timedelta, time as dt_time
-from services.ai_services import lead_scorer, engagement_predictor, content_generator
+from services.ai_services import (
+    ContentGenerator,
+    EngagementPredictor,
+    SubjectBodySplitter,
+    default_subject,
+    get_content_generator,
+    get_engagement_predictor,
+    get_lead_scorer,
+)
+from services.suppression import SuppressionIndex, ContactClaimIndex, normalize_email
+from services.rate_limit import SendRateLimiter, email_domain
+from services.scheduling import assign_send_slots
+from services.export import QueueExporter, csv_chunks, parquet_chunks
+from services.retry import classify_send_error, backoff_delay, TRANSIENT, PERMANENT
+from services.score_store import LeadScoreStore
+from services.enrichment import ENRICHED_FIELDS, DomainEnricher, normalize_domain
+from services.jobs import TERMINAL_STATUSES as JOB_TERMINAL_STATUSES, JobContext, JobManager
+from services.archive import QueueArchiver
+from services.events import EventHub, TrackerPoller, format_sse
+from services.directory import CompanyDirectory, PersonDirectory
+from services.streaming import iterate_in_thread
+from services.fair import FairScheduler, lag_percentiles
+from services.partitions import PartitionMembership
+from services.explain import ReplyExplainer
+from services.reply_model import ReplyModelRegistry, ReplyTrainer, reply_features
+from services.profiling import ProfileStore, ProfilingMiddleware, command_listener, folded, record as record_span
+from services import metrics
 import csv
-from io import StringIO
+import json
+from io import StringIO, TextIOWrapper
 import asyncio
 import smtplib
+import time
 from email.mime.text import MIMEText
 from contextlib import asynccontextmanager
 
@@ -21,11 +51,94 @@ from contextlib import asynccontextmanager
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Opt-in request profiling; when off neither the middleware nor the command listener is installed
+request_profiling = os.getenv("REQUEST_PROFILING", "false").lower() in ("1", "true", "yes")
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[command_listener()] if request_profiling else [])
 db = client[os.environ['DB_NAME']]
 
+# Suppression list and cross-sequence dedupe (in-memory, persisted in MongoDB)
+suppression_index = SuppressionIndex(db)
+contact_claims = ContactClaimIndex(db)
+dedupe_across_sequences = os.getenv("DEDUPE_ACROSS_SEQUENCES", "true").lower() in ("1", "true", "yes")
+
+# Per recipient-domain / per sending-account token buckets used by the scheduler
+send_rate_limiter = SendRateLimiter.from_env(os.getenv("SEND_RATE_LIMITS"))
+
+# Persisted lead scores; only the MX check expires and is recomputed on its own
+lead_score_store = LeadScoreStore(db, get_lead_scorer, mx_ttl_hours=float(os.getenv("MX_CHECK_TTL_HOURS", "168")))
+lead_score_refresh_seconds = float(os.getenv("LEAD_SCORE_REFRESH_SECONDS", "3600"))
+
+# MX + website status per domain, probed at most once per TTL and copied onto persons/companies
+domain_enricher = DomainEnricher(
+    db,
+    lambda domain: get_lead_scorer().verify_domain(domain),
+    ttl_hours=float(os.getenv("DOMAIN_ENRICH_TTL_HOURS", "24")),
+    concurrency=int(os.getenv("DOMAIN_PROBE_CONCURRENCY", "32")),
+    timeout_seconds=float(os.getenv("DOMAIN_PROBE_TIMEOUT_SECONDS", "5")),
+    connect_timeout_seconds=float(os.getenv("DOMAIN_PROBE_CONNECT_TIMEOUT_SECONDS", "3")),
+)
+domain_enrich_interval = float(os.getenv("DOMAIN_ENRICH_SECONDS", "3600"))
+
+# Sequence start / requeue run as tracked background jobs, inserting the queue in chunks
+job_manager = JobManager(db)
+enqueue_chunk_size = int(os.getenv("ENQUEUE_CHUNK_SIZE", "1000"))
+
+# Aged sent/failed/task items move to sequence_queue_archive so the hot queue stays small
+queue_archiver = QueueArchiver(
+    db,
+    archive_after_hours=float(os.getenv("QUEUE_ARCHIVE_AFTER_HOURS", "72")),
+    retention_days=float(os.getenv("QUEUE_ARCHIVE_RETENTION_DAYS", "365")),
+)
+queue_archive_interval = float(os.getenv("QUEUE_ARCHIVE_INTERVAL_SECONDS", "600"))
+
+# Live tracker updates: writers publish once, every SSE subscriber gets a copy
+tracker_events = EventHub(queue_size=int(os.getenv("TRACKER_STREAM_QUEUE_SIZE", "1000")))
+tracker_poller = TrackerPoller(db, tracker_events, interval_seconds=float(os.getenv("TRACKER_POLL_SECONDS", "2")))
+
+# Reply model trained online from reported outcomes; every process serves the newest promoted version
+reply_models = ReplyModelRegistry(db)
+reply_trainer = ReplyTrainer(
+    db,
+    reply_models,
+    window_days=float(os.getenv("REPLY_WINDOW_DAYS", "14")),
+    batch_size=int(os.getenv("REPLY_MODEL_BATCH_SIZE", "1000")),
+    holdout_pct=float(os.getenv("REPLY_MODEL_HOLDOUT_PCT", "10")),
+)
+reply_train_interval = float(os.getenv("REPLY_MODEL_TRAIN_SECONDS", "3600"))
+reply_refresh_interval = float(os.getenv("REPLY_MODEL_REFRESH_SECONDS", "60"))
+# Attributions behind each reply prediction, cached per model version and feature vector
+reply_explainer = ReplyExplainer(reply_models, cache_size=int(os.getenv("REPLY_EXPLAIN_CACHE_SIZE", "50000")))
+reply_explain_top_k = int(os.getenv("REPLY_EXPLAIN_TOP_K", "3"))
+
+# Streaming queue exports read this many items per cursor batch and write one chunk per batch
+queue_exporter = QueueExporter(db, batch_size=int(os.getenv("EXPORT_BATCH_SIZE", "5000")))
+EXPORT_MAX_BATCH_SIZE = 50000
+
+request_profiles = ProfileStore(db, retention_days=float(os.getenv("REQUEST_PROFILE_RETENTION_DAYS", "7")))
+
+# Company / person search; persons imported without a score go through the score store
+company_directory = CompanyDirectory(db.companies)
+person_directory = PersonDirectory(db.persons, companies=db.companies, scorer=lead_score_store.score_many)
+
+# Queue items are hash-partitioned by sequence; each scheduler process dispatches only the partitions it owns
+scheduler_partitions = PartitionMembership(
+    db,
+    partitions=int(os.getenv("SCHEDULER_PARTITIONS", "16")),
+    heartbeat_seconds=float(os.getenv("SCHEDULER_HEARTBEAT_SECONDS", "10")),
+    ttl_seconds=float(os.getenv("SCHEDULER_MEMBER_TTL_SECONDS", "45")),
+)
+
+# Scheduler batches are shared across sequences by priority instead of index order
+fair_scheduler = FairScheduler(
+    db,
+    refresh_seconds=float(os.getenv("SCHEDULER_FAIR_REFRESH_SECONDS", "5")),
+    partition_for=scheduler_partitions.partition_for,
+)
+scheduler_fairness = os.getenv("SCHEDULER_FAIRNESS", "true").lower() in ("1", "true", "yes")
+
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
@@ -57,7 +170,8 @@ class EngagementIndexRequest(BaseModel):
     role_seniority: str = "mid"
     industry_relevance: int = 5
     previous_reply_rate: float = 0.0
-    website_status: bool = True
+    website_status: Optional[bool] = None  # looked up from domain enrichment when omitted
+    domain: Optional[str] = None
 
 
 class ContentGenerationRequest(BaseModel):
@@ -75,6 +189,38 @@ class LeadBatchScoreRequest(BaseModel):
     leads: List[Dict[str, Any]]
 
 
+class SuppressionAddRequest(BaseModel):
+    emails: List[str]
+    reason: str = "manual"
+
+
+class DirectoryImportRequest(BaseModel):
+    items: List[Dict[str, Any]]
+
+
+class DomainEnrichRequest(BaseModel):
+    domains: List[str] = Field(..., max_length=1000)
+    refresh: bool = False  # probe again even if a result younger than the TTL exists
+
+
+class RedriveRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    sequence_ids: Optional[List[str]] = None
+    error_kind: Optional[Literal["transient", "permanent"]] = None
+    limit: Optional[int] = None
+
+
+class RateLimitBucketConfig(BaseModel):
+    rate_per_minute: float = Field(gt=0)
+    burst: float = Field(ge=1)
+
+
+class RateLimitUpdateRequest(BaseModel):
+    default_domain: Optional[RateLimitBucketConfig] = None
+    account: Optional[RateLimitBucketConfig] = None
+    domains: Optional[Dict[str, Optional[RateLimitBucketConfig]]] = None
+
+
 class SendTestEmailRequest(BaseModel):
     to: str
     subject: Optional[str] = None
@@ -88,6 +234,13 @@ class Contact(BaseModel):
     company: Optional[str] = None
     title: Optional[str] = None
     linkedin_url: Optional[str] = None
+    timezone: Optional[str] = None  # IANA name, e.g. "America/New_York"
+
+
+class SendWindow(BaseModel):
+    start: str = "09:00"  # HH:MM, local to each contact
+    end: str = "17:00"
+    days: List[int] = Field(default_factory=lambda: [0, 1, 2, 3, 4])  # Monday=0
 
 
 class Step(BaseModel):
@@ -104,6 +257,11 @@ class SequenceCreateRequest(BaseModel):
     name: str
     steps: List[Step]
     contacts: List[Contact]
+    timezone: Optional[str] = None  # default for contacts without one
+    send_window: Optional[SendWindow] = None
+    priority: int = Field(1, ge=1, le=100)  # scheduler weight relative to other sequences
+    max_in_flight: Optional[int] = Field(None, ge=1)  # cap on this sequence's share of one batch
+    owner: Optional[str] = None  # owners/workspaces share the scheduler equally
 
 
 class Sequence(BaseModel):
@@ -115,7 +273,13 @@ class Sequence(BaseModel):
     status: Literal["draft", "active", "paused", "completed"] = "draft"
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     started_at: Optional[datetime] = None
+    timezone: Optional[str] = None
+    send_window: Optional[SendWindow] = None
+    priority: int = 1
+    max_in_flight: Optional[int] = None
+    owner: Optional[str] = None
     metrics: Dict[str, int] = Field(default_factory=lambda: {"sent": 0, "opened": 0, "replied": 0, "positive": 0})
+    enqueue_job_id: Optional[str] = None  # latest start/requeue job, see GET /jobs/{id}
 
 
 class SequenceUpdateRequest(BaseModel):
@@ -123,6 +287,11 @@ class SequenceUpdateRequest(BaseModel):
     steps: Optional[List[Step]] = None
     contacts: Optional[List[Contact]] = None
     status: Optional[Literal["draft", "active", "paused", "completed"]] = None
+    timezone: Optional[str] = None
+    send_window: Optional[SendWindow] = None
+    priority: Optional[int] = Field(None, ge=1, le=100)
+    max_in_flight: Optional[int] = Field(None, ge=1)
+    owner: Optional[str] = None
 
 
 class GenerateStepsRequest(BaseModel):
@@ -164,63 +333,127 @@ async def get_status_checks():
 
 # AI Endpoints
 @api_router.post("/ai/score-lead")
-async def score_lead(request: LeadScoreRequest):
+@metrics.timed(metrics.AI_ROUTE_SECONDS["score-lead"])
+async def score_lead(request: LeadScoreRequest, refresh: bool = False, top_k: int = reply_explain_top_k):
     """
-    Calculate confidence score for a single lead
+    Calculate confidence score for a single lead; unchanged leads come from the score store
     """
     try:
-        result = lead_scorer.calculate_confidence_score(
-            email=request.email,
-            domain=request.domain,
-            linkedin_url=request.linkedin_url,
-            title=request.title,
-            company=request.company
-        )
-        return result
+        lead = request.model_dump()
+        result = await lead_score_store.score(lead, force=refresh)
+        return (await _with_reply_drivers([lead], [result], top_k))[0]
     except Exception as e:
         logger.error(f"Error scoring lead: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @api_router.post("/ai/score-leads-batch")
-async def score_leads_batch(request: LeadBatchScoreRequest):
+@metrics.timed(metrics.AI_ROUTE_SECONDS["score-leads-batch"])
+async def score_leads_batch(request: LeadBatchScoreRequest, refresh: bool = False, top_k: int = reply_explain_top_k):
     """
     Calculate confidence scores for multiple leads
     """
     try:
-        results = []
-        for lead in request.leads:
-            score_result = lead_scorer.calculate_confidence_score(
-                email=lead.get('email', ''),
-                domain=lead.get('domain', ''),
-                linkedin_url=lead.get('linkedin_url'),
-                title=lead.get('title'),
-                company=lead.get('company')
-            )
-            results.append({
-                **lead,
-                **score_result
-            })
-        return {"leads": results, "total": len(results)}
+        scores = await lead_score_store.score_many(request.leads, force=refresh)
+        results = [{**lead, **score_result} for lead, score_result in zip(request.leads, scores)]
+        return {"leads": await _with_reply_drivers(request.leads, results, top_k), "total": len(results), "reply_model_version": reply_models.version}
     except Exception as e:
         logger.error(f"Error in batch scoring: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class ReplyPredictionRequest(BaseModel):
+    leads: List[Dict[str, Any]]  # contact-like records: email, title, company, industry, linkedin_url, confidence_score
+    step_number: int = 1
+    channel: Literal["email", "linkedin", "manual"] = "email"
+
+
+async def _with_reply_drivers(leads: List[Dict[str, Any]], results: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """Attach reply probability and its top drivers to scoring results while a reply model is served"""
+    if top_k <= 0:
+        return results
+    # explained as a first touch; the fresh confidence score is itself a feature
+    rows = [
+        reply_features({**lead, "confidence_score": result.get("confidence_score")}, step_number=1)
+        for lead, result in zip(leads, results)
+    ]
+    # vectorizing and the attribution matmul are CPU-bound; keep them off the event loop
+    explained = await asyncio.to_thread(reply_explainer.explain, rows, top_k)
+    if explained is None:
+        return results
+    return [
+        {**result, "reply_probability": e["reply_probability"], "top_drivers": e["drivers"]}
+        for result, e in zip(results, explained)
+    ]
+
+
+@api_router.post("/ai/predict-reply")
+async def predict_reply(req: ReplyPredictionRequest, top_k: int = reply_explain_top_k):
+    """Reply probability from the online reply model, with the features that moved it most"""
+    rows = [reply_features(lead, req.step_number, req.channel) for lead in req.leads]
+    explained = await asyncio.to_thread(reply_explainer.explain, rows, top_k)
+    if explained is None:
+        raise HTTPException(status_code=503, detail="No reply model has been trained yet")
+    return {
+        "model_version": reply_models.version,
+        "predictions": [
+            {
+                "email": lead.get("email"),
+                "reply_probability": e["reply_probability"],
+                "base_value": e["base_value"],
+                "top_drivers": e["drivers"],
+                "rest": e["rest"],
+            }
+            for lead, e in zip(req.leads, explained)
+        ],
+    }
+
+
+@api_router.get("/ai/reply-model")
+async def reply_model_status():
+    versions = await db.reply_models.find({}, {"_id": 0, "model": 0, "baseline": 0, "vocabulary": 0}).sort("version", -1).to_list(20)
+    state = await db.reply_model_state.find_one({"_id": "trainer"}, {"_id": 0, "holder": 0, "lease_until": 0})
+    return {
+        "serving_version": reply_models.version,
+        "trainer": state,
+        "explanations": reply_explainer.stats(),
+        "versions": versions,
+    }
+
+
+@api_router.post("/ai/reply-model/train")
+async def train_reply_model():
+    """Run one labeling and training round now, as a tracked job, instead of waiting for the background loop"""
+    job = await job_manager.submit("reply_model_train", lambda ctx: reply_trainer.train_once())
+    return {"status": "queued", "job": job}
+
+
 @api_router.post("/ai/engagement-index")
-async def calculate_engagement(request: EngagementIndexRequest):
+@metrics.timed(metrics.AI_ROUTE_SECONDS["engagement-index"])
+async def calculate_engagement(
+    request: EngagementIndexRequest,
+    engagement_predictor: EngagementPredictor = Depends(get_engagement_predictor),
+):
     """
     Calculate engagement index for a lead
     """
     try:
+        website_status = request.website_status
+        enrichment = None
+        if website_status is None and request.domain:
+            # never wait on a live probe here; an uncached domain is probed in the background for later calls
+            enrichment = (await domain_enricher.enrich([request.domain], wait=False)).get(normalize_domain(request.domain))
+            website_status = enrichment["website_status"] if enrichment else None
         result = engagement_predictor.calculate_engagement_index(
             linkedin_activity=request.linkedin_activity,
             company_growth=request.company_growth,
             role_seniority=request.role_seniority,
             industry_relevance=request.industry_relevance,
             previous_reply_rate=request.previous_reply_rate,
-            website_status=request.website_status
+            website_status=True if website_status is None else website_status
         )
+        if enrichment:
+            result["enrichment"] = {k: enrichment.get(k) for k in (*ENRICHED_FIELDS, "checked_at")}
         return result
     except Exception as e:
         logger.error(f"Error calculating engagement: {e}")
@@ -228,7 +461,11 @@ async def calculate_engagement(request: EngagementIndexRequest):
 
 
 @api_router.post("/ai/generate-content")
-async def generate_content(request: ContentGenerationRequest):
+@metrics.timed(metrics.AI_ROUTE_SECONDS["generate-content"])
+async def generate_content(
+    request: ContentGenerationRequest,
+    content_generator: ContentGenerator = Depends(get_content_generator),
+):
     """
     Generate AI-powered outreach content
     """
@@ -249,6 +486,49 @@ async def generate_content(request: ContentGenerationRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@api_router.post("/ai/generate-content/stream")
+async def generate_content_stream(
+    request: ContentGenerationRequest,
+    content_generator: ContentGenerator = Depends(get_content_generator),
+):
+    """
+    Server-sent events version of generate-content: `subject` once, `content`
+    deltas as the provider streams, then `done` with the full result. If the
+    provider stalls or errors, a `fallback` event carries the template result
+    and the client should replace anything shown so far.
+    """
+    args = request.model_dump()
+    provider = content_generator.provider
+    first_timeout = float(os.getenv("LLM_STREAM_FIRST_TOKEN_SECONDS", "3"))
+    stall_timeout = float(os.getenv("LLM_STREAM_STALL_SECONDS", "5"))
+
+    @metrics.timed(metrics.AI_ROUTE_SECONDS["generate-content-stream"])
+    async def events():
+        splitter = SubjectBodySplitter(request.channel, default_subject(request.company, request.industry))
+        start = time.perf_counter()
+        first = True
+        try:
+            chunks = iterate_in_thread(lambda: content_generator.stream_email_content(**args), first_timeout, stall_timeout)
+            async for chunk in chunks:
+                if first:
+                    metrics.LLM_FIRST_TOKEN_SECONDS[provider].observe(time.perf_counter() - start)
+                    first = False
+                for event, text in splitter.feed(chunk):
+                    yield format_sse(event, {"text": text})
+            for event, text in splitter.finish():
+                yield format_sse(event, {"text": text})
+            metrics.LLM_SECONDS[provider].observe(time.perf_counter() - start)
+            record_span("llm", time.perf_counter() - start)
+            yield format_sse("done", {**splitter.result(request.tone), "provider": provider})
+        except Exception as e:
+            logger.warning(f"Streaming generation fell back to template ({provider}): {e}")
+            metrics.LLM_STREAM_FALLBACKS.inc()
+            result = content_generator.template_email_content(**args)
+            yield format_sse("fallback", {**result, "provider": "template", "reason": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 # Email send (immediate test)
 @api_router.post("/email/send-test")
 async def send_test_email(req: SendTestEmailRequest):
@@ -261,6 +541,226 @@ async def send_test_email(req: SendTestEmailRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ======= Scheduler Endpoints =======
+@api_router.get("/scheduler/rate-limits")
+async def get_rate_limits(limit: int = 100):
+    """This process's limits and its busiest buckets"""
+    return send_rate_limiter.snapshot(min(limit, 1000))
+
+
+@api_router.put("/scheduler/rate-limits")
+async def update_rate_limits(req: RateLimitUpdateRequest):
+    """Retune send rate limits live; takes effect on the next scheduler dispatch"""
+    send_rate_limiter.configure(req.model_dump(exclude_unset=True))
+    return send_rate_limiter.snapshot()
+
+
+@api_router.get("/scheduler/lag")
+async def get_scheduler_lag(limit: int = 20000):
+    """Tail latency (due-to-sent) per sequence over the most recent sends"""
+    lags = await recent_send_lags({}, min(limit, LAG_MAX_SAMPLES))
+    return {"sequences": {sid: lag_percentiles(values) for sid, values in lags.items()}}
+
+
+@api_router.get("/scheduler/members")
+async def get_scheduler_members():
+    """Scheduler processes and the queue partitions each one currently dispatches"""
+    return {"partitions": scheduler_partitions.partitions, "members": await scheduler_partitions.snapshot()}
+
+
+# ======= Profiling Endpoints =======
+@api_router.get("/admin/profiles")
+async def list_request_profiles(route: Optional[str] = None, min_ms: float = 0, limit: int = 50):
+    """Stored request captures, newest first, without their stacks"""
+    return {"enabled": request_profiling, "items": await request_profiles.list(route, min_ms, min(limit, 500))}
+
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def get_request_profile(profile_id: str):
+    doc = await request_profiles.get(profile_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return doc
+
+
+@api_router.get("/admin/profiles/{profile_id}/folded")
+async def download_request_profile(profile_id: str):
+    """Folded stacks for flamegraph.pl or speedscope"""
+    doc = await request_profiles.get(profile_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(
+        content=folded(doc),
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'},
+    )
+
+
+# ======= Suppression Endpoints =======
+@api_router.get("/suppression")
+async def suppression_stats():
+    return {"total": len(suppression_index)}
+
+
+@api_router.get("/suppression/check")
+async def check_suppression(email: str):
+    norm = normalize_email(email)
+    return {
+        "email": norm,
+        "suppressed": await suppression_index.check(norm),
+        "claimed_by": await contact_claims.current_owner(norm),
+    }
+
+
+@api_router.post("/suppression")
+async def add_suppression(req: SuppressionAddRequest):
+    added = await suppression_index.add_many(req.emails, reason=req.reason)
+    return {"added": added, "total": len(suppression_index)}
+
+
+@api_router.post("/suppression/import")
+async def import_suppression_list(file: UploadFile = File(...), reason: str = Form("import")):
+    """
+    Bulk import a suppression list (CSV with an `email` column, or one address per line).
+    The upload is streamed row by row and written in chunks, so lists with
+    millions of addresses never sit in memory as a whole.
+    """
+    def iter_emails():
+        text = TextIOWrapper(file.file, encoding="utf-8", errors="replace", newline="")
+        reader = csv.reader(text)
+        col = 0
+        for i, row in enumerate(reader):
+            if not row:
+                continue
+            if i == 0:
+                header = [h.strip().lower() for h in row]
+                if "email" in header:
+                    col = header.index("email")
+                    continue
+            if col < len(row) and "@" in row[col]:
+                yield row[col]
+
+    try:
+        added = await suppression_index.add_many(iter_emails(), reason=reason)
+    except Exception as e:
+        logger.error(f"Suppression import failed: {e}")
+        raise HTTPException(status_code=400, detail="Failed to import suppression list")
+    return {"added": added, "total": len(suppression_index)}
+
+
+@api_router.delete("/suppression/{email}")
+async def remove_suppression(email: str):
+    if not await suppression_index.remove(email):
+        raise HTTPException(status_code=404, detail="Email not suppressed")
+    return {"status": "removed", "email": normalize_email(email)}
+
+
+# ======= Company / Person Search =======
+def iter_csv_records(file: UploadFile):
+    """Stream an uploaded CSV as dicts with lowercased headers"""
+    text = TextIOWrapper(file.file, encoding="utf-8", errors="replace", newline="")
+    for row in csv.DictReader(text):
+        yield {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+
+
+@api_router.get("/companies")
+async def search_companies(
+    q: Optional[str] = None,
+    industry: Optional[str] = None,
+    country: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 25,
+):
+    """Full-text company search with industry/country facets"""
+    return await company_directory.search(q, {"industry": industry, "country": country}, page, page_size)
+
+
+@api_router.get("/companies/autocomplete")
+async def autocomplete_companies(prefix: str, limit: int = 10):
+    return {"items": company_directory.autocomplete(prefix, min(limit, 10))}
+
+
+@api_router.post("/companies/bulk")
+async def bulk_import_companies(req: DirectoryImportRequest):
+    return await company_directory.import_many(req.items)
+
+
+@api_router.post("/companies/import")
+async def import_companies_csv(file: UploadFile = File(...)):
+    """CSV with name, domain, industry, location, country, employee_count, revenue, description, confidence"""
+    try:
+        return await company_directory.import_many(iter_csv_records(file))
+    except Exception as e:
+        logger.error(f"Company import failed: {e}")
+        raise HTTPException(status_code=400, detail="Failed to import companies")
+
+
+@api_router.get("/companies/{company_id}")
+async def get_company(company_id: str):
+    company = await company_directory.get(company_id)
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found")
+    return company
+
+
+@api_router.get("/persons")
+async def search_persons(
+    q: Optional[str] = None,
+    industry: Optional[str] = None,
+    seniority: Optional[str] = None,
+    status: Optional[str] = None,
+    company_id: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 25,
+):
+    """Full-text person search with industry/seniority/confidence status facets"""
+    filters = {"industry": industry, "seniority": seniority, "confidence_status": status, "company_id": company_id}
+    return await person_directory.search(q, filters, page, page_size)
+
+
+@api_router.get("/persons/autocomplete")
+async def autocomplete_persons(prefix: str, limit: int = 10):
+    return {"items": person_directory.autocomplete(prefix, min(limit, 10))}
+
+
+@api_router.post("/persons/bulk")
+async def bulk_import_persons(req: DirectoryImportRequest):
+    return await person_directory.import_many(req.items)
+
+
+@api_router.post("/persons/import")
+async def import_persons_csv(file: UploadFile = File(...)):
+    """CSV with name, email, title, company, company_id, linkedin_url, phone, confidence_score"""
+    try:
+        return await person_directory.import_many(iter_csv_records(file))
+    except Exception as e:
+        logger.error(f"Person import failed: {e}")
+        raise HTTPException(status_code=400, detail="Failed to import persons")
+
+
+@api_router.get("/persons/{person_id}")
+async def get_person(person_id: str):
+    person = await person_directory.get(person_id)
+    if not person:
+        raise HTTPException(status_code=404, detail="Person not found")
+    return person
+
+
+@api_router.post("/enrichment/domains")
+async def enrich_domains(req: DomainEnrichRequest):
+    """MX and website status per domain, from the daily cache unless `refresh` is set"""
+    results = await domain_enricher.enrich(req.domains, force=req.refresh)
+    if req.refresh:
+        await domain_enricher.apply(results)
+    return {"domains": results}
+
+
+@api_router.post("/enrichment/run")
+async def run_enrichment():
+    """Enrich persons and companies whose domain has no current result, without waiting for the loop"""
+    return await domain_enricher.enrich_pending()
+
+
 # ======= Sequences Endpoints =======
 @api_router.post("/sequences/upload-csv")
 async def upload_contacts_csv(file: UploadFile = File(...)):
@@ -272,15 +772,25 @@ async def upload_contacts_csv(file: UploadFile = File(...)):
         f = StringIO(text)
         reader = csv.DictReader(f)
         contacts: List[Dict[str, Any]] = []
+        seen: set = set()
+        duplicates = 0
         for row in reader:
+            email = row.get("email") or row.get("Email")
+            norm = normalize_email(email)
+            if norm:
+                if norm in seen:
+                    duplicates += 1
+                    continue
+                seen.add(norm)
             contacts.append({
                 "name": row.get("name") or row.get("Name"),
-                "email": row.get("email") or row.get("Email"),
+                "email": email,
                 "company": row.get("company") or row.get("Company"),
                 "title": row.get("title") or row.get("Title"),
-                "linkedin_url": row.get("linkedin_url") or row.get("LinkedIn") or row.get("linkedin")
+                "linkedin_url": row.get("linkedin_url") or row.get("LinkedIn") or row.get("linkedin"),
+                "timezone": row.get("timezone") or row.get("Timezone") or row.get("tz"),
             })
-        return {"contacts": contacts, "count": len(contacts)}
+        return {"contacts": contacts, "count": len(contacts), "duplicates": duplicates}
     except Exception as e:
         logger.error(f"CSV parse error: {e}")
         raise HTTPException(status_code=400, detail="Failed to parse CSV")
@@ -332,7 +842,10 @@ async def generate_steps(req: GenerateStepsRequest):
 @api_router.post("/sequences")
 async def create_sequence(req: SequenceCreateRequest):
     try:
-        seq = Sequence(name=req.name, steps=req.steps, contacts=req.contacts)
+        seq = Sequence(
+            name=req.name, steps=req.steps, contacts=req.contacts, timezone=req.timezone, send_window=req.send_window,
+            priority=req.priority, max_in_flight=req.max_in_flight, owner=req.owner,
+        )
         doc = seq.model_dump()
         # serialize datetimes
         doc["created_at"] = doc["created_at"].isoformat()
@@ -389,14 +902,40 @@ async def start_sequence(sequence_id: str):
     )
     seq = await db.sequences.find_one({"sequence_id": sequence_id}, {"_id": 0})
     if seq:
-        try:
-            await enqueue_sequence_sends(seq)
-        except Exception as e:
-            logger.error(f"Failed to enqueue sends: {e}")
+        # the queue is built in the background; poll GET /jobs/{enqueue_job_id}
+        await start_enqueue_job(seq, "sequence_start")
     # return fresh
     return await get_sequence(sequence_id)
 
 
+class ReplyOutcome(BaseModel):
+    item_id: Optional[str] = None  # queue item; otherwise the latest send to `email` (optionally at `step_id`)
+    email: Optional[str] = None
+    step_id: Optional[str] = None
+    replied: bool = True
+    positive: bool = False
+
+
+class OutcomesRequest(BaseModel):
+    outcomes: List[ReplyOutcome]
+
+
+@api_router.post("/sequences/{sequence_id}/outcomes")
+async def record_outcomes(sequence_id: str, req: OutcomesRequest):
+    """Report replies (or confirmed non-replies) for sent items; they become reply model training labels"""
+    if not await db.sequences.find_one({"sequence_id": sequence_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Sequence not found")
+    stats = await reply_trainer.record_outcomes(sequence_id, [o.model_dump() for o in req.outcomes])
+    delta = {k: v for k, v in (("replied", stats["new_replies"]), ("positive", stats["new_positive"])) if v}
+    if delta:
+        await db.sequences.update_one(
+            {"sequence_id": sequence_id},
+            {"$inc": {f"metrics.{k}": v for k, v in delta.items()}, "$set": {"metrics_updated_at": datetime.now(timezone.utc).isoformat()}},
+        )
+        tracker_events.publish("metrics", {"sequence_id": sequence_id, "delta": delta})
+    return stats
+
+
 class ProgressUpdateRequest(BaseModel):
     sent: Optional[int] = None
     opened: Optional[int] = None
@@ -411,10 +950,17 @@ async def update_progress(sequence_id: str, req: ProgressUpdateRequest):
         raise HTTPException(status_code=404, detail="Sequence not found")
     metrics = seq.get("metrics", {"sent": 0, "opened": 0, "replied": 0, "positive": 0})
     data = req.model_dump(exclude_unset=True)
+    delta = {}
     for key in ["sent", "opened", "replied", "positive"]:
         if key in data and isinstance(data[key], int):
+            if data[key] != metrics.get(key, 0):
+                delta[key] = data[key] - int(metrics.get(key, 0) or 0)
             metrics[key] = data[key]
-    await db.sequences.update_one({"sequence_id": sequence_id}, {"$set": {"metrics": metrics}})
+    await db.sequences.update_one(
+        {"sequence_id": sequence_id}, {"$set": {"metrics": metrics, "metrics_updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    if delta:
+        tracker_events.publish("metrics", {"sequence_id": sequence_id, "delta": delta})
     return await get_sequence(sequence_id)
 
 
@@ -429,19 +975,269 @@ async def tracker_summary():
     return {"summary": agg, "sequences": items}
 
 
+@api_router.get("/tracker/stream")
+async def tracker_stream(sequence_id: Optional[str] = None):
+    """
+    Server-sent events: a `snapshot` of the summary, then `metrics` deltas and
+    `queue` status changes as they are written. `resync` means events were
+    dropped and the client should take the next snapshot by reconnecting.
+    """
+    async def events():
+        snapshot = await tracker_summary()
+        if sequence_id:
+            snapshot["sequences"] = [s for s in snapshot["sequences"] if s.get("sequence_id") == sequence_id]
+        yield format_sse("snapshot", snapshot)
+        async for item in tracker_events.subscribe(sequence_id):
+            if item is None:
+                yield ": keepalive\n\n"
+            else:
+                yield format_sse(*item)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+class SequencePlanRequest(BaseModel):
+    steps: List[Step]
+    contacts: List[Dict[str, Any]]  # plain dicts: validating a million Contact models would dominate the plan
+    timezone: Optional[str] = None
+    send_window: Optional[SendWindow] = None
+    started_at: Optional[datetime] = None  # defaults to now
+
+
+async def _plan(
+    sequence: Dict[str, Any],
+    started_at: datetime,
+    simulate: bool,
+    batch_size: Optional[int],
+    interval_seconds: Optional[float],
+    concurrency: Optional[int],
+    send_seconds: float,
+    workers: Optional[int],
+) -> Dict[str, Any]:
+    settings = None
+    if simulate:
+        if workers is None:
+            workers = sum(1 for m in await scheduler_partitions.snapshot() if m["live"]) or 1
+        settings = {
+            "batch_size": batch_size or int(os.getenv("SCHEDULER_BATCH_SIZE", "50")),
+            "interval_seconds": interval_seconds if interval_seconds is not None else float(os.getenv("SCHEDULER_INTERVAL_SECONDS", "30")),
+            "concurrency": concurrency or int(os.getenv("SCHEDULER_CONCURRENCY", "1")),
+            "send_seconds": send_seconds,
+            "workers": workers,
+        }
+    # numpy and pandas load on the first plan, not at startup
+    from services.planner import plan_sequence
+
+    # numpy/pandas work for large sequences; keep it off the event loop
+    return await asyncio.to_thread(
+        plan_sequence,
+        sequence.get("contacts") or [],
+        sequence.get("steps") or [],
+        started_at,
+        window=sequence.get("send_window"),
+        default_tz=sequence.get("timezone") or os.getenv("DEFAULT_TIMEZONE", "UTC"),
+        spread_minutes=int(os.getenv("SEND_SPREAD_MINUTES", "60")),
+        suppressed=suppression_index.emails,
+        claims=contact_claims.owners if dedupe_across_sequences else None,
+        sequence_id=sequence.get("sequence_id"),
+        simulate=settings,
+    )
+
+
+@api_router.post("/sequences/plan")
+async def plan_draft_sequence(
+    req: SequencePlanRequest,
+    simulate: bool = True,
+    batch_size: Optional[int] = None,
+    interval_seconds: Optional[float] = None,
+    concurrency: Optional[int] = None,
+    send_seconds: float = 0.5,
+    workers: Optional[int] = None,
+):
+    """Send timeline and scheduler load for steps + contacts that are not saved as a sequence"""
+    sequence = req.model_dump(exclude={"started_at"})
+    started_at = req.started_at or datetime.now(timezone.utc)
+    if started_at.tzinfo is None:
+        started_at = started_at.replace(tzinfo=timezone.utc)
+    return await _plan(sequence, started_at, simulate, batch_size, interval_seconds, concurrency, send_seconds, workers)
+
+
+@api_router.get("/sequences/{sequence_id}/plan")
+async def plan_sequence_sends(
+    sequence_id: str,
+    started_at: Optional[datetime] = None,
+    simulate: bool = True,
+    batch_size: Optional[int] = None,
+    interval_seconds: Optional[float] = None,
+    concurrency: Optional[int] = None,
+    send_seconds: float = 0.5,
+    workers: Optional[int] = None,
+):
+    """
+    Timeline the queue would have if the sequence started at `started_at` (default: its own
+    start if active, else now); nothing is written
+    """
+    seq = await db.sequences.find_one({"sequence_id": sequence_id}, {"_id": 0})
+    if not seq:
+        raise HTTPException(status_code=404, detail="Sequence not found")
+    if started_at is None:
+        started_at = seq.get("started_at") if seq.get("status") == "active" else None
+        started_at = datetime.fromisoformat(started_at) if isinstance(started_at, str) else started_at
+    started_at = started_at or datetime.now(timezone.utc)
+    if started_at.tzinfo is None:
+        started_at = started_at.replace(tzinfo=timezone.utc)
+    return await _plan(seq, started_at, simulate, batch_size, interval_seconds, concurrency, send_seconds, workers)
+
+
 @api_router.get("/sequences/{sequence_id}/queue")
-async def get_sequence_queue(sequence_id: str):
-    items = await db.sequence_queue.find({"sequence_id": sequence_id}, {"_id": 0}).sort("scheduled_at", 1).to_list(2000)
+async def get_sequence_queue(sequence_id: str, include_history: bool = False, limit: int = 2000):
+    items = await db.sequence_queue.find({"sequence_id": sequence_id}, {"_id": 0}).sort("scheduled_at", 1).to_list(limit)
+    if include_history:
+        # archived items are only read when asked for
+        items += await queue_archiver.history({"sequence_id": sequence_id}, limit)
+        items = sorted(items, key=lambda it: it.get("scheduled_at") or "")[:limit]
     return {"items": items, "total": len(items)}
 
 
+@api_router.get("/sequences/{sequence_id}/export")
+async def export_sequence_queue(
+    sequence_id: str,
+    format: Literal["csv", "parquet"] = "csv",
+    status: Optional[List[str]] = Query(None),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    date_field: Literal["scheduled_at", "sent_at"] = "scheduled_at",
+    step: Optional[int] = None,
+    include_history: bool = False,
+    batch_size: Optional[int] = None,
+):
+    """
+    Stream queue items as CSV or Parquet, ordered by scheduled_at; `status` may repeat,
+    `since`/`until` bound `date_field` (until is exclusive), `step` is the 1-based step number
+    """
+    if not await db.sequences.find_one({"sequence_id": sequence_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Sequence not found")
+
+    def iso(value: Optional[datetime]) -> Optional[str]:
+        if value is None:
+            return None
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).astimezone(timezone.utc).isoformat()
+
+    query = queue_exporter.query(sequence_id, status, iso(since), iso(until), date_field, step)
+    size = min(max(batch_size or queue_exporter.batch_size, 1), EXPORT_MAX_BATCH_SIZE)
+    batches = queue_exporter.batches(queue_exporter.rows(query, include_history, size), size)
+    if format == "parquet":
+        body, media_type = parquet_chunks(batches), "application/vnd.apache.parquet"
+    else:
+        body, media_type = csv_chunks(batches), "text/csv; charset=utf-8"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="sequence-{sequence_id}.{format}"'},
+    )
+
+
+LAG_MAX_SAMPLES = 50000
+
+
+async def recent_send_lags(query: Dict[str, Any], limit: int) -> Dict[str, List[float]]:
+    """
+    Due-to-sent lag in seconds of the most recent sends, grouped by sequence.
+    An equality on status keeps this a walk down the (status, sent_at) or
+    (sequence_id, status, sent_at) index; `$ne: None` could not use either.
+    """
+    lags: Dict[str, List[float]] = {}
+    cursor = db.sequence_queue.find(
+        {**query, "status": "sent"},
+        {"_id": 0, "sequence_id": 1, "scheduled_at": 1, "sent_at": 1},
+    ).sort("sent_at", -1).limit(min(max(limit, 1), LAG_MAX_SAMPLES))
+    async for it in cursor:
+        try:
+            lag = (datetime.fromisoformat(it["sent_at"]) - datetime.fromisoformat(it["scheduled_at"])).total_seconds()
+        except (KeyError, TypeError, ValueError):
+            continue
+        lags.setdefault(it["sequence_id"], []).append(max(lag, 0.0))
+    return lags
+
+
+@api_router.get("/sequences/{sequence_id}/lag")
+async def get_sequence_lag(sequence_id: str, limit: int = 5000):
+    lags = await recent_send_lags({"sequence_id": sequence_id}, limit)
+    return {"sequence_id": sequence_id, **lag_percentiles(lags.get(sequence_id, []))}
+
+
 @api_router.post("/sequences/{sequence_id}/requeue")
-async def rebuild_queue(sequence_id: str):
+async def rebuild_queue(sequence_id: str, rebuild: bool = False):
+    """
+    Retry the sequence's failed sends through dead-letter redrive. Only with
+    `rebuild=true` (after editing steps or contacts) is the whole queue rebuilt,
+    in a background job.
+    """
     seq = await db.sequences.find_one({"sequence_id": sequence_id}, {"_id": 0})
     if not seq:
         raise HTTPException(status_code=404, detail="Sequence not found")
-    await enqueue_sequence_sends(seq)
-    return {"status": "ok"}
+    if not rebuild:
+        return {"status": "ok", "redriven": await redrive_dead_letters({"sequence_id": sequence_id})}
+    job = await start_enqueue_job(seq, "sequence_requeue")
+    return {"status": "queued", "job": job}
+
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@api_router.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str):
+    """Server-sent events with the job document on every progress update"""
+    if not await job_manager.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for job in job_manager.watch(job_id):
+            yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@api_router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = await job_manager.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found or already finished")
+    return job
+
+
+@api_router.get("/sequences/{sequence_id}/dead-letters")
+async def get_sequence_dead_letters(sequence_id: str, limit: int = 500):
+    items = await db.sequence_dead_letters.find({"sequence_id": sequence_id}, {"_id": 0}).sort("failed_at", -1).to_list(limit)
+    return {"items": items, "total": len(items)}
+
+
+@api_router.post("/sequences/{sequence_id}/redrive")
+async def redrive_sequence(sequence_id: str, error_kind: Optional[Literal["transient", "permanent"]] = None):
+    """Retry this sequence's failed sends without rebuilding its queue"""
+    query: Dict[str, Any] = {"sequence_id": sequence_id}
+    if error_kind:
+        query["error_kind"] = error_kind
+    redriven = await redrive_dead_letters(query)
+    return {"status": "ok", "redriven": redriven}
+
+
+@api_router.post("/dead-letters/redrive")
+async def redrive_all(req: RedriveRequest):
+    query: Dict[str, Any] = {}
+    if req.ids:
+        query["id"] = {"$in": req.ids}
+    if req.sequence_ids:
+        query["sequence_id"] = {"$in": req.sequence_ids}
+    if req.error_kind:
+        query["error_kind"] = req.error_kind
+    redriven = await redrive_dead_letters(query, limit=req.limit)
+    return {"status": "ok", "redriven": redriven}
 
 
 @api_router.post("/sequences/{sequence_id}/pause")
@@ -475,8 +1271,12 @@ async def resume_sequence(sequence_id: str):
 @api_router.delete("/sequences/{sequence_id}")
 async def delete_sequence(sequence_id: str):
     # Delete the sequence and its queue entries
+    await job_manager.cancel_sequence(sequence_id)
     res = await db.sequences.delete_one({"sequence_id": sequence_id})
     await db.sequence_queue.delete_many({"sequence_id": sequence_id})
+    await db.sequence_queue_archive.delete_many({"sequence_id": sequence_id})
+    await db.sequence_dead_letters.delete_many({"sequence_id": sequence_id})
+    await contact_claims.release_sequence(sequence_id)
     if not res.deleted_count:
         raise HTTPException(status_code=404, detail="Sequence not found")
     return {"status": "deleted", "sequence_id": sequence_id}
@@ -485,6 +1285,12 @@ import asyncio
 
 # --- REPLACEMENT BLOCK: FastAPI lifespan, router, middleware, logging ---
 _scheduler_task = None
+_score_refresh_task = None
+_archive_task = None
+_tracker_poll_task = None
+_reply_train_task = None
+_reply_refresh_task = None
+_enrich_task = None
 
 # configure logging early so logger is available in lifespan
 logging.basicConfig(
@@ -493,6 +1299,60 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+scheduler_enabled = os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# A dispatched item is held as "sending" for this long; a scheduler that dies mid-send releases it when it expires
+send_lease_seconds = float(os.getenv("SCHEDULER_SEND_LEASE_SECONDS", "300"))
+
+# Scrapes within this many seconds of the last one reuse its queue depth counts
+queue_gauge_max_age = float(os.getenv("METRICS_QUEUE_MAX_AGE_SECONDS", "15"))
+
+# Liveness of the dispatch loop, shared with the standalone worker's health endpoint
+scheduler_state: Dict[str, Any] = {"iterations": 0, "last_iteration_at": None, "last_batch": 0, "partitions": 0, "draining": False}
+
+
+async def ensure_queue_indexes():
+    await db.sequence_queue.create_index("id")
+    await db.sequence_queue.create_index("email_norm")
+    await db.sequence_queue.create_index("sent_at", sparse=True)
+    await db.sequence_queue.create_index([("status", 1), ("scheduled_at", 1)])
+    # (status, sent_at) comes with the archiver's indexes
+    await db.sequence_queue.create_index([("sequence_id", 1), ("status", 1), ("sent_at", -1)])
+    await db.sequence_dead_letters.create_index("id", unique=True)
+    await db.sequence_dead_letters.create_index([("sequence_id", 1), ("failed_at", -1)])
+
+
+async def init_storage():
+    """
+    Create indexes and warm in-memory indexes; shared by the API and the worker.
+    Every step runs even when an earlier one failed, and a failure is logged
+    under the step's name.
+    """
+    steps = [
+        ("suppression indexes", suppression_index.ensure_indexes),
+        ("contact claim indexes", contact_claims.ensure_indexes),
+        ("lead score indexes", lead_score_store.ensure_indexes),
+        ("job indexes", job_manager.ensure_indexes),
+        ("archive indexes", queue_archiver.ensure_indexes),
+        ("fair scheduler indexes", fair_scheduler.ensure_indexes),
+        ("partition indexes", scheduler_partitions.ensure_indexes),
+        ("partition assignment", scheduler_partitions.assign_partitions),
+        ("reply model indexes", reply_models.ensure_indexes),
+        ("reply trainer indexes", reply_trainer.ensure_indexes),
+        ("domain enrichment indexes", domain_enricher.ensure_indexes),
+        ("tracker indexes", tracker_poller.ensure_indexes),
+        ("orphaned job sweep", job_manager.fail_orphaned),
+        ("queue indexes", ensure_queue_indexes),
+        ("suppression index load", suppression_index.load),
+        ("contact claim load", contact_claims.load),
+    ]
+    for name, step in steps:
+        try:
+            await step()
+        except Exception as e:
+            logger.exception(f"Storage setup failed at {name}: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -500,13 +1360,41 @@ async def lifespan(app: FastAPI):
     - Startup: create scheduler background task
     - Shutdown: cancel scheduler task and close DB client
     """
-    global _scheduler_task
+    global _scheduler_task, _score_refresh_task, _archive_task, _tracker_poll_task, _reply_train_task, _reply_refresh_task, _enrich_task
     # --- STARTUP work ---
+    await init_storage()
     try:
-        # start scheduler background task
-        if _scheduler_task is None or _scheduler_task.done():
+        await company_directory.ensure_indexes()
+        if request_profiling:
+            await request_profiles.ensure_indexes()
+        await person_directory.ensure_indexes()
+        await company_directory.load()
+        await person_directory.load()
+    except Exception as e:
+        logger.exception(f"Failed to load search indexes: {e}")
+    try:
+        await reply_models.refresh()
+    except Exception as e:
+        logger.error(f"Failed to load reply model: {e}")
+    try:
+        # start scheduler background task (disabled when a standalone worker does the sending)
+        if not scheduler_enabled:
+            logger.info("In-process scheduler disabled (SCHEDULER_ENABLED=false)")
+            # sends happen in the worker; one poller feeds this process's tracker streams
+            _tracker_poll_task = asyncio.create_task(tracker_poller.run_loop())
+        elif _scheduler_task is None or _scheduler_task.done():
             _scheduler_task = asyncio.create_task(scheduler_loop())
             logger.info("Scheduler task started")
+            if queue_archive_interval > 0:
+                _archive_task = asyncio.create_task(queue_archiver.run_loop(queue_archive_interval))
+            if reply_train_interval > 0:
+                _reply_train_task = asyncio.create_task(reply_trainer.run_loop(reply_train_interval))
+            if domain_enrich_interval > 0:
+                _enrich_task = asyncio.create_task(domain_enricher.run_loop(domain_enrich_interval))
+            if lead_score_refresh_seconds > 0:
+                _score_refresh_task = asyncio.create_task(lead_score_store.refresh_loop(lead_score_refresh_seconds))
+        if reply_refresh_interval > 0:
+            _reply_refresh_task = asyncio.create_task(reply_models.run_refresh_loop(reply_refresh_interval))
     except Exception as e:
         logger.exception(f"Error during startup: {e}")
     try:
@@ -527,6 +1415,20 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.exception(f"Failed to stop scheduler task: {e}")
 
+        try:
+            await job_manager.shutdown()
+        except Exception as e:
+            logger.exception(f"Failed to stop background jobs: {e}")
+
+        for task in (_score_refresh_task, _archive_task, _tracker_poll_task, _reply_train_task, _reply_refresh_task, _enrich_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        await domain_enricher.close()
+
         # close mongo client
         try:
             client.close()
@@ -541,6 +1443,25 @@ app = FastAPI(lifespan=lifespan)
 # include router and middleware
 app.include_router(api_router)
 
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    try:
+        await metrics.refresh_queue_gauges(db, queue_gauge_max_age)
+    except Exception as e:
+        logger.error(f"Failed to refresh queue gauges: {e}")
+    body, content_type = metrics.render_latest()
+    return Response(content=body, media_type=content_type)
+
+if request_profiling:
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=request_profiles,
+        sample_rate=float(os.getenv("REQUEST_PROFILE_SAMPLE_RATE", "0.01")),
+        slow_ms=float(os.getenv("REQUEST_PROFILE_SLOW_MS", "1000")),
+        interval_ms=float(os.getenv("REQUEST_PROFILE_INTERVAL_MS", "5")),
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -565,8 +1486,16 @@ class SequenceSend(BaseModel):
     content: Optional[str] = None
     scheduled_at: datetime
     sent_at: Optional[datetime] = None
-    status: Literal["pending", "sent", "failed", "task_created"] = "pending"
+    failed_at: Optional[datetime] = None
+    status: Literal["pending", "sending", "sent", "failed", "task_created", "suppressed"] = "pending"
     last_error: Optional[str] = None
+    email_norm: Optional[str] = None
+    step_number: Optional[int] = None  # 1-based position of the step, a reply model feature
+    final_step: bool = False  # the contact's claim is released once this item settles
+    rate_reserved: bool = False  # deferred with a rate-limit token already taken for its new slot
+    partition: Optional[int] = None  # crc32(sequence_id) % SCHEDULER_PARTITIONS
+    deferrals: int = 0
+    attempts: int = 0
 
 
 def render_template(text: Optional[str], contact: Dict[str, Any]) -> Optional[str]:
@@ -579,7 +1508,32 @@ def render_template(text: Optional[str], contact: Dict[str, Any]) -> Optional[st
     return out
 
 
-async def enqueue_sequence_sends(sequence: Dict[str, Any]):
+async def start_enqueue_job(sequence: Dict[str, Any], kind: str) -> Dict[str, Any]:
+    """Run enqueue_sequence_sends as a tracked job, replacing any enqueue already in flight"""
+    sequence_id = sequence["sequence_id"]
+    await job_manager.cancel_sequence(sequence_id)
+
+    async def on_cancel():
+        # a user cancel: keep what was already sent; drop the half-built remainder and pause
+        await db.sequence_queue.delete_many({"sequence_id": sequence_id, "status": "pending"})
+        await contact_claims.release_sequence(sequence_id)
+        await db.sequences.update_one({"sequence_id": sequence_id}, {"$set": {"status": "paused"}})
+
+    job = await job_manager.submit(
+        kind,
+        lambda ctx: enqueue_sequence_sends(sequence, ctx),
+        sequence_id=sequence_id,
+        on_cancel=on_cancel,
+    )
+    await db.sequences.update_one({"sequence_id": sequence_id}, {"$set": {"enqueue_job_id": job["id"]}})
+    return job
+
+
+async def enqueue_sequence_sends(sequence: Dict[str, Any], job: Optional[JobContext] = None):
+    """
+    Rebuild a sequence's queue. Items are inserted in chunks of ENQUEUE_CHUNK_SIZE,
+    step by step, so the scheduler can start on the earliest sends right away.
+    """
     sequence_id = sequence["sequence_id"]
     contacts = sequence.get("contacts", [])
     steps = sequence.get("steps", [])
@@ -591,40 +1545,104 @@ async def enqueue_sequence_sends(sequence: Dict[str, Any]):
 
     # remove existing queue for this sequence to avoid duplicates
     await db.sequence_queue.delete_many({"sequence_id": sequence_id})
+    await db.sequence_queue_archive.delete_many({"sequence_id": sequence_id})
+    await db.sequence_dead_letters.delete_many({"sequence_id": sequence_id})
+
+    # dedupe contacts by normalized email and drop suppressed recipients;
+    # contacts without an email (LinkedIn/manual only) are kept as-is
+    stats = {"duplicates": 0, "suppressed": 0, "claimed_elsewhere": 0}
+    # read from MongoDB: suppressions added on another replica count too
+    suppressed = await suppression_index.suppressed_among(normalize_email(c.get("email")) for c in contacts)
+    unique_contacts: List[Dict[str, Any]] = []
+    seen: set = set()
+    for c in contacts:
+        norm = normalize_email(c.get("email"))
+        if norm:
+            if norm in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(norm)
+            if norm in suppressed:
+                stats["suppressed"] += 1
+                continue
+        unique_contacts.append(c)
+    if dedupe_across_sequences:
+        # a contact may only be in one sequence at a time
+        claimable = [n for n in (normalize_email(c.get("email")) for c in unique_contacts) if n]
+        owned = await contact_claims.claim_many(claimable, sequence_id)
+        kept = []
+        for c in unique_contacts:
+            norm = normalize_email(c.get("email"))
+            if norm and norm not in owned:
+                stats["claimed_elsewhere"] += 1
+                continue
+            kept.append(c)
+        unique_contacts = kept
+    contacts = unique_contacts
+    stats["enqueued_contacts"] = len(contacts)
+
+    send_window = sequence.get("send_window")
+    default_tz = sequence.get("timezone") or os.getenv("DEFAULT_TIMEZONE", "UTC")
+    spread_minutes = int(os.getenv("SEND_SPREAD_MINUTES", "60"))
+
+    total = len(contacts) * len(steps)
+    done = 0
+    if job is not None:
+        await job.report(done, total, **stats)
 
     # build cumulative delays per step
     cumulative_days = 0
-    for step in steps:
+    for step_number, step in enumerate(steps, start=1):
         delay = int(step.get("delay_days", 0) or 0)
         cumulative_days += delay
-        step_time = step.get("send_time")  # e.g., "09:00"
-        sched_dt = started_at + timedelta(days=cumulative_days)
-        if step_time and isinstance(step_time, str) and len(step_time.split(":")) == 2:
-            try:
-                hh, mm = step_time.split(":")
-                sched_dt = sched_dt.replace(hour=int(hh), minute=int(mm), second=0, microsecond=0)
-            except Exception:
-                pass
-        # create a queue item per contact
+        # precompute every contact's slot for this step in one pass:
+        # send_time / send_window are local to each contact's timezone
+        slots = assign_send_slots(
+            contacts,
+            started_at,
+            cumulative_days,
+            send_time=step.get("send_time"),  # e.g., "09:00"
+            window=send_window,
+            default_tz=default_tz,
+            spread_minutes=spread_minutes,
+        )
+        # create a queue item per contact, flushed in chunks
         docs = []
-        for c in contacts:
+        for c, sched_dt in zip(contacts, slots):
             subject = render_template(step.get("subject"), c)
             content = render_template(step.get("content"), c)
             q = SequenceSend(
                 sequence_id=sequence_id,
                 contact=c,
                 step_id=step.get("step_id"),
+                step_number=step_number,
+                final_step=step_number == len(steps),
                 channel=step.get("type", "email"),
                 subject=subject,
                 content=content,
                 scheduled_at=sched_dt,
                 status="pending",
+                email_norm=normalize_email(c.get("email")) or None,
+                partition=scheduler_partitions.partition_for(sequence_id),
             )
             d = q.model_dump()
             d["scheduled_at"] = d["scheduled_at"].isoformat()
             docs.append(d)
+            if len(docs) >= enqueue_chunk_size:
+                done = await _insert_queue_chunk(docs, done, total, job)
+                docs = []
         if docs:
-            await db.sequence_queue.insert_many(docs)
+            done = await _insert_queue_chunk(docs, done, total, job)
+    return stats
+
+
+async def _insert_queue_chunk(docs: List[Dict[str, Any]], done: int, total: int, job: Optional[JobContext]) -> int:
+    await db.sequence_queue.insert_many(docs)
+    done += len(docs)
+    if job is not None:
+        await job.report(done, total)
+    await asyncio.sleep(0)  # let the scheduler and requests run between chunks
+    return done
 
 
 def get_smtp_config():
@@ -635,6 +1653,8 @@ def get_smtp_config():
         "password": os.getenv("SMTP_PASS", ""),
         "from_email": os.getenv("SMTP_FROM", os.getenv("SMTP_USER", "")),
         "dry_run": os.getenv("DRY_RUN", "true").lower() in ("1", "true", "yes"),
+        "starttls": os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes"),
+        "timeout": float(os.getenv("SMTP_TIMEOUT_SECONDS", "60")),
     }
 
 
@@ -649,48 +1669,370 @@ def send_email_smtp(to_email: str, subject: str, body: str) -> None:
     msg["Subject"] = subject
     msg["From"] = cfg["from_email"]
     msg["To"] = to_email
-    with smtplib.SMTP(cfg["host"], cfg["port"]) as server:
-        server.starttls()
+    start = time.perf_counter()
+    # bounded so a hung relay cannot outlive the item's send lease
+    with smtplib.SMTP(cfg["host"], cfg["port"], timeout=cfg["timeout"]) as server:
+        if cfg["starttls"]:
+            server.starttls()
         server.login(cfg["user"], cfg["password"])
+        connected = time.perf_counter()
+        metrics.SMTP_CONNECT_SECONDS.observe(connected - start)
         server.sendmail(cfg["from_email"], [to_email], msg.as_string())
+        metrics.SMTP_SEND_SECONDS.observe(time.perf_counter() - connected)
 
 
-async def scheduler_loop():
-    interval = int(os.getenv("SCHEDULER_INTERVAL_SECONDS", "30"))
-    while True:
-        try:
-            now = datetime.now(timezone.utc)
-            # pull due items
-            cursor = db.sequence_queue.find({
+def publish_queue_change(it: Dict[str, Any], status: str):
+    tracker_events.publish("queue", {
+        "id": it["id"],
+        "sequence_id": it.get("sequence_id"),
+        "step_id": it.get("step_id"),
+        "status": status,
+    })
+
+
+def get_retry_config():
+    return {
+        "max_attempts": int(os.getenv("SEND_MAX_ATTEMPTS", "5")),
+        "base_seconds": float(os.getenv("SEND_RETRY_BASE_SECONDS", "60")),
+        "max_seconds": float(os.getenv("SEND_RETRY_MAX_SECONDS", "21600")),
+    }
+
+
+async def dead_letter_item(it: Dict[str, Any], error: str, error_kind: str, now: datetime, attempts: Optional[int] = None):
+    """Mark a queue item failed and record it in the dead-letter collection"""
+    attempts = attempts if attempts is not None else int(it.get("attempts", 0) or 0)
+    failed_at = datetime.now(timezone.utc).isoformat()
+    await db.sequence_queue.update_one(
+        {"id": it["id"]},
+        {"$set": {"status": "failed", "last_error": error, "attempts": attempts, "failed_at": failed_at}}
+    )
+    await db.sequence_dead_letters.update_one(
+        {"id": it["id"]},
+        {"$set": {
+            "id": it["id"],
+            "sequence_id": it.get("sequence_id"),
+            "step_id": it.get("step_id"),
+            "channel": it.get("channel"),
+            "email_norm": it.get("email_norm"),
+            "error": error,
+            "error_kind": error_kind,
+            "attempts": attempts,
+            "failed_at": failed_at,
+        }},
+        upsert=True,
+    )
+    metrics.OUTCOMES["dead_lettered"].inc()
+    publish_queue_change(it, "failed")
+    await settle_contact(it)
+
+
+async def settle_contact(it: Dict[str, Any]):
+    """
+    After a contact's last step settles, release its claim so it can join another
+    sequence, and complete the sequence once nothing is left to send
+    """
+    if not it.get("final_step"):
+        return
+    sequence_id = it.get("sequence_id")
+    if dedupe_across_sequences and it.get("email_norm"):
+        await contact_claims.release(it["email_norm"], sequence_id)
+    live = await db.sequence_queue.find_one(
+        {"sequence_id": sequence_id, "status": {"$in": ["pending", "pending_paused", "sending"]}}, {"_id": 1}
+    )
+    if live is not None:
+        return
+    seq = await db.sequences.find_one({"sequence_id": sequence_id, "status": "active"}, {"_id": 0, "enqueue_job_id": 1})
+    if seq is None:
+        return
+    job = await job_manager.get(seq["enqueue_job_id"]) if seq.get("enqueue_job_id") else None
+    if job is not None and job["status"] not in JOB_TERMINAL_STATUSES:
+        # later chunks are still being inserted
+        return
+    res = await db.sequences.update_one({"sequence_id": sequence_id, "status": "active"}, {"$set": {"status": "completed"}})
+    if res.modified_count:
+        # contacts whose last item was never settled (e.g. removed) are released too
+        await contact_claims.release_sequence(sequence_id)
+        logger.info(f"Sequence {sequence_id} completed")
+
+
+async def retry_or_dead_letter(it: Dict[str, Any], exc: BaseException, now: datetime):
+    """Reschedule a transient failure with backoff, or dead-letter it"""
+    cfg = get_retry_config()
+    attempts = int(it.get("attempts", 0) or 0) + 1
+    kind = classify_send_error(exc)
+    if kind == TRANSIENT and attempts < cfg["max_attempts"]:
+        delay = backoff_delay(attempts, cfg["base_seconds"], cfg["max_seconds"])
+        await db.sequence_queue.update_one(
+            {"id": it["id"]},
+            {"$set": {
                 "status": "pending",
-                "scheduled_at": {"$lte": now.isoformat()}
-            }).limit(50)
-            items = await cursor.to_list(50)
-            for it in items:
+                "attempts": attempts,
+                "rate_reserved": False,
+                "last_error": str(exc),
+                "scheduled_at": (now + timedelta(seconds=delay)).isoformat(),
+            }}
+        )
+        metrics.OUTCOMES["retried"].inc()
+        return
+    await dead_letter_item(it, str(exc), kind, now, attempts=attempts)
+
+
+async def redrive_dead_letters(query: Dict[str, Any], limit: Optional[int] = None) -> int:
+    """
+    Move dead-lettered items matching `query` back to pending.
+    Only the dead-letter collection is scanned, so the cost is O(failed items).
+    """
+    now_iso = datetime.now(timezone.utc).isoformat()
+    redriven = 0
+    cursor = db.sequence_dead_letters.find(query, {"_id": 0, "id": 1}).batch_size(1000)
+    if limit:
+        cursor = cursor.limit(limit)
+    batch: List[str] = []
+    async for doc in cursor:
+        batch.append(doc["id"])
+        if len(batch) >= 1000:
+            redriven += await _redrive_batch(batch, now_iso)
+            batch = []
+    if batch:
+        redriven += await _redrive_batch(batch, now_iso)
+    return redriven
+
+
+async def _redrive_batch(ids: List[str], now_iso: str) -> int:
+    await queue_archiver.restore(ids)
+    # items archived before partitioning existed come back without one
+    await scheduler_partitions.assign_partitions({"id": {"$in": ids}})
+    res = await db.sequence_queue.update_many(
+        {"id": {"$in": ids}, "status": "failed"},
+        {"$set": {"status": "pending", "attempts": 0, "last_error": None, "failed_at": None, "scheduled_at": now_iso}}
+    )
+    await db.sequence_dead_letters.delete_many({"id": {"$in": ids}})
+    return res.modified_count
+
+
+async def record_sent(it: Dict[str, Any], now: datetime, attempts: int = 5):
+    """
+    Persist a send the provider accepted. Failures are retried as writes and
+    logged; they never reach retry_or_dead_letter, which would send it again.
+    If the status write still fails, the item stays `sending` until its lease
+    expires.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            # stamped at the write, not the iteration start, so tracker pollers see stamps in commit order
+            await db.sequence_queue.update_one({"id": it["id"]}, {"$set": {"status": "sent", "sent_at": datetime.now(timezone.utc).isoformat()}})
+            break
+        except Exception as e:
+            if attempt == attempts:
+                logger.error(f"Item {it['id']} was sent but could not be marked sent: {e}")
+                return
+            logger.warning(f"Marking item {it['id']} sent failed (attempt {attempt}): {e}")
+            await asyncio.sleep(backoff_delay(attempt, 0.2, 5.0))
+    metrics.OUTCOMES["sent"].inc()
+    publish_queue_change(it, "sent")
+    try:
+        await db.sequences.update_one({"sequence_id": it["sequence_id"]}, {"$inc": {"metrics.sent": 1}, "$set": {"metrics_updated_at": now.isoformat()}})
+        tracker_events.publish("metrics", {"sequence_id": it["sequence_id"], "delta": {"sent": 1}})
+        await settle_contact(it)
+    except Exception as e:
+        logger.error(f"Bookkeeping after sending item {it['id']} failed: {e}")
+
+
+async def dispatch_item(it: Dict[str, Any], now: datetime, send_account: str):
+    """Send (or turn into a task) one claimed queue item"""
+    try:
+        channel = it.get("channel")
+        if channel == "email":
+            to_email = (it.get("contact") or {}).get("email")
+            subj = it.get("subject") or ""
+            body = it.get("content") or ""
+            if to_email and await suppression_index.check(to_email):
+                await db.sequence_queue.update_one({"id": it["id"]}, {"$set": {"status": "suppressed", "last_error": "Recipient suppressed", "failed_at": datetime.now(timezone.utc).isoformat()}})
+                metrics.OUTCOMES["suppressed"].inc()
+                publish_queue_change(it, "suppressed")
+                await settle_contact(it)
+            elif to_email:
+                # a deferred item already holds the token for its slot
+                allowed, delay = (True, 0.0) if it.get("rate_reserved") else send_rate_limiter.acquire(email_domain(to_email), send_account)
+                if not allowed:
+                    # over budget: push into the reserved slot instead of failing
+                    next_at = (now + timedelta(seconds=delay)).isoformat()
+                    await db.sequence_queue.update_one(
+                        {"id": it["id"]},
+                        {"$set": {"status": "pending", "scheduled_at": next_at, "rate_reserved": True}, "$inc": {"deferrals": 1}},
+                    )
+                    metrics.OUTCOMES["deferred"].inc()
+                    return
+                scheduled_at = it.get("scheduled_at")
+                if isinstance(scheduled_at, str):
+                    metrics.SEND_LAG.observe(max((now - datetime.fromisoformat(scheduled_at)).total_seconds(), 0.0))
+                start = time.perf_counter()
                 try:
-                    channel = it.get("channel")
-                    if channel == "email":
-                        to_email = (it.get("contact") or {}).get("email")
-                        subj = it.get("subject") or ""
-                        body = it.get("content") or ""
-                        if to_email:
-                            send_email_smtp(to_email, subj, body)
-                            await db.sequence_queue.update_one({"id": it["id"]}, {"$set": {"status": "sent", "sent_at": now.isoformat()}})
-                            # increment metrics
-                            await db.sequences.update_one({"sequence_id": it["sequence_id"]}, {"$inc": {"metrics.sent": 1}})
-                        else:
-                            await db.sequence_queue.update_one({"id": it["id"]}, {"$set": {"status": "failed", "last_error": "No recipient email"}})
-                    elif channel in ("linkedin", "manual"):
-                        # create a task placeholder
-                        await db.sequence_queue.update_one({"id": it["id"]}, {"$set": {"status": "task_created", "sent_at": now.isoformat()}})
-                    else:
-                        await db.sequence_queue.update_one({"id": it["id"]}, {"$set": {"status": "failed", "last_error": f"Unknown channel {channel}"}})
+                    # blocking SMTP I/O runs off the event loop
+                    await asyncio.to_thread(send_email_smtp, to_email, subj, body)
                 except Exception as e:
                     logger.error(f"Send failed: {e}")
-                    await db.sequence_queue.update_one({"id": it["id"]}, {"$set": {"status": "failed", "last_error": str(e)}})
+                    await retry_or_dead_letter(it, e, now)
+                    return
+                sent = time.perf_counter()
+                metrics.SEND_SECONDS.observe(sent - start)
+                # the provider has the message; nothing after this may retry or dead-letter it
+                await record_sent(it, now)
+                metrics.UPDATE_SECONDS.observe(time.perf_counter() - sent)
+            else:
+                await dead_letter_item(it, "No recipient email", PERMANENT, now)
+        elif channel in ("linkedin", "manual"):
+            # create a task placeholder
+            await db.sequence_queue.update_one({"id": it["id"]}, {"$set": {"status": "task_created", "sent_at": datetime.now(timezone.utc).isoformat()}})
+            metrics.OUTCOMES["task_created"].inc()
+            publish_queue_change(it, "task_created")
+            await settle_contact(it)
+        else:
+            await dead_letter_item(it, f"Unknown channel {channel}", PERMANENT, now)
+    except Exception as e:
+        # everything before the provider call: suppression check, rate limiting, task writes
+        logger.error(f"Dispatch failed: {e}")
+        await retry_or_dead_letter(it, e, now)
+
+
+async def claim_item(it: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Atomically move a selected item from pending to sending. Returns the claimed
+    item, or None when another scheduler process claimed it first or its
+    partition is no longer ours.
+    """
+    try:
+        # heartbeats when one is due, so ownership is current for every send, not just the batch
+        owned = await scheduler_partitions.current()
+    except Exception as e:
+        logger.error(f"Scheduler heartbeat error: {e}")
+        owned = scheduler_partitions.owned
+    if not owned:
+        return None
+    query: Dict[str, Any] = {"id": it["id"], "status": "pending"}
+    if not scheduler_partitions.owns_all:
+        query["partition"] = {"$in": owned}
+    now = datetime.now(timezone.utc)
+    claimed = await db.sequence_queue.find_one_and_update(
+        query,
+        {"$set": {
+            "status": "sending",
+            "claimed_by": scheduler_partitions.member_id,
+            "lease_until": (now + timedelta(seconds=send_lease_seconds)).isoformat(),
+        }},
+        return_document=ReturnDocument.AFTER,
+    )
+    if claimed is None:
+        metrics.OUTCOMES["claim_lost"].inc()
+        return None
+    claimed.pop("_id", None)
+    return claimed
+
+
+async def release_expired_claims(now: datetime) -> int:
+    """Put items whose sender died mid-send back to pending"""
+    res = await db.sequence_queue.update_many(
+        {"status": "sending", "lease_until": {"$lt": now.isoformat()}},
+        {"$set": {"status": "pending"}},
+    )
+    if res.modified_count:
+        logger.warning(f"Released {res.modified_count} queue items with expired send leases")
+    return res.modified_count
+
+
+async def run_scheduler_iteration(batch_size: int = 50, concurrency: int = 1) -> int:
+    """Select one batch of due items, then claim and dispatch them one by one; returns the batch size"""
+    loop_start = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    await release_expired_claims(now)
+    owned = await scheduler_partitions.current()
+    scheduler_state["partitions"] = len(owned)
+    # pull due items from this process's partitions only
+    if not owned:
+        items = []
+    elif scheduler_fairness:
+        items = await fair_scheduler.select_batch(
+            batch_size, now.isoformat(), partitions=None if scheduler_partitions.owns_all else owned
+        )
+    else:
+        query: Dict[str, Any] = {"status": "pending", "scheduled_at": {"$lte": now.isoformat()}}
+        if not scheduler_partitions.owns_all:
+            query["partition"] = {"$in": owned}
+        items = await db.sequence_queue.find(query).limit(batch_size).to_list(batch_size)
+    metrics.CLAIM_SECONDS.observe(time.perf_counter() - loop_start)
+    metrics.BATCH_SIZE.observe(len(items))
+    send_account = get_smtp_config()["user"] or "default"
+
+    async def claim_and_dispatch(it):
+        # selection only read the items; the claim is what keeps two processes from sending one
+        claimed = await claim_item(it)
+        if claimed is not None:
+            await dispatch_item(claimed, now, send_account)
+
+    if concurrency <= 1:
+        for it in items:
+            await claim_and_dispatch(it)
+    else:
+        sem = asyncio.Semaphore(concurrency)
+
+        async def bounded(it):
+            async with sem:
+                await claim_and_dispatch(it)
+
+        await asyncio.gather(*(bounded(it) for it in items))
+    metrics.LOOP_SECONDS.observe(time.perf_counter() - loop_start)
+    scheduler_state["iterations"] += 1
+    scheduler_state["last_iteration_at"] = datetime.now(timezone.utc).isoformat()
+    scheduler_state["last_batch"] = len(items)
+    return len(items)
+
+
+async def scheduler_loop(
+    stop_event: Optional[asyncio.Event] = None,
+    batch_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    interval: Optional[float] = None,
+):
+    """
+    Dispatch due items until cancelled or until `stop_event` is set.
+    A set stop_event lets the in-flight batch finish (graceful drain).
+    """
+    interval = interval if interval is not None else int(os.getenv("SCHEDULER_INTERVAL_SECONDS", "30"))
+    batch_size = batch_size or int(os.getenv("SCHEDULER_BATCH_SIZE", "50"))
+    concurrency = concurrency or int(os.getenv("SCHEDULER_CONCURRENCY", "1"))
+    stop_event = stop_event or asyncio.Event()
+    try:
+        while not stop_event.is_set():
+            claimed = 0
+            try:
+                claimed = await run_scheduler_iteration(batch_size, concurrency)
+            except Exception as e:
+                logger.error(f"Scheduler loop error: {e}")
+            if claimed >= batch_size:
+                # a full batch means more is due; go again without sleeping
+                continue
+            await _idle_wait(stop_event, interval)
+    finally:
+        try:
+            await scheduler_partitions.leave()
         except Exception as e:
-            logger.error(f"Scheduler loop error: {e}")
-        await asyncio.sleep(interval)
+            logger.warning(f"Could not leave scheduler membership: {e}")
+
+
+async def _idle_wait(stop_event: asyncio.Event, interval: float):
+    """Sleep between polls, still heartbeating so partition ownership does not lapse"""
+    deadline = time.monotonic() + interval
+    while not stop_event.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=min(remaining, scheduler_partitions.heartbeat_seconds))
+        except asyncio.TimeoutError:
+            try:
+                await scheduler_partitions.current()
+            except Exception as e:
+                logger.error(f"Scheduler heartbeat error: {e}")
 
 
 # --- END REPLACEMENT BLOCK ---
\ No newline at end of file
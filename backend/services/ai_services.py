@@ -4,29 +4,52 @@ AI Services for Lead Scoring, Engagement Prediction, and Content Generation
 
 import os
 import re
-import validators
-import dns.resolver
-from typing import Dict, List, Optional
+import time
+import importlib.util
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
 import logging
 
+from services.metrics import DNS_SECONDS, LLM_SECONDS
+from services.profiling import record as record_span
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Try to import AI libraries (optional)
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+
+def _sdk_installed(name: str) -> bool:
+    """Check for an optional SDK without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+# AI libraries are optional and heavy (hundreds of ms to import); only their
+# presence is checked here, the modules are imported on first use.
+OPENAI_AVAILABLE = _sdk_installed("openai")
+GEMINI_AVAILABLE = _sdk_installed("google.generativeai")
+if not OPENAI_AVAILABLE:
     logger.warning("OpenAI not available")
+if not GEMINI_AVAILABLE:
+    logger.warning("Google Generative AI not available")
+
+
+@lru_cache(maxsize=None)
+def _openai_sdk():
+    """Import and configure the OpenAI SDK once"""
+    import openai
+    openai.api_key = os.getenv('OPENAI_API_KEY')
+    return openai
+
 
-try:
+@lru_cache(maxsize=None)
+def _gemini_sdk():
+    """Import and configure the Gemini SDK once"""
     import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-    logger.warning("Google Generative AI not available")
+    genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+    return genai
 
 
 class AILeadScoring:
@@ -35,12 +58,6 @@ class AILeadScoring:
     def __init__(self):
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
         self.gemini_api_key = os.getenv('GEMINI_API_KEY')
-        
-        if OPENAI_AVAILABLE and self.openai_api_key:
-            openai.api_key = self.openai_api_key
-            
-        if GEMINI_AVAILABLE and self.gemini_api_key:
-            genai.configure(api_key=self.gemini_api_key)
     
     def verify_email_format(self, email: str) -> bool:
         """Validate email format"""
@@ -49,6 +66,9 @@ class AILeadScoring:
     
     def verify_domain(self, domain: str) -> bool:
         """Verify if domain has valid DNS records"""
+        import dns.resolver
+
+        start = time.perf_counter()
         try:
             dns.resolver.resolve(domain, 'MX')
             return True
@@ -57,6 +77,9 @@ class AILeadScoring:
         except Exception as e:
             logger.error(f"Error verifying domain {domain}: {e}")
             return False
+        finally:
+            DNS_SECONDS.observe(time.perf_counter() - start)
+            record_span("dns", time.perf_counter() - start)
     
     def check_linkedin_validity(self, linkedin_url: str) -> bool:
         """Check if LinkedIn URL is valid"""
@@ -72,11 +95,15 @@ class AILeadScoring:
         domain: str,
         linkedin_url: Optional[str] = None,
         title: Optional[str] = None,
-        company: Optional[str] = None
+        company: Optional[str] = None,
+        domain_valid: Optional[bool] = None
     ) -> Dict:
         """
         Calculate confidence score for a lead
         
+        `domain_valid` may carry an MX check that was already resolved (e.g. from
+        a shared cache); the DNS lookup is only done when it is None.
+        
         Returns:
             {
                 "confidence_score": 0-100,
@@ -100,7 +127,9 @@ class AILeadScoring:
         
         # Domain verification (25 points)
         if domain:
-            if self.verify_domain(domain):
+            if domain_valid is None:
+                domain_valid = self.verify_domain(domain)
+            if domain_valid:
                 score += 25
                 reasons.append("Valid domain with MX records")
                 breakdown['domain_valid'] = 25
@@ -294,13 +323,12 @@ class ContentGenerator:
     def __init__(self):
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
         self.gemini_api_key = os.getenv('GEMINI_API_KEY')
-        self.use_openai = OPENAI_AVAILABLE and self.openai_api_key
-        self.use_gemini = GEMINI_AVAILABLE and self.gemini_api_key and not self.use_openai
-        
-        if self.use_openai:
-            openai.api_key = self.openai_api_key
-        elif self.use_gemini:
-            genai.configure(api_key=self.gemini_api_key)
+        # AI_PROVIDER=fake forces the offline stand-in provider (benchmarks, local dev)
+        self.use_fake = os.getenv('AI_PROVIDER', '').lower() == 'fake'
+        self.fake_latency = float(os.getenv('FAKE_LLM_LATENCY_MS', '0')) / 1000.0
+        self.fake_token_delay = float(os.getenv('FAKE_LLM_TOKEN_MS', '0')) / 1000.0
+        self.use_openai = OPENAI_AVAILABLE and self.openai_api_key and not self.use_fake
+        self.use_gemini = GEMINI_AVAILABLE and self.gemini_api_key and not self.use_openai and not self.use_fake
     
     def generate_email_content(
         self,
@@ -335,40 +363,30 @@ class ContentGenerator:
             }
         """
         
-        # Build the prompt
         first_name = recipient_name.split()[0] if recipient_name else "there"
-        
-        if channel == "email" and step_number == 1:
-            prompt = self._build_initial_email_prompt(
-                first_name, company, role, industry, product_info, tone
-            )
-            max_words = 90
-        elif channel == "linkedin":
-            prompt = self._build_linkedin_prompt(
-                first_name, company, role, industry, product_info, tone
-            )
-            max_words = 300  # characters actually
-        elif channel == "follow-up":
-            prompt = self._build_followup_prompt(
-                first_name, company, product_info, tone
-            )
-            max_words = 70
-        else:
-            prompt = self._build_initial_email_prompt(
-                first_name, company, role, industry, product_info, tone
-            )
-            max_words = 90
+        prompt = self._build_prompt(first_name, company, role, industry, product_info, tone, channel, step_number)
         
         # Generate content using available AI
+        start = time.perf_counter()
         if self.use_openai:
+            provider = "openai"
             content = self._generate_with_openai(prompt)
         elif self.use_gemini:
+            provider = "gemini"
             content = self._generate_with_gemini(prompt)
+        elif self.use_fake:
+            provider = "fake"
+            content = self._generate_with_fake(
+                first_name, company, role, product_info, channel, step_number
+            )
         else:
             # Fallback to template-based generation
+            provider = "template"
             content = self._generate_template_based(
                 first_name, company, role, product_info, channel, step_number
             )
+        LLM_SECONDS[provider].observe(time.perf_counter() - start)
+        record_span("llm", time.perf_counter() - start)
         
         # Extract subject and body for email
         if channel == "email":
@@ -376,7 +394,7 @@ class ContentGenerator:
                 subject, body = content.split("\n\n", 1)
                 subject = subject.replace("Subject:", "").strip()
             else:
-                subject = f"Quick question about {company}'s {industry} strategy"
+                subject = default_subject(company, industry)
                 body = content
         else:
             subject = ""
@@ -389,6 +407,68 @@ class ContentGenerator:
             "tone": tone
         }
     
+    @property
+    def provider(self) -> str:
+        if self.use_openai:
+            return "openai"
+        if self.use_gemini:
+            return "gemini"
+        if self.use_fake:
+            return "fake"
+        return "template"
+    
+    def _build_prompt(self, first_name, company, role, industry, product_info, tone, channel, step_number) -> str:
+        if channel == "linkedin":
+            return self._build_linkedin_prompt(first_name, company, role, industry, product_info, tone)
+        if channel == "follow-up":
+            return self._build_followup_prompt(first_name, company, product_info, tone)
+        return self._build_initial_email_prompt(first_name, company, role, industry, product_info, tone)
+    
+    def stream_email_content(
+        self,
+        recipient_name: str,
+        company: str,
+        role: str,
+        industry: str,
+        product_info: str,
+        tone: str = "professional",
+        channel: str = "email",
+        step_number: int = 1
+    ) -> Iterator[str]:
+        """
+        Yield raw text chunks from the provider as they arrive (blocking iterator).
+        Feed them to SubjectBodySplitter to get subject/body incrementally.
+        """
+        first_name = recipient_name.split()[0] if recipient_name else "there"
+        prompt = self._build_prompt(first_name, company, role, industry, product_info, tone, channel, step_number)
+        provider = self.provider
+        if provider == "openai":
+            yield from self._stream_with_openai(prompt)
+        elif provider == "gemini":
+            yield from self._stream_with_gemini(prompt)
+        elif provider == "fake":
+            yield from self._stream_with_fake(first_name, company, role, product_info, channel, step_number)
+        else:
+            yield self._generate_template_based(first_name, company, role, product_info, channel, step_number)
+    
+    def template_email_content(
+        self,
+        recipient_name: str,
+        company: str,
+        role: str,
+        industry: str,
+        product_info: str,
+        tone: str = "professional",
+        channel: str = "email",
+        step_number: int = 1
+    ) -> Dict:
+        """Template-only result in the generate_email_content shape (stream fallback)"""
+        first_name = recipient_name.split()[0] if recipient_name else "there"
+        splitter = SubjectBodySplitter(channel, default_subject(company, industry))
+        splitter.feed(self._generate_template_based(first_name, company, role, product_info, channel, step_number))
+        splitter.finish()
+        return splitter.result(tone)
+    
     def _build_initial_email_prompt(self, name, company, role, industry, product, tone):
         tone_desc = {
             "friendly": "warm and conversational",
@@ -431,6 +511,7 @@ Keep it {tone}."""
     def _generate_with_openai(self, prompt: str) -> str:
         """Generate content using OpenAI GPT"""
         try:
+            openai = _openai_sdk()
             response = openai.chat.completions.create(
                 model="gpt-4",
                 messages=[
@@ -448,6 +529,7 @@ Keep it {tone}."""
     def _generate_with_gemini(self, prompt: str) -> str:
         """Generate content using Google Gemini"""
         try:
+            genai = _gemini_sdk()
             model = genai.GenerativeModel('gemini-pro')
             response = model.generate_content(prompt)
             return response.text.strip()
@@ -455,6 +537,45 @@ Keep it {tone}."""
             logger.error(f"Gemini generation error: {e}")
             return self._generate_fallback_content(prompt)
     
+    def _stream_with_openai(self, prompt: str) -> Iterator[str]:
+        openai = _openai_sdk()
+        stream = openai.chat.completions.create(
+            model="gpt-4",
+            messages=[
+                {"role": "system", "content": "You are an expert sales copywriter specializing in B2B outreach."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            max_tokens=300,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    def _stream_with_gemini(self, prompt: str) -> Iterator[str]:
+        genai = _gemini_sdk()
+        model = genai.GenerativeModel('gemini-pro')
+        for chunk in model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+    
+    def _stream_with_fake(self, name, company, role, product, channel, step) -> Iterator[str]:
+        """Fake provider streaming word by word: FAKE_LLM_LATENCY_MS to the first token, FAKE_LLM_TOKEN_MS per token"""
+        if self.fake_latency:
+            time.sleep(self.fake_latency)
+        text = self._generate_template_based(name, company, role, product, channel, step)
+        for i, token in enumerate(re.findall(r"\S+\s*|\s+", text)):
+            if i and self.fake_token_delay:
+                time.sleep(self.fake_token_delay)
+            yield token
+    
+    def _generate_with_fake(self, name, company, role, product, channel, step):
+        """Offline stand-in for an LLM: template output after a simulated latency"""
+        if self.fake_latency:
+            time.sleep(self.fake_latency)
+        return self._generate_template_based(name, company, role, product, channel, step)
+    
     def _generate_template_based(self, name, company, role, product, channel, step):
         """Fallback template-based generation"""
         if channel == "email" and step == 1:
@@ -501,7 +622,86 @@ Would you be open to a brief conversation?
 Best regards"""
 
 
-# Singleton instances
-lead_scorer = AILeadScoring()
-engagement_predictor = EngagementPredictor()
-content_generator = ContentGenerator()
+def default_subject(company: str, industry: str) -> str:
+    return f"Quick question about {company}'s {industry} strategy"
+
+
+class SubjectBodySplitter:
+    """
+    Incremental version of generate_email_content's subject/body split.
+    For email, text up to the first blank line is the subject; once that is
+    seen every further chunk is body and is passed straight through. If no
+    blank line shows up within MAX_SUBJECT_CHARS the text is treated as body
+    and the default subject is used.
+    """
+    
+    MAX_SUBJECT_CHARS = 300
+    
+    def __init__(self, channel: str, fallback_subject: str):
+        self.channel = channel
+        self.fallback_subject = fallback_subject
+        self.subject = "" if channel != "email" else None
+        self._buffer = ""
+        self._body: List[str] = []
+    
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        """Returns ("subject" | "content", text) events for this chunk"""
+        if self.subject is not None:
+            self._body.append(text)
+            return [("content", text)]
+        self._buffer += text
+        if "\n\n" in self._buffer:
+            head, rest = self._buffer.split("\n\n", 1)
+            return self._start_body(head.replace("Subject:", "").strip(), rest)
+        if len(self._buffer) > self.MAX_SUBJECT_CHARS:
+            return self._start_body(self.fallback_subject, self._buffer)
+        return []
+    
+    def finish(self) -> List[Tuple[str, str]]:
+        if self.subject is None:
+            return self._start_body(self.fallback_subject, self._buffer)
+        return []
+    
+    def _start_body(self, subject: str, rest: str) -> List[Tuple[str, str]]:
+        self.subject = subject
+        self._buffer = ""
+        events = [("subject", subject)]
+        if rest:
+            self._body.append(rest)
+            events.append(("content", rest))
+        return events
+    
+    def result(self, tone: str) -> Dict:
+        body = "".join(self._body)
+        return {"subject": self.subject or "", "content": body, "length": len(body), "tone": tone}
+
+
+# Singleton accessors (also usable as FastAPI dependencies); built on first use
+@lru_cache(maxsize=None)
+def get_lead_scorer() -> AILeadScoring:
+    return AILeadScoring()
+
+
+@lru_cache(maxsize=None)
+def get_engagement_predictor() -> EngagementPredictor:
+    return EngagementPredictor()
+
+
+@lru_cache(maxsize=None)
+def get_content_generator() -> ContentGenerator:
+    return ContentGenerator()
+
+
+_SINGLETONS = {
+    "lead_scorer": get_lead_scorer,
+    "engagement_predictor": get_engagement_predictor,
+    "content_generator": get_content_generator,
+}
+
+
+def __getattr__(name):
+    # keeps `from services.ai_services import lead_scorer` working, lazily
+    if name in _SINGLETONS:
+        return _SINGLETONS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
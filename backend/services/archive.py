@@ -0,0 +1,110 @@
+"""
+Hot/cold split of the send queue
+
+Terminal queue items (sent, failed, task_created, suppressed) are moved in
+bulk from `sequence_queue` to `sequence_queue_archive` once they finished
+longer than a configurable age ago, so the scheduler's indexes only cover
+live work. Age runs from `sent_at` for sent items and tasks and from
+`failed_at` for failed and suppressed ones, not from `scheduled_at`: an item
+retried or deferred for days is not archived the moment it settles.
+Archived items expire through a TTL index on `archived_at`.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from services.suppression import DUPLICATE_KEY_ERROR
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ["sent", "failed", "task_created", "suppressed"]
+SENT_STATUSES = ["sent", "task_created"]
+FAILED_STATUSES = ["failed", "suppressed"]
+
+
+class QueueArchiver:
+    """Moves aged terminal items out of the hot queue and reads them back for history"""
+
+    def __init__(self, db, archive_after_hours: float = 72, retention_days: float = 365, batch_size: int = 1000):
+        self.hot = db.sequence_queue
+        self.archive = db.sequence_queue_archive
+        self.archive_after = timedelta(hours=archive_after_hours)
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+
+    async def ensure_indexes(self):
+        await self.hot.create_index([("status", 1), ("sent_at", 1)])
+        await self.hot.create_index([("status", 1), ("failed_at", 1)])
+        await self.archive.create_index("id", unique=True)
+        await self.archive.create_index([("sequence_id", 1), ("scheduled_at", 1)])
+        await self.archive.create_index("sent_at", sparse=True)
+        if self.retention_days > 0:
+            # TTL needs a BSON date, so archived_at is stored as datetime, not ISO text
+            await self.archive.create_index("archived_at", expireAfterSeconds=int(self.retention_days * 86400))
+
+    async def archive_batch(self, now: Optional[datetime] = None) -> int:
+        """Move one batch of aged terminal items; returns how many were moved"""
+        now = now or datetime.now(timezone.utc)
+        cutoff = (now - self.archive_after).isoformat()
+        # each branch is a range on (status, sent_at) or (status, failed_at)
+        aged = {"$or": [
+            {"status": {"$in": SENT_STATUSES}, "sent_at": {"$lt": cutoff}},
+            {"status": {"$in": FAILED_STATUSES}, "failed_at": {"$lt": cutoff}},
+            # finished before failed_at was recorded
+            {"status": {"$in": FAILED_STATUSES}, "failed_at": None, "scheduled_at": {"$lt": cutoff}},
+        ]}
+        docs = await self.hot.find(aged, {"_id": 0}).limit(self.batch_size).to_list(self.batch_size)
+        if not docs:
+            return 0
+        for d in docs:
+            d["archived_at"] = now
+        try:
+            await self.archive.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # a previous run copied these but died before deleting them from the hot queue
+            if any(err.get("code") != DUPLICATE_KEY_ERROR for err in e.details.get("writeErrors", [])):
+                raise
+        ids = [d["id"] for d in docs]
+        res = await self.hot.delete_many({"id": {"$in": ids}, "status": {"$in": TERMINAL_STATUSES}})
+        return res.deleted_count
+
+    async def archive_aged(self) -> int:
+        moved = 0
+        while True:
+            batch = await self.archive_batch()
+            moved += batch
+            if batch < self.batch_size:
+                break
+            await asyncio.sleep(0)
+        if moved:
+            logger.info(f"Archived {moved} terminal queue items")
+        return moved
+
+    async def restore(self, ids: List[str]) -> int:
+        """Move archived items back to the hot queue (used by dead-letter redrive)"""
+        docs = await self.archive.find({"id": {"$in": ids}}, {"_id": 0, "archived_at": 0}).to_list(len(ids))
+        if not docs:
+            return 0
+        archived_ids = [d["id"] for d in docs]
+        # an interrupted archive run can leave an item in both collections
+        still_hot = set(await self.hot.distinct("id", {"id": {"$in": archived_ids}}))
+        missing = [d for d in docs if d["id"] not in still_hot]
+        if missing:
+            await self.hot.insert_many(missing, ordered=False)
+        await self.archive.delete_many({"id": {"$in": archived_ids}})
+        return len(missing)
+
+    async def history(self, query: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        return await self.archive.find(query, {"_id": 0, "archived_at": 0}).sort("scheduled_at", 1).to_list(limit)
+
+    async def run_loop(self, interval_seconds: float):
+        while True:
+            try:
+                await self.archive_aged()
+            except Exception as e:
+                logger.error(f"Queue archive error: {e}")
+            await asyncio.sleep(interval_seconds)
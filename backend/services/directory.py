@@ -0,0 +1,431 @@
+"""
+Company and person directory search
+
+Records live in the `companies` and `persons` collections. Free-text queries
+use MongoDB text indexes; facet filters (industry, seniority, confidence
+status) hit compound indexes. The page of results is a sorted, skipped and
+limited `find`, so the sort can walk an index; inside `$facet` it could
+not. The total and the facet counts come from one `$facet` aggregation run
+alongside it; that scans the whole match set, so its result is cached per
+query for `COUNT_CACHE_SECONDS` and paging through results costs one `find`
+each. Autocomplete is served from an in-memory prefix trie so it never
+touches the database; imports re-index records whose name changed.
+"""
+
+import abc
+import asyncio
+import logging
+import re
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from services.suppression import normalize_email
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_PAGE_SIZE = 100
+COUNT_CACHE_SECONDS = 30.0
+COUNT_CACHE_SIZE = 256
+
+SENIORITY_KEYWORDS = [
+    ("executive", ("chief", "ceo", "cto", "cfo", "coo", "cmo", "cio", "founder", "president", "owner", "partner")),
+    ("senior", ("vp", "vice president", "director", "head")),
+    ("mid", ("manager", "lead", "senior", "principal")),
+    ("junior", ("junior", "intern", "assistant", "associate", "coordinator", "trainee")),
+]
+
+
+def title_seniority(title: Optional[str]) -> str:
+    """Bucket a job title into the engagement model's seniority levels"""
+    text = (title or "").lower()
+    if not text:
+        return "unknown"
+    for level, keywords in SENIORITY_KEYWORDS:
+        if any(re.search(rf"\b{re.escape(k)}\b", text) for k in keywords):
+            return level
+    return "mid"
+
+
+def _number(value: Any, cast: Callable[[float], Any] = float) -> Any:
+    """Parse an imported numeric field; blanks and garbage become None"""
+    if value in (None, ""):
+        return None
+    try:
+        return cast(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def confidence_status(score: Optional[float]) -> Optional[str]:
+    """Same thresholds as AILeadScoring.calculate_confidence_score"""
+    if score is None:
+        return None
+    if score >= 80:
+        return "Valid"
+    if score >= 50:
+        return "Warning"
+    return "Invalid"
+
+
+class _TrieNode:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.top: List[Tuple[float, str, str]] = []
+
+
+class PrefixTrie:
+    """
+    Autocomplete index. Every node keeps its best `k` completions, so a lookup
+    is one walk down the prefix with no subtree scan. `k` is larger than any
+    lookup asks for, so a node that loses an entry to `remove` still has
+    spares until the next full `load`.
+    """
+
+    def __init__(self, k: int = 16, max_depth: int = 24):
+        self.root = _TrieNode()
+        self.k = k
+        self.max_depth = max_depth
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def insert(self, text: str, key: str, label: str, weight: float = 0.0):
+        """Index `label` under the whole text and under each of its words"""
+        text = (text or "").lower().strip()
+        if not text:
+            return
+        self.size += 1
+        entry = (-weight, label, key)
+        terms = {text, *text.split()}
+        for term in terms:
+            node = self.root
+            for ch in term[: self.max_depth]:
+                node = node.children.setdefault(ch, _TrieNode())
+                if any(existing[2] == key for existing in node.top):
+                    continue
+                if len(node.top) < self.k or entry < node.top[-1]:
+                    node.top.append(entry)
+                    node.top.sort()
+                    del node.top[self.k:]
+
+    def remove(self, text: str, key: str):
+        """Drop `key` from every node `text` was indexed under"""
+        text = (text or "").lower().strip()
+        if not text:
+            return
+        self.size -= 1
+        for term in {text, *text.split()}:
+            node = self.root
+            for ch in term[: self.max_depth]:
+                node = node.children.get(ch)
+                if node is None:
+                    break
+                node.top = [entry for entry in node.top if entry[2] != key]
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Dict[str, str]]:
+        node = self.root
+        for ch in (prefix or "").lower().strip()[: self.max_depth]:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return [{"id": key, "label": label} for _, label, key in node.top[:limit]]
+
+
+class _Directory(abc.ABC):
+    """Search, facets, import and autocomplete over one collection"""
+
+    FACETS: Tuple[str, ...] = ()
+    TEXT_FIELDS: Dict[str, int] = {}
+    TRIE_FIELDS: Tuple[str, ...] = ()
+    SORT: List[Tuple[str, int]] = []
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.trie = PrefixTrie()
+        self._counts: "OrderedDict[tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    @abc.abstractmethod
+    def normalize(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Clean one imported record; None skips it"""
+
+    def natural_key(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {"id": doc["id"]}
+
+    @abc.abstractmethod
+    def trie_entry(self, doc: Dict[str, Any]) -> Tuple[str, str, str, float]:
+        """(text to index, id, label, weight)"""
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id", unique=True)
+        await self.collection.create_index(
+            [(field, "text") for field in self.TEXT_FIELDS],
+            weights=self.TEXT_FIELDS,
+            name=f"{self.collection.name}_text",
+        )
+
+    async def load(self):
+        """Build the autocomplete trie from the collection"""
+        trie = PrefixTrie()
+        projection = {"_id": 0, "id": 1, **{f: 1 for f in self.TRIE_FIELDS}}
+        async for doc in self.collection.find({}, projection).batch_size(5000):
+            trie.insert(*self.trie_entry(doc))
+        self.trie = trie
+        logger.info(f"Loaded {len(trie)} {self.collection.name} into autocomplete")
+
+    async def search(
+        self,
+        q: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        page: int = 1,
+        page_size: int = 25,
+    ) -> Dict[str, Any]:
+        page = max(page, 1)
+        page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+        match: Dict[str, Any] = {k: v for k, v in (filters or {}).items() if v not in (None, "")}
+        projection: Dict[str, Any] = {"_id": 0}
+        sort: List[Tuple[str, Any]] = list(self.SORT)
+        if q:
+            match["$text"] = {"$search": q}
+            projection["_score"] = {"$meta": "textScore"}
+            sort.insert(0, ("_score", {"$meta": "textScore"}))
+        cursor = self.collection.find(match, projection).sort(sort).skip((page - 1) * page_size).limit(page_size)
+        items, counts = await asyncio.gather(cursor.to_list(page_size), self._count(q, match))
+        for item in items:
+            item.pop("_score", None)
+        return {"items": items, **counts, "page": page, "page_size": page_size}
+
+    async def _count(self, q: Optional[str], match: Dict[str, Any]) -> Dict[str, Any]:
+        """Total and facet counts for a query, cached for `COUNT_CACHE_SECONDS`"""
+        key = (q, tuple(sorted((k, str(v)) for k, v in match.items() if k != "$text")))
+        now = time.monotonic()
+        cached = self._counts.get(key)
+        if cached is not None and cached[0] > now:
+            self._counts.move_to_end(key)
+            return cached[1]
+        pipeline = [
+            # $text must sit in the first $match stage
+            {"$match": match},
+            {"$facet": {
+                "total": [{"$count": "count"}],
+                **{
+                    facet: [{"$group": {"_id": f"${facet}", "count": {"$sum": 1}}}, {"$sort": {"count": -1}}, {"$limit": 50}]
+                    for facet in self.FACETS
+                },
+            }},
+        ]
+        rows = await self.collection.aggregate(pipeline).to_list(1)
+        row = rows[0] if rows else {}
+        counts = {
+            "total": row.get("total", [{}])[0].get("count", 0) if row.get("total") else 0,
+            "facets": {
+                facet: [{"value": b["_id"], "count": b["count"]} for b in row.get(facet, []) if b["_id"] not in (None, "")]
+                for facet in self.FACETS
+            },
+        }
+        self._counts[key] = (now + COUNT_CACHE_SECONDS, counts)
+        self._counts.move_to_end(key)
+        while len(self._counts) > COUNT_CACHE_SIZE:
+            self._counts.popitem(last=False)
+        return counts
+
+    async def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": item_id}, {"_id": 0})
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> List[Dict[str, str]]:
+        return self.trie.complete(prefix, limit)
+
+    async def _prepare_chunk(self, docs: List[Dict[str, Any]]):
+        """Hook for per-chunk enrichment before writing"""
+
+    async def import_many(self, records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """Upsert records in chunks; returns inserted/updated counts"""
+        stats = {"inserted": 0, "updated": 0, "skipped": 0}
+        chunk: List[Dict[str, Any]] = []
+        for record in records:
+            doc = self.normalize(record)
+            if doc is None:
+                stats["skipped"] += 1
+                continue
+            chunk.append(doc)
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                await self._write_chunk(chunk, stats)
+                chunk = []
+        if chunk:
+            await self._write_chunk(chunk, stats)
+        # other processes see the new counts once their cache entries expire
+        self._counts.clear()
+        return stats
+
+    async def _write_chunk(self, docs: List[Dict[str, Any]], stats: Dict[str, int]):
+        # the last row wins when a chunk repeats a natural key
+        by_key = {tuple(self.natural_key(d).items()): d for d in docs}
+        stats["skipped"] += len(docs) - len(by_key)
+        docs = list(by_key.values())
+        await self._prepare_chunk(docs)
+        # stored versions of records this chunk updates, to re-index renamed ones
+        keys = [self.natural_key(d) for d in docs]
+        projection = {"_id": 0, "id": 1, **{f: 1 for f in self.TRIE_FIELDS}, **{f: 1 for key in keys for f in key}}
+        existing = {
+            tuple(self.natural_key(d).items()): d
+            async for d in self.collection.find({"$or": keys}, projection)
+        }
+        now = datetime.now(timezone.utc).isoformat()
+        ops = []
+        for doc in docs:
+            doc_id = doc.pop("id")
+            ops.append(UpdateOne(
+                self.natural_key({**doc, "id": doc_id}),
+                # fields missing from this record keep their stored values
+                {"$set": {**{k: v for k, v in doc.items() if v is not None}, "updated_at": now},
+                 "$setOnInsert": {"id": doc_id, "created_at": now}},
+                upsert=True,
+            ))
+            doc["id"] = doc_id
+        res = await self.collection.bulk_write(ops, ordered=False)
+        stats["inserted"] += res.upserted_count
+        stats["updated"] += res.matched_count
+        # upserts matched on the natural key keep their stored id and unset fields
+        upserted_ids = {docs[i]["id"] for i in (res.upserted_ids or {})}
+        for doc in docs:
+            if doc["id"] in upserted_ids:
+                self.trie.insert(*self.trie_entry(doc))
+                continue
+            stored = existing.get(tuple(self.natural_key(doc).items()))
+            if stored is None:
+                continue
+            merged = {**stored, **{k: v for k, v in doc.items() if v is not None}, "id": stored["id"]}
+            old, new = self.trie_entry(stored), self.trie_entry(merged)
+            if old != new:
+                self.trie.remove(old[0], old[1])
+                self.trie.insert(*new)
+
+
+class CompanyDirectory(_Directory):
+    FACETS = ("industry", "country")
+    TEXT_FIELDS = {"name": 10, "industry": 3, "location": 2, "description": 1}
+    TRIE_FIELDS = ("name", "confidence")
+    SORT = [("confidence", -1), ("name", 1)]
+
+    async def ensure_indexes(self):
+        await super().ensure_indexes()
+        await self.collection.create_index("domain", sparse=True)
+        await self.collection.create_index([("industry", 1), ("confidence", -1)])
+        await self.collection.create_index([("country", 1), ("industry", 1), ("confidence", -1)])
+
+    def normalize(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        name = (record.get("name") or "").strip()
+        if not name:
+            return None
+        employee_count = record.get("employee_count", record.get("employeeCount"))
+        return {
+            "id": str(record.get("id") or uuid.uuid4()),
+            "name": name,
+            "domain": (record.get("domain") or "").strip().lower() or None,
+            "industry": (record.get("industry") or "").strip() or None,
+            "location": (record.get("location") or "").strip() or None,
+            "country": (record.get("country") or "").strip() or None,
+            "employee_count": _number(employee_count, int),
+            "revenue": record.get("revenue") or None,
+            "description": record.get("description") or None,
+            "confidence": _number(record.get("confidence")),
+            "verified": str(record.get("verified", "")).lower() in ("1", "true", "yes"),
+        }
+
+    def natural_key(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {"domain": doc["domain"]} if doc.get("domain") else {"id": doc["id"]}
+
+    def trie_entry(self, doc: Dict[str, Any]) -> Tuple[str, str, str, float]:
+        return doc["name"], doc["id"], doc["name"], doc.get("confidence") or 0.0
+
+
+class PersonDirectory(_Directory):
+    FACETS = ("industry", "seniority", "confidence_status")
+    TEXT_FIELDS = {"name": 10, "title": 4, "company": 3, "email": 2}
+    TRIE_FIELDS = ("name", "email", "confidence_score")
+    SORT = [("confidence_score", -1), ("name", 1)]
+
+    def __init__(
+        self,
+        collection,
+        companies=None,
+        scorer: Optional[Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]]] = None,
+    ):
+        super().__init__(collection)
+        self.companies = companies
+        self.scorer = scorer
+
+    async def ensure_indexes(self):
+        await super().ensure_indexes()
+        await self.collection.create_index("email_norm", sparse=True)
+        await self.collection.create_index("company_id")
+        await self.collection.create_index([("seniority", 1), ("confidence_status", 1), ("confidence_score", -1)])
+        await self.collection.create_index([("industry", 1), ("seniority", 1), ("confidence_score", -1)])
+        await self.collection.create_index([("confidence_status", 1), ("confidence_score", -1)])
+
+    def normalize(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        name = (record.get("name") or "").strip()
+        email = (record.get("email") or "").strip()
+        if not name and not email:
+            return None
+        title = (record.get("title") or "").strip() or None
+        score = _number(record.get("confidence_score", record.get("confidenceScore")))
+        return {
+            "id": str(record.get("id") or uuid.uuid4()),
+            "company_id": record.get("company_id") or record.get("companyId") or None,
+            "company": (record.get("company") or "").strip() or None,
+            "industry": (record.get("industry") or "").strip() or None,
+            "name": name or email,
+            "title": title,
+            "seniority": record.get("seniority") or title_seniority(title),
+            "email": email or None,
+            "email_norm": normalize_email(email) or None,
+            "domain": email.rsplit("@", 1)[1].lower() if "@" in email else None,
+            "linkedin_url": record.get("linkedin_url") or record.get("linkedin") or None,
+            "phone": record.get("phone") or None,
+            "confidence_score": score,
+            "confidence_status": record.get("confidence_status") or confidence_status(score),
+            "engagement_score": _number(record.get("engagement_score", record.get("engagementScore"))),
+        }
+
+    def natural_key(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {"email_norm": doc["email_norm"]} if doc.get("email_norm") else {"id": doc["id"]}
+
+    def trie_entry(self, doc: Dict[str, Any]) -> Tuple[str, str, str, float]:
+        text = " ".join(filter(None, [doc.get("name"), doc.get("email")]))
+        return text, doc["id"], doc.get("name") or doc.get("email"), doc.get("confidence_score") or 0.0
+
+    async def _prepare_chunk(self, docs: List[Dict[str, Any]]):
+        # denormalize company name/industry so facets never need a $lookup
+        if self.companies is not None:
+            company_ids = list({d["company_id"] for d in docs if d["company_id"]})
+            if company_ids:
+                companies = {
+                    c["id"]: c
+                    async for c in self.companies.find(
+                        {"id": {"$in": company_ids}}, {"_id": 0, "id": 1, "name": 1, "industry": 1}
+                    )
+                }
+                for d in docs:
+                    company = companies.get(d["company_id"])
+                    if company:
+                        d["company"] = d["company"] or company.get("name")
+                        d["industry"] = d["industry"] or company.get("industry")
+        # score the leads that arrived without one, through the shared score store
+        unscored = [d for d in docs if d["confidence_score"] is None and d["email"]]
+        if unscored and self.scorer is not None:
+            results = await self.scorer([
+                {"email": d["email"], "domain": d["domain"], "linkedin_url": d["linkedin_url"], "title": d["title"], "company": d["company"]}
+                for d in unscored
+            ])
+            for d, result in zip(unscored, results):
+                d["confidence_score"] = float(result["confidence_score"])
+                d["confidence_status"] = result["status"]
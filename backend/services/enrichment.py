@@ -0,0 +1,335 @@
+"""
+Domain enrichment: MX records and website status, probed once per domain
+
+`DomainEnricher` checks a domain's MX records with `verify_domain` and probes
+its website over HTTPS, falling back to plain HTTP, through one pooled
+`httpx.AsyncClient` with strict connect/read timeouts and an overall deadline
+per probe. Results are cached in `domain_enrichment`, which expires entries
+after `ttl_hours`, so every lead at a company shares one probe per day.
+Concurrent requests for the same domain wait on the same probe.
+
+Domains come from imported records, so a probe must not become a way into
+the private network: IP literals and names resolving to anything but public
+addresses are refused, and redirects are followed by hand so every hop is
+checked the same way. The check happens where the connection is opened, and
+the connection goes to the addresses that were checked, so a name cannot
+pass the check and then re-resolve somewhere private (DNS rebinding).
+
+The enrichment loop stamps results onto `persons` and `companies` with one
+update per domain.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import httpcore
+import httpx
+from pymongo import UpdateOne
+
+from services.metrics import WEBSITE_PROBE_SECONDS
+from services.profiling import record as record_span
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "SaaSquatchLeads-Enrichment/1.0"
+# the site exists but turns automated clients away
+ACTIVE_ERROR_STATUSES = {401, 403, 429}
+ENRICHED_FIELDS = ("mx_valid", "website_status", "website_http_status", "website_url")
+MAX_REDIRECTS = 5
+
+
+class BlockedAddressError(httpx.HTTPError):
+    """The probe target is, or resolves to, a non-public address"""
+
+
+def is_public_address(address: str) -> bool:
+    """False for private, loopback, link-local, reserved, multicast and unspecified addresses"""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class _PinnedBackend(httpcore.AsyncNetworkBackend):
+    """
+    Opens each connection to an address `resolve` vetted rather than letting
+    the socket layer look the name up again. TLS still verifies the
+    certificate and sends SNI for the original name.
+    """
+
+    def __init__(self, resolve: Callable[[str], Awaitable[List[str]]]):
+        self.resolve = resolve
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        error: Optional[Exception] = None
+        for address in await self.resolve(host):
+            try:
+                return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error or httpx.ConnectError(f"no address for {host}")
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        raise BlockedAddressError("unix sockets are never probed")
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+class _PinnedTransport(httpx.AsyncHTTPTransport):
+    """httpx's transport with its connection pool opening connections through `_PinnedBackend`"""
+
+    def __init__(self, resolve: Callable[[str], Awaitable[List[str]]], limits: httpx.Limits):
+        super().__init__(limits=limits)
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=_PinnedBackend(resolve),
+        )
+
+
+def normalize_domain(value: Optional[str]) -> str:
+    domain = (value or "").strip().lower()
+    if "://" in domain:
+        domain = domain.split("://", 1)[1]
+    domain = domain.split("/", 1)[0]
+    return domain[4:] if domain.startswith("www.") else domain
+
+
+class DomainEnricher:
+    """Cached MX + website probes, shared by every lead on a domain"""
+
+    def __init__(
+        self,
+        db,
+        verify_domain: Callable[[str], bool],
+        ttl_hours: float = 24,
+        concurrency: int = 32,
+        timeout_seconds: float = 5.0,
+        connect_timeout_seconds: float = 3.0,
+        client: Optional[httpx.AsyncClient] = None,
+        allow_private: bool = False,
+    ):
+        self.collection = db.domain_enrichment
+        self.targets = (db.persons, db.companies)
+        self.verify_domain = verify_domain
+        self.ttl = timedelta(hours=ttl_hours)
+        self.concurrency = concurrency
+        self.timeout_seconds = timeout_seconds
+        self.connect_timeout_seconds = connect_timeout_seconds
+        self._client = client
+        # only for probing stand-in servers on localhost in tests
+        self.allow_private = allow_private
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("domain", unique=True)
+        await self.collection.create_index("checked_at", expireAfterSeconds=int(self.ttl.total_seconds()))
+        for target in self.targets:
+            await target.create_index([("domain", 1), ("enriched_at", 1)])
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # created on first use so it binds to the running loop
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            self._client = httpx.AsyncClient(
+                transport=_PinnedTransport(self._resolve, limits),
+                timeout=httpx.Timeout(self.timeout_seconds, connect=self.connect_timeout_seconds),
+                # redirects are followed in _request so every hop is checked
+                follow_redirects=False,
+                headers={"User-Agent": USER_AGENT},
+            )
+        return self._client
+
+    async def close(self):
+        for task in list(self._background):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _resolve(self, host: str) -> List[str]:
+        """Addresses to connect to for `host`; BlockedAddressError unless every one is public"""
+        if self.allow_private:
+            return [host]
+        try:
+            ipaddress.ip_address(host.strip("[]"))
+        except ValueError:
+            pass
+        else:
+            raise BlockedAddressError(f"{host} is an IP literal")
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise httpx.ConnectError(f"cannot resolve {host}: {e}") from e
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        blocked = [a for a in addresses if not is_public_address(a)]
+        if blocked:
+            raise BlockedAddressError(f"{host} resolves to {blocked[0]}")
+        return addresses
+
+    async def _request(self, method: str, url: str) -> httpx.Response:
+        request = self.client.build_request(method, url)
+        for _ in range(MAX_REDIRECTS + 1):
+            # every new connection, including one for a redirect, is checked by _PinnedBackend
+            response = await self.client.send(request, stream=True)
+            # only the status line and headers matter; never download the page
+            await response.aclose()
+            if response.next_request is None:
+                return response
+            request = response.next_request
+        raise httpx.TooManyRedirects(f"more than {MAX_REDIRECTS} redirects", request=request)
+
+    async def _probe_website(self, domain: str) -> Dict[str, Any]:
+        error = None
+        for scheme in ("https", "http"):
+            try:
+                response = await self._request("HEAD", f"{scheme}://{domain}")
+                if response.status_code in (405, 501):
+                    response = await self._request("GET", f"{scheme}://{domain}")
+            except httpx.HTTPError as e:
+                error = f"{scheme}: {type(e).__name__}"
+                continue
+            status = response.status_code
+            return {
+                "website_status": status < 400 or status in ACTIVE_ERROR_STATUSES,
+                "website_http_status": status,
+                "website_url": str(response.url),
+                "website_error": None,
+            }
+        return {"website_status": False, "website_http_status": None, "website_url": None, "website_error": error}
+
+    def _unusable(self, value: str) -> Dict[str, Any]:
+        """Result stamped on records whose domain field does not normalize to a domain"""
+        return {
+            "domain": value, "mx_valid": False, "website_status": False, "website_http_status": None,
+            "website_url": None, "website_error": "invalid domain", "checked_at": datetime.now(timezone.utc),
+        }
+
+    async def _probe(self, domain: str) -> Dict[str, Any]:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        async with self._sem:
+            start = time.perf_counter()
+            mx_task = asyncio.create_task(asyncio.to_thread(self.verify_domain, domain))
+            try:
+                # per-operation timeouts do not bound a slow redirect chain; this does
+                website = await asyncio.wait_for(self._probe_website(domain), self.timeout_seconds * 2)
+            except asyncio.TimeoutError:
+                website = {"website_status": False, "website_http_status": None, "website_url": None, "website_error": "deadline"}
+            elapsed = time.perf_counter() - start
+            WEBSITE_PROBE_SECONDS.observe(elapsed)
+            record_span("http", elapsed)
+            mx_valid = bool(await mx_task)
+        return {
+            "domain": domain,
+            "mx_valid": mx_valid,
+            **website,
+            "response_ms": round(elapsed * 1000, 1),
+            "checked_at": datetime.now(timezone.utc),
+        }
+
+    async def _shared_probe(self, domain: str) -> Dict[str, Any]:
+        future = self._inflight.get(domain)
+        if future is None:
+            future = asyncio.ensure_future(self._probe(domain))
+            self._inflight[domain] = future
+            future.add_done_callback(lambda _: self._inflight.pop(domain, None))
+        return await asyncio.shield(future)
+
+    async def enrich(self, domains: Iterable[str], force: bool = False, wait: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Enrichment per domain, probing only those without a result younger than
+        the TTL. With `wait=False` those probes run in the background and only
+        cached results are returned.
+        """
+        wanted = {normalize_domain(d) for d in domains} - {""}
+        results: Dict[str, Dict[str, Any]] = {}
+        if not force and wanted:
+            cutoff = datetime.now(timezone.utc) - self.ttl
+            # the TTL monitor only runs once a minute, so check the age here too
+            async for doc in self.collection.find({"domain": {"$in": list(wanted)}, "checked_at": {"$gte": cutoff}}, {"_id": 0}):
+                results[doc["domain"]] = doc
+        missing = sorted(wanted - set(results))
+        if missing and not wait:
+            task = asyncio.create_task(self._probe_and_store(missing))
+            self._background.add(task)
+            task.add_done_callback(self._background_done)
+        elif missing:
+            results.update(await self._probe_and_store(missing))
+        return results
+
+    async def _probe_and_store(self, domains: List[str]) -> Dict[str, Dict[str, Any]]:
+        probed = await asyncio.gather(*(self._shared_probe(d) for d in domains))
+        await self.collection.bulk_write(
+            [UpdateOne({"domain": doc["domain"]}, {"$set": doc}, upsert=True) for doc in probed], ordered=False
+        )
+        return {doc["domain"]: doc for doc in probed}
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background domain probe failed: {task.exception()}")
+
+    async def apply(self, results: Dict[str, Dict[str, Any]]) -> int:
+        """Copy enrichment onto every person and company on each domain"""
+        updated = 0
+        for domain, doc in results.items():
+            fields = {k: doc.get(k) for k in ENRICHED_FIELDS}
+            fields["enriched_at"] = doc["checked_at"]
+            for target in self.targets:
+                res = await target.update_many({"domain": domain}, {"$set": fields})
+                updated += res.modified_count
+        return updated
+
+    async def _pending_domains(self, max_domains: int) -> List[str]:
+        cutoff = datetime.now(timezone.utc) - self.ttl
+        pipeline = [
+            {"$match": {
+                "domain": {"$nin": [None, ""]},
+                "$or": [{"enriched_at": {"$exists": False}}, {"enriched_at": {"$lt": cutoff}}],
+            }},
+            {"$group": {"_id": "$domain"}},
+            {"$limit": max_domains},
+        ]
+        domains: List[str] = []
+        for target in self.targets:
+            domains += [row["_id"] async for row in target.aggregate(pipeline)]
+        return list(dict.fromkeys(domains))[:max_domains]
+
+    async def enrich_pending(self, max_domains: int = 500) -> Dict[str, int]:
+        """One pass: enrich domains whose leads have no enrichment or an expired one"""
+        domains = await self._pending_domains(max_domains)
+        if not domains:
+            return {"domains": 0, "updated": 0}
+        results = await self.enrich(domains)
+        # records keep their own spelling of the domain; stamp exactly those values. Values that
+        # normalize to nothing are stamped as unusable, or they would be picked again on every pass
+        updated = await self.apply({
+            d: results[normalize_domain(d)] if normalize_domain(d) else self._unusable(d)
+            for d in domains if normalize_domain(d) in results or not normalize_domain(d)
+        })
+        logger.info(f"Enriched {len(domains)} domains, updated {updated} records")
+        return {"domains": len(domains), "updated": updated}
+
+    async def run_loop(self, interval_seconds: float, max_domains: int = 500):
+        while True:
+            try:
+                stats = await self.enrich_pending(max_domains)
+                # a full batch means more are waiting, but only go straight on if this pass made progress
+                if stats["domains"] >= max_domains and stats["updated"]:
+                    continue
+            except Exception as e:
+                logger.error(f"Domain enrichment error: {e}")
+            await asyncio.sleep(interval_seconds)
@@ -0,0 +1,186 @@
+"""
+In-process fan-out of tracker events to SSE subscribers
+
+Writers (scheduler, progress tracking) publish once; every open stream gets
+its own bounded queue. A subscriber that falls too far behind is told to
+resync instead of slowing publishers down.
+
+When the scheduler runs in a separate worker, `TrackerPoller` is the single
+producer for this process: one poll per interval regardless of how many
+dashboards are connected. Sends and failures are paged by `(timestamp, id)`
+from a few seconds behind the newest stamp seen, and ids already published
+are skipped, so a write that commits late or shares a timestamp is still
+reported once. Metrics are read in full once, then only for sequences whose
+`metrics_updated_at` moved.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class EventHub:
+    """Publishes events to every subscriber's queue without blocking"""
+
+    def __init__(self, queue_size: int = 1000):
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # drop the backlog; the client refetches the summary on resync
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("resync", {}))
+
+    async def subscribe(
+        self,
+        sequence_id: Optional[str] = None,
+        keepalive_seconds: float = 15.0,
+    ) -> AsyncIterator[Optional[tuple]]:
+        """Yield (event, data) tuples, or None as a keepalive tick"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        try:
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if sequence_id and data.get("sequence_id") not in (None, sequence_id):
+                    continue
+                yield event, data
+        finally:
+            self._subscribers.discard(queue)
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class _Tail:
+    """
+    Follows one timestamp field. Writers stamp it on their own clocks and
+    commit out of order, so each poll re-reads `lookback` behind the newest
+    stamp seen and skips ids it has already published. The seen set only
+    holds ids inside that window.
+    """
+
+    def __init__(self, collection, field: str, projection: Dict[str, int], start: str):
+        self.collection = collection
+        self.field = field
+        self.projection = projection
+        self.floor = start
+        self.mark = start
+        self.seen: Dict[str, str] = {}
+
+    async def poll(self, lookback: timedelta, batch_size: int) -> List[Dict[str, Any]]:
+        """Items not yet published; at most about `batch_size` per call"""
+        field = self.field
+        lower = max(self.floor, (datetime.fromisoformat(self.mark) - lookback).isoformat())
+        at, item_id = lower, ""
+        fresh: List[Dict[str, Any]] = []
+        while len(fresh) < batch_size:
+            page = await self.collection.find(
+                {"$or": [{field: {"$gt": at}}, {field: at, "id": {"$gt": item_id}}]}, self.projection
+            ).sort([(field, 1), ("id", 1)]).limit(batch_size).to_list(batch_size)
+            for it in page:
+                if it["id"] not in self.seen:
+                    self.seen[it["id"]] = it[field]
+                    fresh.append(it)
+            if len(page) < batch_size:
+                break
+            at, item_id = page[-1][field], page[-1]["id"]
+        if fresh:
+            self.mark = max(self.mark, max(it[field] for it in fresh))
+        lower = max(self.floor, (datetime.fromisoformat(self.mark) - lookback).isoformat())
+        self.seen = {k: v for k, v in self.seen.items() if v >= lower}
+        return fresh
+
+
+class TrackerPoller:
+    """Turns MongoDB changes made by another process into hub events"""
+
+    def __init__(self, db, hub: EventHub, interval_seconds: float = 2.0, batch_size: int = 500, clock_skew_seconds: float = 5.0):
+        self.db = db
+        self.hub = hub
+        self.interval = interval_seconds
+        self.batch_size = batch_size
+        self.clock_skew = timedelta(seconds=clock_skew_seconds)
+        self._metrics: Optional[Dict[str, Dict[str, int]]] = None
+        self._metrics_mark: Optional[str] = None
+        self._sent: Optional[_Tail] = None
+        self._failed: Optional[_Tail] = None
+
+    async def ensure_indexes(self):
+        await self.db.sequences.create_index("metrics_updated_at", sparse=True)
+        await self.db.sequence_queue.create_index([("sent_at", 1), ("id", 1)], sparse=True)
+        await self.db.sequence_dead_letters.create_index([("failed_at", 1), ("id", 1)])
+
+    def reset(self):
+        self._metrics = None
+        self._metrics_mark = None
+        self._sent = self._failed = None
+
+    async def _poll_metrics(self, now: datetime):
+        baseline = self._metrics is None
+        if baseline:
+            # one full read when the first subscriber arrives
+            query: Dict[str, Any] = {}
+            self._metrics = {}
+        else:
+            # writers stamp metrics_updated_at on their own clock; re-reading a few seconds is harmless
+            query = {"metrics_updated_at": {"$gte": self._metrics_mark}}
+        self._metrics_mark = (now - self.clock_skew).isoformat()
+        async for seq in self.db.sequences.find(query, {"_id": 0, "sequence_id": 1, "metrics": 1}):
+            current = {k: int(v or 0) for k, v in (seq.get("metrics") or {}).items()}
+            previous = self._metrics.get(seq["sequence_id"], {})
+            self._metrics[seq["sequence_id"]] = current
+            if baseline:
+                continue
+            delta = {k: v - previous.get(k, 0) for k, v in current.items() if v != previous.get(k, 0)}
+            if delta:
+                self.hub.publish("metrics", {"sequence_id": seq["sequence_id"], "delta": delta})
+
+    async def poll_once(self):
+        now = datetime.now(timezone.utc)
+        if self._sent is None:
+            # only report changes made after we started watching
+            self._sent = _Tail(
+                self.db.sequence_queue, "sent_at",
+                {"_id": 0, "id": 1, "sequence_id": 1, "step_id": 1, "status": 1, "sent_at": 1}, now.isoformat(),
+            )
+            self._failed = _Tail(
+                self.db.sequence_dead_letters, "failed_at",
+                {"_id": 0, "id": 1, "sequence_id": 1, "step_id": 1, "failed_at": 1}, now.isoformat(),
+            )
+
+        await self._poll_metrics(now)
+
+        for it in await self._sent.poll(self.clock_skew, self.batch_size):
+            self.hub.publish("queue", it)
+        for it in await self._failed.poll(self.clock_skew, self.batch_size):
+            self.hub.publish("queue", {**it, "status": "failed"})
+
+    async def run_loop(self):
+        while True:
+            if len(self.hub):
+                try:
+                    await self.poll_once()
+                except Exception as e:
+                    logger.error(f"Tracker poll error: {e}")
+            else:
+                # nobody listening: forget state so a new subscriber starts fresh
+                self.reset()
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,142 @@
+"""
+Per-lead explanations for reply predictions
+
+The serving reply model is logistic regression over hashed features, so its
+Shapley values have a closed form: with independent features, feature j
+contributes `coef[j] * (x[j] - baseline[j])` log-odds, where the baseline is
+the mean feature vector stored with the model version. A whole batch is one
+matrix expression, and the contributions plus the base value add up exactly
+to the prediction's log-odds.
+
+Contributions are summed per feature group (`seniority`, `industry`, ...)
+using the vocabulary stored with the model, so "seniority=executive" also
+carries the effect of not being junior. Whatever cannot be mapped to a name
+is reported as `rest`. Results are cached per (model version, feature hash),
+so re-scoring unchanged leads costs a dict lookup. `explain` is CPU-bound
+and meant to be called from worker threads; the cache is locked for that.
+"""
+
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from services.reply_model import N_FEATURES, ReplyModelRegistry, feature_index, vectorize
+
+
+def feature_group(feature: str) -> str:
+    return feature.split("=", 1)[0]
+
+
+def feature_hash(features: Dict[str, float]) -> str:
+    return hashlib.sha1(json.dumps(sorted(features.items()), separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class ReplyExplainer:
+    """Batched, cached feature attributions for the serving reply model"""
+
+    def __init__(self, registry: ReplyModelRegistry, cache_size: int = 50000):
+        self.registry = registry
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._grouping: Optional[tuple] = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def explain(self, rows: List[Dict[str, float]], top_k: int = 3) -> Optional[List[Dict[str, Any]]]:
+        """Probability, base value and the `top_k` strongest drivers per row; None without a model"""
+        active = self.registry.active
+        if active is None:
+            return None
+        version, model, background = active
+        keys = [(version, feature_hash(row)) for row in rows]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+        missing: Dict[tuple, List[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    results[i] = cached
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+            self.misses += len(missing)
+        if missing:
+            first = [idxs[0] for idxs in missing.values()]
+            attributed = self._attribute(version, model, background, [rows[i] for i in first])
+            with self._lock:
+                for key, explained in zip(missing, attributed):
+                    self._cache[key] = explained
+                    for i in missing[key]:
+                        results[i] = explained
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [{**r, "drivers": r["drivers"][:top_k]} for r in results]
+
+    def _groups(self, version: int, vocabulary: List[str]):
+        """Index -> group assignment for a model version; a hash collision keeps the first group"""
+        if self._grouping is None or self._grouping[0] != version:
+            import numpy as np
+
+            names: List[str] = []
+            index_group = np.full(N_FEATURES, -1, dtype=np.int64)
+            for feature in vocabulary:
+                group = feature_group(feature)
+                if group not in names:
+                    names.append(group)
+                j = feature_index(feature)
+                if index_group[j] < 0:
+                    index_group[j] = names.index(group)
+            self._grouping = (version, names, index_group)
+        return self._grouping[1], self._grouping[2]
+
+    def _attribute(self, version: int, model, background: Dict[str, Any], rows: List[Dict[str, float]]) -> List[Dict[str, Any]]:
+        import numpy as np
+
+        coef = np.asarray(model.coef_, dtype=np.float64).ravel()
+        intercept = float(np.ravel(model.intercept_)[0])
+        baseline = background.get("baseline")
+        mu = baseline.astype(np.float64) if baseline is not None else np.zeros(N_FEATURES)
+        phi = (vectorize(rows) - mu) * coef
+        base = intercept + float(coef @ mu)
+        logits = base + phi.sum(axis=1)
+
+        names, index_group = self._groups(version, background.get("vocabulary") or [])
+        membership = np.zeros((N_FEATURES, len(names)))
+        assigned = index_group >= 0
+        membership[np.flatnonzero(assigned), index_group[assigned]] = 1.0
+        grouped = phi @ membership
+
+        out = []
+        for i, row in enumerate(rows):
+            contributions = dict(zip(names, grouped[i].tolist()))
+            values: Dict[str, Any] = {}
+            for feature, value in row.items():
+                group = feature_group(feature)
+                values[group] = feature.split("=", 1)[1] if "=" in feature else value
+                j = feature_index(feature)
+                if index_group[j] < 0:
+                    # first seen after this version was trained
+                    contributions[group] = contributions.get(group, 0.0) + float(phi[i, j])
+            drivers = sorted(
+                ({"feature": g, "value": values.get(g), "contribution": c} for g, c in contributions.items()),
+                key=lambda d: abs(d["contribution"]),
+                reverse=True,
+            )
+            explained = sum(contributions.values())
+            for d in drivers:
+                d["contribution"] = round(d["contribution"], 4)
+            out.append({
+                "reply_probability": round(1.0 / (1.0 + math.exp(-float(logits[i]))), 4),
+                "base_value": round(base, 4),
+                "rest": round(float(logits[i]) - base - explained, 4),
+                "drivers": drivers,
+            })
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cached": len(self._cache), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,225 @@
+"""
+Streaming export of a sequence's queue as CSV or Parquet
+
+Rows are read from MongoDB cursors with a bounded batch size and written out
+one batch at a time, so server memory stays flat however many rows there are
+and the first bytes leave as soon as the first batch is read. Without a
+status filter the query lists every status explicitly; MongoDB then merges
+the `(sequence_id, status, scheduled_at)` index ranges instead of sorting in
+memory. With `include_history` the archive (`(sequence_id, scheduled_at)`
+index) is merged in by `scheduled_at`. An item archived during the export is
+seen in both collections with the same `scheduled_at` and emitted once.
+`error_kind` lives on the dead letter, not the queue item, so it is looked
+up by id for the failed rows of each batch.
+
+Parquet gets one row group per batch, written by pyarrow in a worker thread.
+pandas and pyarrow are imported on the first Parquet export, not at startup.
+"""
+
+import asyncio
+import csv
+import io
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+QUEUE_STATUSES = ["pending", "pending_paused", "sending", "sent", "failed", "task_created", "suppressed"]
+TIME_COLUMNS = ("scheduled_at", "sent_at")
+FIELDS = [
+    ("id", "string"),
+    ("sequence_id", "string"),
+    ("step_number", "int32"),
+    ("step_id", "string"),
+    ("channel", "string"),
+    ("status", "string"),
+    ("email", "string"),
+    ("name", "string"),
+    ("company", "string"),
+    ("title", "string"),
+    ("timezone", "string"),
+    ("scheduled_at", "timestamp"),
+    ("sent_at", "timestamp"),
+    ("attempts", "int32"),
+    ("deferrals", "int32"),
+    ("error_kind", "string"),
+    ("last_error", "string"),
+    ("subject", "string"),
+    ("archived", "bool"),
+]
+COLUMNS = [name for name, _ in FIELDS]
+PROJECTION = {
+    "_id": 0, "id": 1, "sequence_id": 1, "step_number": 1, "step_id": 1, "channel": 1, "status": 1,
+    "contact": 1, "scheduled_at": 1, "sent_at": 1, "attempts": 1, "deferrals": 1, "last_error": 1, "subject": 1,
+}
+
+
+def export_row(item: Dict[str, Any], archived: bool) -> Dict[str, Any]:
+    contact = item.get("contact") or {}
+    return {
+        "id": item.get("id"),
+        "sequence_id": item.get("sequence_id"),
+        "step_number": item.get("step_number"),
+        "step_id": item.get("step_id"),
+        "channel": item.get("channel"),
+        "status": item.get("status"),
+        "email": contact.get("email"),
+        "name": contact.get("name"),
+        "company": contact.get("company"),
+        "title": contact.get("title"),
+        "timezone": contact.get("timezone"),
+        "scheduled_at": item.get("scheduled_at"),
+        "sent_at": item.get("sent_at"),
+        "attempts": item.get("attempts"),
+        "deferrals": item.get("deferrals"),
+        "error_kind": None,
+        "last_error": item.get("last_error"),
+        "subject": item.get("subject"),
+        "archived": archived,
+    }
+
+
+class QueueExporter:
+    """Builds export queries and streams their rows as CSV or Parquet bytes"""
+
+    def __init__(self, db, batch_size: int = 5000):
+        self.hot = db.sequence_queue
+        self.archive = db.sequence_queue_archive
+        self.dead_letters = db.sequence_dead_letters
+        self.batch_size = batch_size
+
+    def query(
+        self,
+        sequence_id: str,
+        statuses: Optional[List[str]] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        date_field: str = "scheduled_at",
+        step_number: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        query: Dict[str, Any] = {"sequence_id": sequence_id, "status": {"$in": statuses or QUEUE_STATUSES}}
+        if since or until:
+            bounds: Dict[str, str] = {}
+            if since:
+                bounds["$gte"] = since
+            if until:
+                bounds["$lt"] = until
+            query[date_field] = bounds
+        if step_number is not None:
+            query["step_number"] = step_number
+        return query
+
+    async def _rows(self, collection, query: Dict[str, Any], archived: bool, batch_size: int) -> AsyncIterator[Dict[str, Any]]:
+        cursor = collection.find(query, PROJECTION).sort("scheduled_at", 1).batch_size(batch_size)
+        async for item in cursor:
+            yield export_row(item, archived)
+
+    async def rows(self, query: Dict[str, Any], include_history: bool = False, batch_size: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        batch_size = batch_size or self.batch_size
+        hot = self._rows(self.hot, query, False, batch_size)
+        if not include_history:
+            async for row in hot:
+                yield row
+            return
+        cold = self._rows(self.archive, query, True, batch_size)
+        a, b = await anext(hot, None), await anext(cold, None)
+        # ids emitted at the current scheduled_at; an item mid-archive appears in both streams
+        at, seen = None, set()
+        while a is not None or b is not None:
+            if b is None or (a is not None and (a["scheduled_at"] or "") <= (b["scheduled_at"] or "")):
+                row, a = a, await anext(hot, None)
+            else:
+                row, b = b, await anext(cold, None)
+            if row["scheduled_at"] != at:
+                at, seen = row["scheduled_at"], set()
+            if row["id"] in seen:
+                continue
+            seen.add(row["id"])
+            yield row
+
+    async def batches(self, rows: AsyncIterator[Dict[str, Any]], batch_size: Optional[int] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        batch_size = batch_size or self.batch_size
+        batch: List[Dict[str, Any]] = []
+        async for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield await self._with_error_kinds(batch)
+                batch = []
+        if batch:
+            yield await self._with_error_kinds(batch)
+
+    async def _with_error_kinds(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        failed = {row["id"]: row for row in batch if row["status"] == "failed"}
+        if failed:
+            async for letter in self.dead_letters.find({"id": {"$in": list(failed)}}, {"_id": 0, "id": 1, "error_kind": 1}):
+                failed[letter["id"]]["error_kind"] = letter.get("error_kind")
+        return batch
+
+
+async def csv_chunks(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    # the header goes out before the first query returns
+    yield buffer.getvalue().encode("utf-8")
+    async for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file object whose contents are taken out after every row group"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        out, self._chunks = b"".join(self._chunks), []
+        return out
+
+
+@lru_cache(maxsize=None)
+def _schema():
+    import pyarrow as pa
+
+    types = {"string": pa.string(), "int32": pa.int32(), "bool": pa.bool_(), "timestamp": pa.timestamp("us", tz="UTC")}
+    return pa.schema([(name, types[kind]) for name, kind in FIELDS])
+
+
+def _table(batch: List[Dict[str, Any]]):
+    import pandas as pd
+    import pyarrow as pa
+
+    frame = pd.DataFrame.from_records(batch, columns=COLUMNS)
+    for column in TIME_COLUMNS:
+        frame[column] = pd.to_datetime(frame[column], utc=True, format="ISO8601", errors="coerce")
+    return pa.Table.from_pandas(frame, schema=_schema(), preserve_index=False)
+
+
+async def parquet_chunks(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    import pyarrow.parquet as pq
+
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, _schema(), compression="snappy")
+    try:
+        async for batch in batches:
+            await asyncio.to_thread(lambda b=batch: writer.write_table(_table(b)))
+            chunk = sink.take()
+            if chunk:
+                yield chunk
+    finally:
+        # the footer; an empty export is still a valid file
+        writer.close()
+    yield sink.take()
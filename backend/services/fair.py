@@ -0,0 +1,164 @@
+"""
+Fair batch selection for the scheduler
+
+Instead of taking the first N due items in index order (where one huge
+sequence starves everything due at the same time), each batch is shared out
+by deficit-weighted round robin: owners get equal shares, sequences within an
+owner share by `priority`, and `max_in_flight` caps a sequence's share of one
+batch. Credits carry over between iterations, so a sequence that gets less
+than one slot per batch still gets its turn.
+"""
+
+import asyncio
+import math
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence as Seq
+
+DEFAULT_PRIORITY = 1
+
+
+class FairScheduler:
+    """Chooses which due queue items go into the next scheduler batch"""
+
+    def __init__(self, db, refresh_seconds: float = 5.0, partition_for: Optional[Callable[[str], int]] = None):
+        self.db = db
+        self.partition_for = partition_for or (lambda sequence_id: 0)
+        self.refresh_seconds = refresh_seconds
+        self._sequences: List[Dict[str, Any]] = []
+        self._loaded_at = 0.0
+        self._credits: Dict[str, float] = defaultdict(float)
+        # sequences with nothing due are skipped until their next item's scheduled_at
+        self._next_due: Dict[str, str] = {}
+
+    async def ensure_indexes(self):
+        await self.db.sequence_queue.create_index([("sequence_id", 1), ("status", 1), ("scheduled_at", 1)])
+
+    async def _active_sequences(self) -> List[Dict[str, Any]]:
+        if time.monotonic() - self._loaded_at > self.refresh_seconds:
+            self._sequences = await self.db.sequences.find(
+                {"status": "active"},
+                {"_id": 0, "sequence_id": 1, "priority": 1, "max_in_flight": 1, "owner": 1},
+            ).to_list(None)
+            for s in self._sequences:
+                s["partition"] = self.partition_for(s["sequence_id"])
+            self._loaded_at = time.monotonic()
+            # new or redriven items may be due sooner than we last saw
+            self._next_due.clear()
+            active = {s["sequence_id"] for s in self._sequences}
+            for sid in [sid for sid in self._credits if sid not in active]:
+                del self._credits[sid]
+        return self._sequences
+
+    def allocate(self, slots: int, sequences: Seq[Dict[str, Any]]) -> Dict[str, int]:
+        """Split `slots` across sequences by owner, then priority, honouring caps"""
+        if slots <= 0 or not sequences:
+            return {}
+        owners: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+        for s in sequences:
+            owners[s.get("owner")].append(s)
+        caps: Dict[str, int] = {}
+        for members in owners.values():
+            owner_share = slots / len(owners)
+            total_weight = sum(max(s.get("priority") or DEFAULT_PRIORITY, 1) for s in members)
+            for s in members:
+                sid = s["sequence_id"]
+                weight = max(s.get("priority") or DEFAULT_PRIORITY, 1)
+                # bounded so a long-idle sequence cannot bank a burst
+                self._credits[sid] = min(self._credits[sid] + owner_share * weight / total_weight, float(slots))
+                caps[sid] = min(s.get("max_in_flight") or slots, slots)
+        quotas = {sid: max(0, min(caps[sid], math.floor(self._credits[sid]))) for sid in caps}
+        remaining = slots - sum(quotas.values())
+        while remaining > 0:
+            open_ids = [sid for sid in caps if quotas[sid] < caps[sid]]
+            if not open_ids:
+                break
+            best = max(open_ids, key=lambda sid: self._credits[sid] - quotas[sid])
+            quotas[best] += 1
+            remaining -= 1
+        return {sid: q for sid, q in quotas.items() if q > 0}
+
+    async def _fetch(self, sequence_id: str, limit: int, now_iso: str, exclude: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {"sequence_id": sequence_id, "status": "pending"}
+        if exclude:
+            query["id"] = {"$nin": exclude}
+        items = await self.db.sequence_queue.find(query).sort("scheduled_at", 1).limit(limit).to_list(limit)
+        due = [it for it in items if (it.get("scheduled_at") or "") <= now_iso]
+        if not due and items:
+            self._next_due[sequence_id] = items[0]["scheduled_at"]
+        elif not items:
+            self._next_due[sequence_id] = "~"  # sorts after any timestamp; cleared on refresh
+        return due
+
+    async def select_batch(
+        self,
+        batch_size: int,
+        now_iso: str,
+        partitions: Optional[List[int]] = None,
+        refill_rounds: int = 2,
+    ) -> List[Dict[str, Any]]:
+        """`partitions` restricts the batch to sequences whose queue partition is in the list"""
+        pool = [
+            s for s in await self._active_sequences()
+            if self._next_due.get(s["sequence_id"], "") <= now_iso
+            and (partitions is None or s["partition"] in partitions)
+        ]
+        room = {s["sequence_id"]: min(s.get("max_in_flight") or batch_size, batch_size) for s in pool}
+        picked: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        leftover = batch_size
+        # first pass by share, then hand unused slots to sequences that still have a backlog
+        for _ in range(1 + refill_rounds):
+            quotas = self.allocate(leftover, [s for s in pool if room[s["sequence_id"]] > 0])
+            if not quotas:
+                break
+            fetched = await asyncio.gather(*(
+                self._fetch(sid, min(q, room[sid]), now_iso, exclude=[it["id"] for it in picked[sid]])
+                for sid, q in quotas.items()
+            ))
+            backlogged = set()
+            for (sid, quota), got in zip(quotas.items(), fetched):
+                picked[sid] += got
+                room[sid] -= len(got)
+                if len(got) < min(quota, room[sid] + len(got)):
+                    # no backlog: don't let unused credit accumulate
+                    self._credits[sid] = 0.0
+                else:
+                    self._credits[sid] = max(self._credits[sid] - len(got), -float(batch_size))
+                    if room[sid] > 0:
+                        backlogged.add(sid)
+                    else:
+                        # capped by max_in_flight: the cap, not lack of credit, held it back
+                        self._credits[sid] = min(self._credits[sid], 0.0)
+            leftover = batch_size - sum(len(v) for v in picked.values())
+            pool = [s for s in pool if s["sequence_id"] in backlogged]
+            if leftover <= 0 or not pool:
+                break
+
+        batch = _interleave([v for v in picked.values() if v])
+        if leftover > 0:
+            # items of sequences that are not marked active (or were just created) still go out
+            known = [s["sequence_id"] for s in self._sequences]
+            query: Dict[str, Any] = {"status": "pending", "scheduled_at": {"$lte": now_iso}, "sequence_id": {"$nin": known}}
+            if partitions is not None:
+                query["partition"] = {"$in": partitions}
+            batch += await self.db.sequence_queue.find(query).limit(leftover).to_list(leftover)
+        return batch
+
+
+def _interleave(groups: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Round-robin across sequences so concurrent sends are spread between them"""
+    out: List[Dict[str, Any]] = []
+    for i in range(max((len(g) for g in groups), default=0)):
+        out.extend(g[i] for g in groups if i < len(g))
+    return out
+
+
+def lag_percentiles(lags: Seq[float]) -> Dict[str, Any]:
+    if not lags:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(lags)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, math.ceil(p * len(ordered)) - 1)], 3)
+
+    return {"count": len(ordered), "p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99), "max": round(ordered[-1], 3)}
@@ -0,0 +1,225 @@
+"""
+Tracked background jobs
+
+Long-running work (enqueueing large sequences) runs as an asyncio task whose
+progress is persisted in the `jobs` collection, so any API replica can report
+status. Cancellation is cooperative: the job checks between chunks. A job's
+`on_cancel` cleanup runs only when a user cancelled it; a job replaced by a
+newer one for the same sequence leaves the state to its replacement.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested"""
+
+
+class JobContext:
+    """Handed to the job body for progress reporting and cancellation checks"""
+
+    def __init__(self, manager: "JobManager", job_id: str):
+        self.manager = manager
+        self.job_id = job_id
+        self.cancel_event = asyncio.Event()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    async def report(self, done: int, total: Optional[int] = None, **stats):
+        """Persist progress; also picks up cancellation requested from another replica"""
+        update: Dict[str, Any] = {"progress.done": done, "updated_at": _now_iso()}
+        if total is not None:
+            update["progress.total"] = total
+        for key, value in stats.items():
+            update[f"stats.{key}"] = value
+        doc = await self.manager.collection.find_one_and_update(
+            {"id": self.job_id},
+            {"$set": update},
+            projection={"_id": 0, "cancel_requested": 1},
+        )
+        if doc and doc.get("cancel_requested"):
+            self.cancel_event.set()
+        self.manager._notify(self.job_id)
+        self.check_cancelled()
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobManager:
+    """Starts, tracks and cancels background jobs"""
+
+    def __init__(self, db, stale_after_seconds: float = 600, replace_grace_seconds: float = 30):
+        self.collection = db.jobs
+        self.stale_after = timedelta(seconds=stale_after_seconds)
+        self.replace_grace = timedelta(seconds=replace_grace_seconds)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._contexts: Dict[str, JobContext] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id", unique=True)
+        await self.collection.create_index([("sequence_id", 1), ("created_at", -1)])
+        await self.collection.create_index([("status", 1), ("updated_at", 1)])
+
+    async def fail_orphaned(self) -> int:
+        """Jobs whose process died stop heartbeating; mark them failed"""
+        cutoff = (datetime.now(timezone.utc) - self.stale_after).isoformat()
+        res = await self.collection.update_many(
+            {"status": {"$in": ["queued", "running"]}, "updated_at": {"$lt": cutoff}},
+            {"$set": {"status": "failed", "error": "interrupted", "finished_at": _now_iso()}},
+        )
+        return res.modified_count
+
+    def _notify(self, job_id: str):
+        event = self._changed.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def submit(
+        self,
+        kind: str,
+        body: Callable[[JobContext], Awaitable[Dict[str, Any]]],
+        sequence_id: Optional[str] = None,
+        on_cancel: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """Record a job and run `body` in the background; returns the job document
+
+        `on_cancel` runs after a user cancel, not when the job is replaced.
+        """
+        job_id = str(uuid.uuid4())
+        now = _now_iso()
+        doc = {
+            "id": job_id,
+            "kind": kind,
+            "sequence_id": sequence_id,
+            "status": "running",
+            "progress": {"done": 0, "total": None},
+            "stats": {},
+            "error": None,
+            "cancel_requested": False,
+            "cancel_reason": None,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None,
+        }
+        await self.collection.insert_one(dict(doc))
+        ctx = JobContext(self, job_id)
+        self._contexts[job_id] = ctx
+        self._tasks[job_id] = asyncio.create_task(self._run(ctx, body, on_cancel))
+        return doc
+
+    async def _run(self, ctx: JobContext, body, on_cancel):
+        job_id = ctx.job_id
+        final: Dict[str, Any]
+        try:
+            stats = await body(ctx)
+            final = {"status": "completed", "stats": stats or {}}
+        except asyncio.CancelledError:
+            # process shutdown, not a user cancel: leave enqueued work in place
+            final = {"status": "failed", "error": "interrupted"}
+        except JobCancelled:
+            final = {"status": "cancelled"}
+            doc = await self.collection.find_one({"id": job_id}, {"_id": 0, "cancel_reason": 1})
+            replaced = (doc or {}).get("cancel_reason") == "replaced"
+            if on_cancel is not None and not replaced:
+                try:
+                    await on_cancel()
+                except Exception as e:
+                    logger.error(f"Cleanup for cancelled job {job_id} failed: {e}")
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed: {e}")
+            final = {"status": "failed", "error": str(e)}
+        now = _now_iso()
+        await self.collection.update_one({"id": job_id}, {"$set": {**final, "updated_at": now, "finished_at": now}})
+        self._tasks.pop(job_id, None)
+        self._contexts.pop(job_id, None)
+        self._notify(job_id)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": job_id}, {"_id": 0})
+
+    async def latest_for_sequence(self, sequence_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"sequence_id": sequence_id}, {"_id": 0}, sort=[("created_at", -1)])
+
+    async def cancel(self, job_id: str, reason: str = "user") -> Optional[Dict[str, Any]]:
+        """Request cancellation; the running replica stops at its next chunk boundary"""
+        doc = await self.collection.find_one_and_update(
+            {"id": job_id, "status": {"$nin": list(TERMINAL_STATUSES)}},
+            {"$set": {"cancel_requested": True, "cancel_reason": reason, "updated_at": _now_iso()}},
+        )
+        ctx = self._contexts.get(job_id)
+        if ctx is not None:
+            ctx.cancel_event.set()
+        return await self.get(job_id) if doc is not None else None
+
+    async def cancel_sequence(self, sequence_id: str, poll_seconds: float = 0.5):
+        """
+        Cancel any in-flight job for a sequence as replaced, and wait until
+        every one of them has stopped. Local jobs are awaited. A job on
+        another replica that has reported within `replace_grace` gets that
+        long to notice at its next chunk; one that has gone quiet (its
+        replica is dead or stuck) is marked cancelled at once rather than
+        waiting for the stale sweep.
+        """
+        live = {"sequence_id": sequence_id, "status": {"$nin": list(TERMINAL_STATUSES)}}
+        # read the heartbeats before cancel() bumps updated_at
+        jobs = [doc async for doc in self.collection.find(live, {"_id": 0, "id": 1, "updated_at": 1})]
+        ids = [doc["id"] for doc in jobs]
+        for job_id in ids:
+            await self.cancel(job_id, reason="replaced")
+        local = {job_id: self._tasks[job_id] for job_id in ids if job_id in self._tasks}
+        if local:
+            await asyncio.wait(list(local.values()))
+        cutoff = (datetime.now(timezone.utc) - self.replace_grace).isoformat()
+        remote = [doc for doc in jobs if doc["id"] not in local]
+        quiet = [doc["id"] for doc in remote if (doc.get("updated_at") or "") < cutoff]
+        waiting = [doc["id"] for doc in remote if doc["id"] not in quiet]
+        deadline = asyncio.get_running_loop().time() + self.replace_grace.total_seconds()
+        while waiting and asyncio.get_running_loop().time() < deadline:
+            if await self.collection.find_one({**live, "id": {"$in": waiting}}, {"_id": 1}) is None:
+                break
+            await asyncio.sleep(poll_seconds)
+        now = _now_iso()
+        res = await self.collection.update_many(
+            {**live, "id": {"$in": ids}},
+            {"$set": {"status": "cancelled", "error": "owner unresponsive", "updated_at": now, "finished_at": now}},
+        )
+        if res.modified_count:
+            logger.warning(f"Marked {res.modified_count} unresponsive job(s) for sequence {sequence_id} cancelled")
+
+    async def watch(self, job_id: str, poll_seconds: float = 1.0) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the job document whenever it changes, until it reaches a terminal state"""
+        last = None
+        while True:
+            event = self._changed.setdefault(job_id, asyncio.Event())
+            doc = await self.get(job_id)
+            if doc is None:
+                return
+            if doc != last:
+                last = doc
+                yield doc
+            if doc["status"] in TERMINAL_STATUSES:
+                return
+            # local jobs wake us on every report; jobs on other replicas are polled
+            try:
+                await asyncio.wait_for(event.wait(), timeout=poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def shutdown(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._tasks:
+            await asyncio.wait(list(self._tasks.values()))
@@ -0,0 +1,186 @@
+"""
+Prometheus metrics for the scheduler and AI routes
+
+Every labelled child is created once at import time and kept in a module
+constant, so hot paths only do `observe()`/`inc()` on a preallocated object
+and never build label sets per call.
+"""
+
+import functools
+import inspect
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+REGISTRY = CollectorRegistry()
+
+QUEUE_STATUSES = ("pending", "pending_paused", "sending", "sent", "failed", "task_created", "suppressed")
+SEND_OUTCOMES = ("sent", "deferred", "retried", "dead_lettered", "suppressed", "task_created", "claim_lost")
+AI_ROUTES = ("score-lead", "score-leads-batch", "engagement-index", "generate-content", "generate-content-stream")
+LLM_PROVIDERS = ("openai", "gemini", "fake", "template")
+
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LAG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 4 * 3600, 24 * 3600)
+
+_queue_items = Gauge("saasquatch_queue_items", "sequence_queue items by status", ["status"], registry=REGISTRY)
+QUEUE_ITEMS: Dict[str, Any] = {s: _queue_items.labels(status=s) for s in QUEUE_STATUSES}
+OLDEST_DUE_LAG = Gauge(
+    "saasquatch_queue_oldest_due_lag_seconds",
+    "now - scheduled_at of the oldest pending item that is already due",
+    registry=REGISTRY,
+)
+SEND_LAG = Histogram(
+    "saasquatch_send_lag_seconds",
+    "Delay between an item's scheduled_at and when it was dispatched",
+    buckets=LAG_BUCKETS,
+    registry=REGISTRY,
+)
+
+_stage = Histogram(
+    "saasquatch_scheduler_stage_seconds",
+    "Scheduler stage latency",
+    ["stage"],
+    buckets=FAST_BUCKETS,
+    registry=REGISTRY,
+)
+CLAIM_SECONDS = _stage.labels(stage="claim")
+SEND_SECONDS = _stage.labels(stage="send")
+UPDATE_SECONDS = _stage.labels(stage="update")
+
+_smtp = Histogram(
+    "saasquatch_smtp_seconds",
+    "SMTP latency split into connection setup (connect+TLS+login) and message send",
+    ["phase"],
+    buckets=SLOW_BUCKETS,
+    registry=REGISTRY,
+)
+SMTP_CONNECT_SECONDS = _smtp.labels(phase="connect")
+SMTP_SEND_SECONDS = _smtp.labels(phase="send")
+
+BATCH_SIZE = Histogram(
+    "saasquatch_scheduler_batch_size",
+    "Items claimed per scheduler iteration",
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000),
+    registry=REGISTRY,
+)
+LOOP_SECONDS = Histogram(
+    "saasquatch_scheduler_loop_seconds",
+    "Duration of one scheduler iteration (excluding the sleep)",
+    buckets=SLOW_BUCKETS,
+    registry=REGISTRY,
+)
+_outcomes = Counter("saasquatch_send_outcomes_total", "Scheduler dispatch outcomes", ["outcome"], registry=REGISTRY)
+OUTCOMES: Dict[str, Any] = {o: _outcomes.labels(outcome=o) for o in SEND_OUTCOMES}
+
+DNS_SECONDS = Histogram(
+    "saasquatch_dns_lookup_seconds",
+    "MX lookup latency in lead scoring",
+    buckets=FAST_BUCKETS,
+    registry=REGISTRY,
+)
+WEBSITE_PROBE_SECONDS = Histogram(
+    "saasquatch_website_probe_seconds",
+    "Website + MX probe latency per domain in enrichment",
+    buckets=SLOW_BUCKETS,
+    registry=REGISTRY,
+)
+_llm = Histogram(
+    "saasquatch_llm_seconds",
+    "Content generation latency by provider",
+    ["provider"],
+    buckets=SLOW_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_SECONDS: Dict[str, Any] = {p: _llm.labels(provider=p) for p in LLM_PROVIDERS}
+_llm_first_token = Histogram(
+    "saasquatch_llm_first_token_seconds",
+    "Time to the first streamed chunk by provider",
+    ["provider"],
+    buckets=SLOW_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_FIRST_TOKEN_SECONDS: Dict[str, Any] = {p: _llm_first_token.labels(provider=p) for p in LLM_PROVIDERS}
+LLM_STREAM_FALLBACKS = Counter(
+    "saasquatch_llm_stream_fallbacks_total",
+    "Streamed generations replaced by the template after a stall or provider error",
+    registry=REGISTRY,
+)
+_ai_route = Histogram(
+    "saasquatch_ai_request_seconds",
+    "End-to-end latency of /api/ai/* routes",
+    ["route"],
+    buckets=SLOW_BUCKETS,
+    registry=REGISTRY,
+)
+AI_ROUTE_SECONDS: Dict[str, Any] = {r: _ai_route.labels(route=r) for r in AI_ROUTES}
+
+
+def timed(child) -> Callable:
+    """
+    Decorator observing an async function's duration on a preallocated
+    histogram child. On an async generator it covers the whole iteration, so
+    a streamed response is timed until its last event.
+    """
+    def decorator(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def generator(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    async for item in fn(*args, **kwargs):
+                        yield item
+                finally:
+                    child.observe(time.perf_counter() - start)
+            return generator
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+_gauges_refreshed_at = 0.0
+
+
+async def refresh_queue_gauges(db, max_age_seconds: float = 0.0):
+    """
+    Recompute queue depth and due lag; called at scrape time, not on the hot
+    path. Each status is one `count_documents` on the `(status, scheduled_at)`
+    index, and scrapes within `max_age_seconds` of the last refresh reuse it.
+    """
+    global _gauges_refreshed_at
+    if time.monotonic() - _gauges_refreshed_at < max_age_seconds:
+        return
+    _gauges_refreshed_at = time.monotonic()
+    for status in QUEUE_STATUSES:
+        QUEUE_ITEMS[status].set(await db.sequence_queue.count_documents({"status": status}))
+
+    now = datetime.now(timezone.utc)
+    oldest = await db.sequence_queue.find_one(
+        {"status": "pending", "scheduled_at": {"$lte": now.isoformat()}},
+        {"_id": 0, "scheduled_at": 1},
+        sort=[("scheduled_at", 1)],
+    )
+    lag = 0.0
+    if oldest and oldest.get("scheduled_at"):
+        lag = max((now - datetime.fromisoformat(oldest["scheduled_at"])).total_seconds(), 0.0)
+    OLDEST_DUE_LAG.set(lag)
+
+
+def render_latest():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
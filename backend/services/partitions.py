@@ -0,0 +1,163 @@
+"""
+Hash-partitioned scheduler ownership
+
+Every queue item carries `partition = crc32(sequence_id) % partitions`.
+Scheduler members heartbeat into `scheduler_members` and split partitions by
+rendezvous hashing, so a join or leave only moves the partitions it has to.
+
+A partition changes hands in two steps. The new owner first publishes a
+claim, reads the other members again, and only activates partitions that no
+other live member claims or holds. The scheduler calls `current()` before
+claiming each item and only claims items in the partitions it returns, so a
+member whose heartbeat lapses mid-batch stops sending before another member
+takes over.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LIVE_STATUSES = ["pending", "pending_paused", "sending", "failed"]
+
+
+def partition_for(sequence_id: str, partitions: int) -> int:
+    return zlib.crc32(sequence_id.encode("utf-8")) % partitions
+
+
+def _rank(member_id: str, partition: int) -> int:
+    return zlib.crc32(f"{member_id}:{partition}".encode("utf-8"))
+
+
+class PartitionMembership:
+    """Tracks which queue partitions this scheduler process may dispatch"""
+
+    def __init__(
+        self,
+        db,
+        partitions: int = 16,
+        heartbeat_seconds: float = 10,
+        ttl_seconds: float = 45,
+        member_id: Optional[str] = None,
+    ):
+        self.members = db.scheduler_members
+        self.queue = db.sequence_queue
+        self.partitions = max(partitions, 1)
+        self.heartbeat_seconds = heartbeat_seconds
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.member_id = member_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.owned: List[int] = []
+        self._claimed: List[int] = []
+        self._last_beat: Optional[float] = None
+        self._beat_lock: Optional[asyncio.Lock] = None
+
+    def partition_for(self, sequence_id: str) -> int:
+        return partition_for(sequence_id, self.partitions)
+
+    @property
+    def owns_all(self) -> bool:
+        return len(self.owned) == self.partitions
+
+    async def ensure_indexes(self):
+        await self.members.create_index("member_id", unique=True)
+        # dead members are garbage-collected; liveness itself is judged by `ttl`
+        await self.members.create_index("heartbeat_at", expireAfterSeconds=86400)
+        await self.queue.create_index([("status", 1), ("partition", 1), ("scheduled_at", 1)])
+
+    async def assign_partitions(self, query: Optional[Dict[str, Any]] = None) -> int:
+        """Stamp live items whose partition is missing or stale (e.g. after a partition count change)"""
+        query = query or {"status": {"$in": LIVE_STATUSES}}
+        updated = 0
+        for sequence_id in await self.queue.distinct("sequence_id", query):
+            expected = self.partition_for(sequence_id)
+            res = await self.queue.update_many(
+                {**query, "sequence_id": sequence_id, "partition": {"$ne": expected}},
+                {"$set": {"partition": expected}},
+            )
+            updated += res.modified_count
+        if updated:
+            logger.info(f"Assigned partitions to {updated} queue items")
+        return updated
+
+    async def _others(self, now: datetime) -> List[Dict[str, Any]]:
+        return await self.members.find(
+            {"member_id": {"$ne": self.member_id}, "heartbeat_at": {"$gt": now - self.ttl}},
+            {"_id": 0},
+        ).to_list(None)
+
+    async def _publish(self, now: datetime, claimed: List[int], active: List[int]):
+        await self.members.update_one(
+            {"member_id": self.member_id},
+            {
+                "$set": {"heartbeat_at": now, "claimed": claimed, "partitions": active, "partition_count": self.partitions},
+                "$setOnInsert": {"started_at": now},
+            },
+            upsert=True,
+        )
+
+    async def heartbeat(self) -> List[int]:
+        now = datetime.now(timezone.utc)
+        others = await self._others(now)
+        for m in others:
+            if m.get("partition_count") != self.partitions:
+                logger.warning(f"Scheduler member {m['member_id']} uses {m.get('partition_count')} partitions, this one {self.partitions}")
+        ids = [m["member_id"] for m in others] + [self.member_id]
+        target = [p for p in range(self.partitions) if max(ids, key=lambda mid: _rank(mid, p)) == self.member_id]
+        held = {p for m in others for p in m.get("partitions", [])}
+        claimed = [p for p in target if p not in held]
+        # drop lost partitions at once; new ones only after the claim is visible to others
+        await self._publish(now, claimed, [p for p in self.owned if p in claimed])
+
+        others = await self._others(now)
+        contested = {p for m in others for p in m.get("partitions", []) + m.get("claimed", [])}
+        active = [p for p in claimed if p not in contested]
+        await self._publish(now, claimed, active)
+
+        if active != self.owned:
+            logger.info(f"Scheduler member {self.member_id} owns {len(active)}/{self.partitions} partitions")
+        self.owned, self._claimed = active, claimed
+        self._last_beat = time.monotonic()
+        return active
+
+    def _beat_due(self) -> bool:
+        return self._last_beat is None or time.monotonic() - self._last_beat >= self.heartbeat_seconds
+
+    async def current(self) -> List[int]:
+        """Owned partitions, heartbeating first when one is due; called before every claim"""
+        if self._beat_due():
+            if self._beat_lock is None:
+                self._beat_lock = asyncio.Lock()
+            # concurrent sends share one heartbeat
+            async with self._beat_lock:
+                if self._beat_due():
+                    try:
+                        await self.heartbeat()
+                    except Exception:
+                        # others take over after `ttl`; stop dispatching before that happens
+                        if self._last_beat is None or time.monotonic() - self._last_beat > self.ttl.total_seconds() / 2:
+                            self.owned = []
+                        raise
+        return self.owned
+
+    async def leave(self):
+        """Release everything so the remaining members rebalance on their next beat"""
+        self.owned, self._claimed = [], []
+        self._last_beat = None
+        await self.members.delete_one({"member_id": self.member_id})
+
+    async def snapshot(self) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        members = await self.members.find({}, {"_id": 0}).sort("member_id", 1).to_list(None)
+        for m in members:
+            beat = m.get("heartbeat_at")
+            if isinstance(beat, datetime) and beat.tzinfo is None:
+                beat = beat.replace(tzinfo=timezone.utc)
+            m["live"] = bool(beat) and beat > now - self.ttl
+        return members
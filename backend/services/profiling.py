@@ -0,0 +1,264 @@
+"""
+Opt-in request profiling
+
+`ProfilingMiddleware` profiles a sampled fraction of `/api` requests from
+their first byte, and starts profiling any other request once it has run
+longer than the slow threshold. Profiling is statistical: one daemon thread
+reads the event loop thread's stack every few milliseconds with
+`sys._current_frames()` and counts collapsed stacks (flamegraph.pl /
+speedscope "folded" format). Requests share the loop, so a capture also
+contains whatever else ran concurrently; `concurrent` records how much.
+
+Time spent in MongoDB (via a pymongo `CommandListener`), MX lookups and LLM
+calls is attributed to the request through a context variable; motor and
+`asyncio.to_thread` copy it into their worker threads. Nothing here is
+installed when profiling is off.
+"""
+
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+MAX_STACKS = 2000  # keeps one capture document far below the 16 MB limit
+MAX_DEPTH = 64
+
+_current: ContextVar[Optional["Capture"]] = ContextVar("request_profile", default=None)
+
+
+def record(span: str, seconds: float):
+    """Add time spent in `span` (e.g. "dns", "llm") to the request being profiled, if any"""
+    capture = _current.get()
+    if capture is not None:
+        capture.spans[span] = capture.spans.get(span, 0.0) + seconds
+
+
+class Capture:
+    __slots__ = ("started", "sampling_from", "stacks", "samples", "concurrent", "spans", "db_commands", "db_calls")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sampling_from: Optional[float] = None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.concurrent = 0
+        self.spans: Dict[str, float] = {}
+        self.db_commands: Counter = Counter()
+        self.db_calls = 0
+
+
+def command_listener():
+    """pymongo listener counting commands and their server time for the request being profiled"""
+    # imported here so `record` stays cheap to import for the offline scorer
+    from pymongo import monitoring
+
+    class CommandCounter(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def _finish(self, event):
+            capture = _current.get()
+            if capture is not None:
+                capture.db_calls += 1
+                capture.db_commands[event.command_name] += 1
+                capture.spans["db"] = capture.spans.get("db", 0.0) + event.duration_micros / 1e6
+
+        def succeeded(self, event):
+            self._finish(event)
+
+        def failed(self, event):
+            self._finish(event)
+
+    return CommandCounter()
+
+
+def _collapse(frame) -> str:
+    parts: List[str] = []
+    while frame is not None and len(parts) < MAX_DEPTH:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class StackSampler:
+    """One daemon thread sampling the event loop thread for every active capture"""
+
+    def __init__(self, interval_seconds: float = 0.005):
+        self.interval = interval_seconds
+        self._active: Set[Capture] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._target: Optional[int] = None
+
+    def start(self, capture: Capture):
+        capture.sampling_from = time.perf_counter()
+        with self._lock:
+            self._target = threading.get_ident()
+            self._active.add(capture)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, capture: Capture):
+        with self._lock:
+            self._active.discard(capture)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = list(self._active)
+                target = self._target
+            if not active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            frame = sys._current_frames().get(target)
+            if frame is not None:
+                stack = _collapse(frame)
+                for capture in active:
+                    if len(capture.stacks) < MAX_STACKS or stack in capture.stacks:
+                        capture.stacks[stack] += 1
+                    capture.samples += 1
+                    capture.concurrent += len(active) - 1
+            del frame
+            time.sleep(self.interval)
+
+
+class ProfileStore:
+    """Persists captures in `request_profiles`, expiring them after `retention_days`"""
+
+    def __init__(self, db, retention_days: float = 7):
+        self.collection = db.request_profiles
+        self.retention_days = retention_days
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id", unique=True)
+        await self.collection.create_index([("route", 1), ("created_at", -1)])
+        if self.retention_days > 0:
+            await self.collection.create_index("created_at", expireAfterSeconds=int(self.retention_days * 86400))
+
+    async def save(self, doc: Dict[str, Any]):
+        await self.collection.insert_one(doc)
+
+    async def list(self, route: Optional[str] = None, min_ms: float = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {}
+        if route:
+            query["route"] = route
+        if min_ms:
+            query["duration_ms"] = {"$gte": min_ms}
+        return await self.collection.find(query, {"_id": 0, "stacks": 0}).sort("created_at", -1).to_list(limit)
+
+    async def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": profile_id}, {"_id": 0})
+
+
+class ProfilingMiddleware:
+    """ASGI middleware capturing sampled and slow `/api` requests"""
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        sample_rate: float = 0.0,
+        slow_ms: float = 0.0,
+        interval_ms: float = 5.0,
+        path_prefix: str = "/api",
+        exclude_prefixes: tuple = ("/api/admin/profiles",),
+    ):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_ms / 1000.0
+        self.interval_ms = interval_ms
+        self.path_prefix = path_prefix
+        self.exclude_prefixes = exclude_prefixes
+        self.sampler = StackSampler(interval_ms / 1000.0)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.path_prefix) or path.startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        capture = Capture()
+        token = _current.set(capture)
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        timer = None
+        if sampled:
+            self.sampler.start(capture)
+        elif self.slow_seconds > 0:
+            # late start: only the part after the threshold is sampled
+            timer = asyncio.get_running_loop().call_later(self.slow_seconds, self.sampler.start, capture)
+        response: Dict[str, Any] = {"status": None, "streaming": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                content_type = dict(message.get("headers") or []).get(b"content-type", b"")
+                response["streaming"] = content_type.startswith(b"text/event-stream")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - capture.started
+            if timer is not None:
+                timer.cancel()
+            self.sampler.stop(capture)
+            _current.reset(token)
+            slow = self.slow_seconds > 0 and duration >= self.slow_seconds
+            # long-lived SSE streams are slow by design
+            if (sampled or slow) and not response["streaming"]:
+                try:
+                    await self.store.save(self._document(scope, capture, duration, response["status"], sampled))
+                except Exception as e:
+                    logger.error(f"Failed to store request profile: {e}")
+
+    def _route(self, scope) -> str:
+        from starlette.routing import Match
+
+        for route in getattr(scope.get("app"), "routes", []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", scope["path"])
+        return scope["path"]
+
+    def _document(self, scope, capture: Capture, duration: float, status: Optional[int], sampled: bool) -> Dict[str, Any]:
+        sampled_for = time.perf_counter() - capture.sampling_from if capture.sampling_from else 0.0
+        spans_ms = {k: round(v * 1000, 3) for k, v in capture.spans.items()}
+        return {
+            "id": str(uuid.uuid4()),
+            "created_at": datetime.now(timezone.utc),
+            "method": scope.get("method"),
+            "path": scope["path"],
+            "route": self._route(scope),
+            "status": status,
+            "reason": "sampled" if sampled else "slow",
+            "duration_ms": round(duration * 1000, 3),
+            "sampled_from_ms": round((capture.sampling_from - capture.started) * 1000, 3) if capture.sampling_from else None,
+            "sampled_ms": round(sampled_for * 1000, 3),
+            "interval_ms": self.interval_ms,
+            "samples": capture.samples,
+            "concurrent": round(capture.concurrent / capture.samples, 2) if capture.samples else 0,
+            "spans_ms": spans_ms,
+            "db_calls": capture.db_calls,
+            "db_commands": dict(capture.db_commands),
+            "stacks": [{"stack": s, "count": n} for s, n in capture.stacks.most_common()],
+        }
+
+
+def folded(doc: Dict[str, Any]) -> str:
+    """Render a stored capture as folded stacks for flamegraph.pl / speedscope"""
+    return "".join(f"{s['stack']} {s['count']}\n" for s in doc.get("stacks", []))
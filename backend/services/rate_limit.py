@@ -0,0 +1,192 @@
+"""
+Token-bucket send rate limiting keyed by recipient domain and sending account
+
+Buckets live in this process's memory, so limits apply per process: N
+scheduler processes together may send up to N times the configured rate.
+A bucket that has refilled to full is indistinguishable from a new one and
+is dropped by a periodic sweep, so a long tail of one-off recipient domains
+does not accumulate.
+"""
+
+import json
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS: Dict[str, Any] = {
+    # applies to any recipient domain without an explicit entry
+    "default_domain": {"rate_per_minute": 20, "burst": 10},
+    "domains": {
+        "gmail.com": {"rate_per_minute": 30, "burst": 15},
+        "googlemail.com": {"rate_per_minute": 30, "burst": 15},
+        "outlook.com": {"rate_per_minute": 20, "burst": 10},
+        "hotmail.com": {"rate_per_minute": 20, "burst": 10},
+        "yahoo.com": {"rate_per_minute": 15, "burst": 5},
+    },
+    # per sending SMTP account
+    "account": {"rate_per_minute": 60, "burst": 20},
+}
+
+
+def email_domain(email: Optional[str]) -> str:
+    if not email or "@" not in email:
+        return ""
+    return email.rsplit("@", 1)[1].strip().lower()
+
+
+class TokenBucket:
+    """
+    Classic token bucket; refills continuously at `rate` tokens/second. Reserved
+    future tokens are debited at once, so `tokens` can go negative.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "granted", "deferred")
+
+    def __init__(self, rate_per_minute: float, burst: float):
+        self.rate = max(float(rate_per_minute), 0.001) / 60.0
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.granted = 0
+        self.deferred = 0
+
+    def configure(self, rate_per_minute: float, burst: float):
+        now = time.monotonic()
+        self._refill(now)
+        self.rate = max(float(rate_per_minute), 0.001) / 60.0
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available"""
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1.0
+        self.granted += 1
+
+    def reserve(self, now: float) -> float:
+        """
+        Take the next future token now and return the seconds until it exists.
+        Later callers wait behind the debt, so deferred sends are spaced 1/rate
+        apart and the item holding the reservation never competes again.
+        """
+        self._refill(now)
+        self.tokens -= 1.0
+        self.deferred += 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._refill(time.monotonic())
+        return {
+            "rate_per_minute": round(self.rate * 60.0, 3),
+            "burst": self.capacity,
+            "tokens": round(self.tokens, 3),
+            "utilization": round(1.0 - self.tokens / self.capacity, 3),
+            "granted": self.granted,
+            "deferred": self.deferred,
+        }
+
+
+class SendRateLimiter:
+    """Holds one bucket per recipient domain and per sending account"""
+
+    def __init__(self, limits: Optional[Dict[str, Any]] = None, sweep_seconds: float = 60.0):
+        self.limits: Dict[str, Any] = json.loads(json.dumps(DEFAULT_LIMITS))
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.sweep_seconds = sweep_seconds
+        self._swept = time.monotonic()
+        self.evicted = 0
+        if limits:
+            self.configure(limits)
+
+    @classmethod
+    def from_env(cls, value: Optional[str]) -> "SendRateLimiter":
+        limits = None
+        if value:
+            try:
+                limits = json.loads(value)
+            except ValueError as e:
+                logger.error(f"Invalid SEND_RATE_LIMITS, using defaults: {e}")
+        return cls(limits)
+
+    def _domain_limit(self, domain: str) -> Dict[str, Any]:
+        return self.limits["domains"].get(domain) or self.limits["default_domain"]
+
+    def _bucket(self, key: str, limit: Dict[str, Any]) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(limit["rate_per_minute"], limit["burst"])
+            self._buckets[key] = bucket
+        return bucket
+
+    def _sweep(self, now: float):
+        """Drop buckets that are back to full; they would be recreated identical"""
+        self._swept = now
+        idle = [key for key, bucket in self._buckets.items() if bucket.idle(now)]
+        for key in idle:
+            del self._buckets[key]
+        self.evicted += len(idle)
+
+    def acquire(self, domain: str, account: str) -> Tuple[bool, float]:
+        """
+        Try to take one send from both the domain and the account bucket.
+
+        Returns (True, 0) when the send may go out now. Otherwise a token is
+        reserved in both buckets and the delay until the later one exists is
+        returned; the caller must send at that time without acquiring again.
+        """
+        now = time.monotonic()
+        if now - self._swept >= self.sweep_seconds:
+            self._sweep(now)
+        domain_bucket = self._bucket(f"domain:{domain}", self._domain_limit(domain))
+        account_bucket = self._bucket(f"account:{account}", self.limits["account"])
+        buckets = (domain_bucket, account_bucket)
+        if all(b.wait_time(now) <= 0.0 for b in buckets):
+            for b in buckets:
+                b.consume(now)
+            return True, 0.0
+        return False, max(b.reserve(now) for b in buckets)
+
+    def configure(self, updates: Dict[str, Any]):
+        """Apply new limits; existing buckets are retuned in place"""
+        if "default_domain" in updates:
+            self.limits["default_domain"].update(updates["default_domain"])
+        if "account" in updates:
+            self.limits["account"].update(updates["account"])
+        for domain, limit in (updates.get("domains") or {}).items():
+            domain = domain.lower()
+            if limit is None:
+                self.limits["domains"].pop(domain, None)
+            else:
+                self.limits["domains"].setdefault(domain, dict(self.limits["default_domain"])).update(limit)
+        for key, bucket in self._buckets.items():
+            kind, _, name = key.partition(":")
+            limit = self.limits["account"] if kind == "account" else self._domain_limit(name)
+            bucket.configure(limit["rate_per_minute"], limit["burst"])
+
+    def snapshot(self, limit: int = 100) -> Dict[str, Any]:
+        """Limits plus the `limit` busiest buckets; idle ones are only counted"""
+        buckets = {key: bucket.snapshot() for key, bucket in self._buckets.items()}
+        busiest = sorted(buckets, key=lambda key: (-buckets[key]["utilization"], key))[:max(limit, 0)]
+        return {
+            "limits": self.limits,
+            "buckets": {key: buckets[key] for key in sorted(busiest)},
+            "bucket_count": len(buckets),
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,436 @@
+"""
+Reply prediction trained online from real sequence outcomes
+
+Sends become labeled examples in `reply_examples`: positive when a reply is
+reported through the outcomes endpoint, negative once `REPLY_WINDOW_DAYS`
+pass without one. The labeler and the trainer each keep a watermark
+(`sent_at` and `labeled_at`) and only read the index range past it, so
+training never rescans history.
+
+Features are hashed into a fixed-width vector, so the model can keep
+learning with `SGDClassifier.partial_fit` as new industries or titles
+appear. Every training round is saved as a new version in `reply_models`,
+together with the mean feature vector and the feature names seen so far,
+which `services.explain` needs to attribute predictions.
+A version is evaluated on a hash-selected holdout that is never trained on,
+and it is promoted only if it does not do worse than the serving model.
+Serving processes swap to the newest promoted version in place.
+"""
+
+import asyncio
+import logging
+import os
+import pickle
+import socket
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from services.directory import title_seniority
+from services.suppression import DUPLICATE_KEY_ERROR, normalize_email
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 1 << 10
+FREE_MAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "yahoo.com", "hotmail.com", "outlook.com", "live.com",
+    "icloud.com", "aol.com", "proton.me", "protonmail.com", "gmx.com", "mail.com",
+}
+
+
+def reply_features(
+    contact: Dict[str, Any],
+    step_number: Optional[int] = None,
+    channel: str = "email",
+    sent_at: Optional[str] = None,
+) -> Dict[str, float]:
+    """Named features for one send; categorical values become `name=value` indicators"""
+    email = normalize_email(contact.get("email"))
+    domain = email.rsplit("@", 1)[-1] if email else ""
+    features: Dict[str, float] = {
+        f"channel={channel}": 1.0,
+        f"step={min(step_number, 5) if step_number else 'unknown'}": 1.0,
+        f"seniority={title_seniority(contact.get('title') or contact.get('role'))}": 1.0,
+        f"industry={(contact.get('industry') or 'unknown').strip().lower()}": 1.0,
+        f"email={'none' if not domain else 'free' if domain in FREE_MAIL_DOMAINS else 'corporate'}": 1.0,
+    }
+    if contact.get("linkedin_url") or contact.get("linkedin"):
+        features["has_linkedin"] = 1.0
+    if contact.get("company"):
+        features["has_company"] = 1.0
+    score = contact.get("confidence_score")
+    if isinstance(score, (int, float)):
+        features["confidence"] = float(score) / 100.0
+    if sent_at:
+        try:
+            dt = datetime.fromisoformat(sent_at)
+            features[f"hour={dt.hour // 3}"] = 1.0
+            features[f"weekday={dt.weekday()}"] = 1.0
+        except ValueError:
+            pass
+    return features
+
+
+def feature_index(name: str) -> int:
+    return zlib.crc32(name.encode("utf-8")) % N_FEATURES
+
+
+def vectorize(rows: Iterable[Dict[str, float]]) -> "np.ndarray":
+    import numpy as np
+
+    rows = list(rows)
+    X = np.zeros((len(rows), N_FEATURES), dtype=np.float32)
+    for i, row in enumerate(rows):
+        for name, value in row.items():
+            X[i, feature_index(name)] += value
+    return X
+
+
+def in_holdout(key: str, pct: float) -> bool:
+    return zlib.crc32(f"holdout:{key}".encode("utf-8")) % 100 < pct
+
+
+def _new_model():
+    from sklearn.linear_model import SGDClassifier
+
+    # a constant step keeps adapting as reply behaviour drifts; the default schedule overshoots on one pass
+    return SGDClassifier(loss="log_loss", alpha=1e-4, learning_rate="constant", eta0=0.02, random_state=0)
+
+
+def _evaluate(model, X: "np.ndarray", y: "np.ndarray") -> Dict[str, Any]:
+    from sklearn.metrics import log_loss, roc_auc_score
+
+    p = model.predict_proba(X)[:, 1]
+    return {
+        "holdout_n": int(len(y)),
+        "auc": float(roc_auc_score(y, p)) if 0 < y.sum() < len(y) else None,
+        "logloss": float(log_loss(y, p, labels=[0, 1])),
+    }
+
+
+def _not_worse(candidate: Dict[str, Any], current: Optional[Dict[str, Any]], tolerance: float) -> bool:
+    if not current or not current.get("holdout_n"):
+        return True
+    if candidate.get("auc") is not None and current.get("auc") is not None:
+        return candidate["auc"] >= current["auc"] - tolerance
+    return candidate["logloss"] <= current["logloss"] + tolerance
+
+
+class ReplyModelRegistry:
+    """The serving model; replaced by a single reference swap, so readers never see a half-loaded one"""
+
+    def __init__(self, db):
+        self.models = db.reply_models
+        self._active: Optional[Tuple[int, Any, Dict[str, Any]]] = None
+
+    @property
+    def version(self) -> Optional[int]:
+        active = self._active
+        return active[0] if active else None
+
+    @property
+    def model(self):
+        active = self._active
+        return active[1] if active else None
+
+    @property
+    def active(self) -> Optional[Tuple[int, Any, Dict[str, Any]]]:
+        """(version, model, background) read as one; background holds `baseline` and `vocabulary`"""
+        return self._active
+
+    async def ensure_indexes(self):
+        await self.models.create_index("version", unique=True)
+        await self.models.create_index([("promoted", 1), ("version", -1)])
+
+    def swap(self, version: int, model, baseline: Optional["np.ndarray"] = None, vocabulary: Optional[List[str]] = None):
+        self._active = (version, model, {"baseline": baseline, "vocabulary": vocabulary or []})
+        logger.info(f"Serving reply model v{version}")
+
+    def predict(self, rows: List[Dict[str, float]]) -> Optional[List[float]]:
+        active = self._active
+        if active is None:
+            return None
+        return active[1].predict_proba(vectorize(rows))[:, 1].tolist()
+
+    async def refresh(self) -> bool:
+        """Load the newest promoted version if it is not the one being served"""
+        latest = await self.models.find_one({"promoted": True}, {"_id": 0, "version": 1}, sort=[("version", DESCENDING)])
+        if not latest or latest["version"] == self.version:
+            return False
+        doc = await self.models.find_one({"version": latest["version"]}, {"_id": 0, "model": 1, "baseline": 1, "vocabulary": 1})
+        if not doc or not doc.get("model"):
+            return False
+        import numpy as np
+
+        model = await asyncio.to_thread(pickle.loads, doc["model"])
+        baseline = np.asarray(doc["baseline"], dtype=np.float32) if doc.get("baseline") else None
+        self.swap(latest["version"], model, baseline, doc.get("vocabulary"))
+        return True
+
+    async def run_refresh_loop(self, interval_seconds: float):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Reply model refresh error: {e}")
+
+
+class ReplyTrainer:
+    """Labels settled sends and folds new examples into the next model version"""
+
+    def __init__(
+        self,
+        db,
+        registry: ReplyModelRegistry,
+        window_days: float = 14,
+        batch_size: int = 1000,
+        holdout_pct: float = 10,
+        eval_size: int = 5000,
+        tolerance: float = 0.01,
+        keep_versions: int = 10,
+        shuffle_buffer: int = 20000,
+    ):
+        self.db = db
+        self.registry = registry
+        self.examples = db.reply_examples
+        self.state = db.reply_model_state
+        self.window = timedelta(days=window_days)
+        self.batch_size = batch_size
+        self.holdout_pct = holdout_pct
+        self.eval_size = eval_size
+        self.tolerance = tolerance
+        self.keep_versions = keep_versions
+        self.shuffle_buffer = shuffle_buffer
+        self.holder = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    async def ensure_indexes(self):
+        await self.examples.create_index("item_id", unique=True)
+        await self.examples.create_index([("holdout", 1), ("labeled_at", 1), ("item_id", 1)])
+
+    def _example(self, item: Dict[str, Any], label: int, positive: bool, now: datetime) -> Dict[str, Any]:
+        return {
+            "item_id": item["id"],
+            "sequence_id": item.get("sequence_id"),
+            "email_norm": item.get("email_norm"),
+            "label": label,
+            "positive": positive,
+            "labeled_at": now,
+            "holdout": in_holdout(item["id"], self.holdout_pct),
+            "features": reply_features(
+                item.get("contact") or {}, item.get("step_number"), item.get("channel") or "email", item.get("sent_at")
+            ),
+        }
+
+    async def _find_sent(self, sequence_id: str, outcome: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if outcome.get("item_id"):
+            query: Dict[str, Any] = {"id": outcome["item_id"]}
+        else:
+            query = {"sequence_id": sequence_id, "email_norm": normalize_email(outcome.get("email")), "status": "sent"}
+            if outcome.get("step_id"):
+                query["step_id"] = outcome["step_id"]
+        for coll in (self.db.sequence_queue, self.db.sequence_queue_archive):
+            # the latest send is the one being replied to
+            item = await coll.find_one(query, {"_id": 0}, sort=[("sent_at", DESCENDING)])
+            if item:
+                return item
+        return None
+
+    async def record_outcomes(self, sequence_id: str, outcomes: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Label sends from reported outcomes; returns counts including newly seen replies"""
+        now = datetime.now(timezone.utc)
+        matched: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        for outcome in outcomes:
+            item = await self._find_sent(sequence_id, outcome)
+            if item:
+                matched.append((item, outcome))
+        previous = {
+            e["item_id"]: e
+            for e in await self.examples.find(
+                {"item_id": {"$in": [it["id"] for it, _ in matched]}}, {"_id": 0, "item_id": 1, "label": 1, "positive": 1}
+            ).to_list(None)
+        }
+        ops = []
+        stats = {"recorded": len(matched), "unmatched": len(outcomes) - len(matched), "new_replies": 0, "new_positive": 0}
+        for item, outcome in matched:
+            replied = bool(outcome.get("replied"))
+            positive = replied and bool(outcome.get("positive"))
+            before = previous.get(item["id"], {})
+            stats["new_replies"] += int(replied and not before.get("label"))
+            stats["new_positive"] += int(positive and not before.get("positive"))
+            # a changed label gets a new labeled_at, so the trainer sees it again
+            ops.append(UpdateOne({"item_id": item["id"]}, {"$set": self._example(item, int(replied), positive, now)}, upsert=True))
+        if ops:
+            await self.examples.bulk_write(ops, ordered=False)
+        return stats
+
+    async def label_expired(self, now: Optional[datetime] = None) -> int:
+        """Record sends older than the reply window without an outcome as negatives"""
+        now = now or datetime.now(timezone.utc)
+        until = (now - self.window).isoformat()
+        state = await self.state.find_one({"_id": "labeler"}) or {}
+        labeled = 0
+        # hot first, then archive: an item archived mid-run is still found in the second pass
+        for coll in (self.db.sequence_queue, self.db.sequence_queue_archive):
+            mark = state.get("negatives_until") or ""
+            while True:
+                items = await coll.find(
+                    {"sent_at": {"$gt": mark, "$lte": until}, "status": "sent"}, {"_id": 0}
+                ).sort("sent_at", 1).limit(self.batch_size).to_list(self.batch_size)
+                if not items:
+                    break
+                if len(items) == self.batch_size:
+                    # one scheduler batch shares a sent_at; take the whole group before moving the mark past it
+                    seen = {it["id"] for it in items}
+                    tail = await coll.find({"sent_at": items[-1]["sent_at"], "status": "sent"}, {"_id": 0}).to_list(None)
+                    items += [it for it in tail if it["id"] not in seen]
+                try:
+                    await self.examples.insert_many([self._example(it, 0, False, now) for it in items], ordered=False)
+                except BulkWriteError as e:
+                    # sends with a reported outcome already have their label
+                    if any(err.get("code") != DUPLICATE_KEY_ERROR for err in e.details.get("writeErrors", [])):
+                        raise
+                labeled += len(items)
+                mark = items[-1]["sent_at"]
+                await asyncio.sleep(0)
+        await self.state.update_one({"_id": "labeler"}, {"$set": {"negatives_until": until}}, upsert=True)
+        return labeled
+
+    async def _acquire_lease(self, seconds: float) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await self.state.find_one_and_update(
+                {"_id": "trainer", "$or": [{"holder": self.holder}, {"lease_until": {"$lt": now}}]},
+                {"$set": {"holder": self.holder, "lease_until": now + timedelta(seconds=seconds)}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # another process holds an unexpired lease
+            return False
+
+    async def _holdout(self):
+        import numpy as np
+
+        docs = await self.examples.find(
+            {"holdout": True}, {"_id": 0, "features": 1, "label": 1}
+        ).sort("labeled_at", DESCENDING).limit(self.eval_size).to_list(self.eval_size)
+        if not docs:
+            return None, None
+        return await asyncio.to_thread(lambda: (vectorize(d["features"] for d in docs), np.array([d["label"] for d in docs])))
+
+    async def train_once(self, lease_seconds: float = 600) -> Dict[str, Any]:
+        import numpy as np
+
+        if not await self._acquire_lease(lease_seconds):
+            return {"status": "skipped", "reason": "another process is training"}
+        await self.label_expired()
+        state = await self.state.find_one({"_id": "trainer"}) or {}
+        mark = state.get("trained_until") or datetime.min.replace(tzinfo=timezone.utc)
+        mark_id = state.get("trained_until_id") or ""
+        pos, neg = state.get("positives", 0), state.get("negatives", 0)
+
+        latest = await self.db.reply_models.find_one({}, {"_id": 0}, sort=[("version", DESCENDING)])
+        # continue the lineage from the newest version; rejected versions still hold what they learned
+        if latest and latest.get("model"):
+            model = await asyncio.to_thread(pickle.loads, latest["model"])
+        else:
+            model = _new_model()
+        trained = 0
+        buffer: List[Dict[str, Any]] = []
+        rng = np.random.default_rng()
+        feature_sums = np.zeros(N_FEATURES, dtype=np.float64)
+        vocabulary = set((latest or {}).get("vocabulary") or [])
+
+        def fit_chunk(chunk: List[Dict[str, Any]]) -> "np.ndarray":
+            X = vectorize(d["features"] for d in chunk)
+            model.partial_fit(X, np.array([d["label"] for d in chunk]), classes=[0, 1])
+            return X.sum(axis=0)
+
+        async def fit(rows: List[Dict[str, Any]]):
+            # replies are labeled as they come in, non-replies in bulk when the window closes;
+            # shuffling the buffer keeps either from dominating the last updates
+            order = rng.permutation(len(rows))
+            for start in range(0, len(rows), self.batch_size):
+                chunk = [rows[i] for i in order[start:start + self.batch_size]]
+                # vectorizing is as CPU-bound as the fit; neither runs on the event loop
+                feature_sums[:] += await asyncio.to_thread(fit_chunk, chunk)
+
+        while True:
+            # keyset on (labeled_at, item_id): one labeling run stamps many examples with the same time
+            docs = await self.examples.find(
+                {"holdout": False, "$or": [{"labeled_at": {"$gt": mark}}, {"labeled_at": mark, "item_id": {"$gt": mark_id}}]},
+                {"_id": 0, "item_id": 1, "features": 1, "label": 1, "labeled_at": 1},
+            ).sort([("labeled_at", 1), ("item_id", 1)]).limit(self.batch_size).to_list(self.batch_size)
+            if not docs:
+                break
+            positives = sum(d["label"] for d in docs)
+            pos += positives
+            neg += len(docs) - positives
+            buffer += docs
+            vocabulary.update(name for d in docs for name in d["features"])
+            if len(buffer) >= self.shuffle_buffer:
+                await fit(buffer)
+                buffer = []
+            trained += len(docs)
+            mark, mark_id = docs[-1]["labeled_at"], docs[-1]["item_id"]
+        if buffer:
+            await fit(buffer)
+        if not trained:
+            return {"status": "up_to_date", "serving_version": self.registry.version}
+
+        X_hold, y_hold = await self._holdout()
+        candidate = await asyncio.to_thread(_evaluate, model, X_hold, y_hold) if X_hold is not None else {"holdout_n": 0}
+        current = None
+        if self.registry.model is not None and X_hold is not None:
+            current = await asyncio.to_thread(_evaluate, self.registry.model, X_hold, y_hold)
+        promote = X_hold is None or _not_worse(candidate, current, self.tolerance)
+        # the holdout is an unbiased sample of recent sends; fall back to this round's training data
+        baseline = X_hold.mean(axis=0) if X_hold is not None else (feature_sums / trained).astype(np.float32)
+
+        version = (latest["version"] if latest else 0) + 1
+        blob = await asyncio.to_thread(pickle.dumps, model)
+        await self.db.reply_models.insert_one({
+            "version": version,
+            "created_at": datetime.now(timezone.utc),
+            "parent_version": latest["version"] if latest else None,
+            "examples": trained,
+            "metrics": candidate,
+            "serving_metrics": current,
+            "promoted": promote,
+            "model": blob,
+            "baseline": [round(float(v), 6) for v in baseline],
+            "vocabulary": sorted(vocabulary),
+        })
+        await self.state.update_one(
+            {"_id": "trainer"}, {"$set": {"trained_until": mark, "trained_until_id": mark_id, "positives": pos, "negatives": neg}}
+        )
+        if promote:
+            self.registry.swap(version, model, baseline, sorted(vocabulary))
+        await self._prune(version)
+        logger.info(f"Reply model v{version}: {trained} examples, holdout {candidate}, promoted={promote}")
+        return {"status": "trained", "version": version, "examples": trained, "metrics": candidate,
+                "serving_metrics": current, "promoted": promote}
+
+    async def _prune(self, newest: int):
+        """Drop model blobs of old versions except the one being served; their metadata stays"""
+        keep_from = newest - self.keep_versions + 1
+        await self.db.reply_models.update_many(
+            {"version": {"$lt": keep_from, "$ne": self.registry.version}, "model": {"$exists": True}},
+            {"$unset": {"model": ""}},
+        )
+
+    async def run_loop(self, interval_seconds: float):
+        while True:
+            try:
+                await self.train_once(lease_seconds=interval_seconds * 2)
+            except Exception as e:
+                logger.error(f"Reply model training error: {e}")
+            await asyncio.sleep(interval_seconds)
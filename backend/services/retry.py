@@ -0,0 +1,55 @@
+"""
+Send error classification and exponential backoff for the scheduler retry queue
+"""
+
+import random
+import smtplib
+from typing import Optional
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+
+def _classify_code(code: Optional[int]) -> str:
+    # SMTP 4xx replies are temporary by definition (RFC 5321), 5xx are not
+    if code is not None and 400 <= int(code) < 500:
+        return TRANSIENT
+    return PERMANENT
+
+
+def classify_send_error(exc: BaseException) -> str:
+    """Return TRANSIENT if the send is worth retrying, PERMANENT otherwise"""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in exc.recipients.values()]
+        if codes and all(_classify_code(c) == TRANSIENT for c in codes):
+            return TRANSIENT
+        return PERMANENT
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return _classify_code(exc.smtp_code)
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return TRANSIENT
+    if isinstance(exc, smtplib.SMTPException):
+        # e.g. SMTPNotSupportedError: the server will never accept this request
+        return PERMANENT
+    if isinstance(exc, OSError):
+        # timeouts, refused/reset connections, DNS failures
+        return TRANSIENT
+    # misconfiguration or bad input; retrying the same item will not help
+    return PERMANENT
+
+
+def backoff_delay(
+    attempt: int,
+    base_seconds: float = 60.0,
+    max_seconds: float = 6 * 3600.0,
+    rng: Optional[random.Random] = None,
+) -> float:
+    """
+    Exponential backoff with equal jitter for the given attempt (1-based).
+
+    The delay grows as base * 2**(attempt-1), capped at max_seconds; half of it
+    is randomized so retries from one burst of failures do not realign.
+    """
+    rng = rng or random
+    ceiling = min(max_seconds, base_seconds * (2 ** max(attempt - 1, 0)))
+    return ceiling / 2.0 + rng.uniform(0, ceiling / 2.0)
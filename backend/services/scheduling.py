@@ -0,0 +1,139 @@
+"""
+Timezone-aware send windows and jittered slot assignment for sequence steps
+"""
+
+import logging
+import random
+from datetime import datetime, time as dt_time, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+logger = logging.getLogger(__name__)
+
+ALL_DAYS = (0, 1, 2, 3, 4, 5, 6)
+
+
+def parse_hhmm(value: Optional[str]) -> Optional[dt_time]:
+    """Parse "HH:MM" into a time, or None if missing/invalid"""
+    if not value or not isinstance(value, str) or len(value.split(":")) != 2:
+        return None
+    try:
+        hh, mm = value.split(":")
+        return dt_time(hour=int(hh), minute=int(mm))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=512)
+def get_zone(name: Optional[str]):
+    """Resolve an IANA timezone name, falling back to UTC"""
+    if not name:
+        return timezone.utc
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown timezone {name!r}, using UTC")
+        return timezone.utc
+
+
+def _window_for_day(
+    local_day: datetime,
+    send_time: Optional[dt_time],
+    window: Optional[Dict[str, Any]],
+    spread: timedelta,
+):
+    """Return (start, end) local datetimes of the send window on `local_day`"""
+    tz = local_day.tzinfo
+    day = local_day.date()
+    window_start = parse_hhmm((window or {}).get("start"))
+    window_end = parse_hhmm((window or {}).get("end"))
+    if send_time is not None:
+        start = datetime.combine(day, send_time, tzinfo=tz)
+    elif window_start is not None:
+        start = datetime.combine(day, window_start, tzinfo=tz)
+    else:
+        start = local_day
+    if window_end is not None:
+        end = datetime.combine(day, window_end, tzinfo=tz)
+        if end <= start:
+            end = start + spread
+    else:
+        end = start + spread
+    return start, end
+
+
+def _next_window(
+    local_day: datetime,
+    not_before: datetime,
+    send_time: Optional[dt_time],
+    window: Optional[Dict[str, Any]],
+    spread: timedelta,
+):
+    """First window on an allowed weekday that has not fully elapsed"""
+    days = tuple((window or {}).get("days") or ALL_DAYS)
+    for _ in range(14):
+        if local_day.weekday() in days:
+            start, end = _window_for_day(local_day, send_time, window, spread)
+            if end > not_before:
+                return max(start, not_before), end
+        local_day = (local_day + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    # misconfigured days list; send from the earliest allowed point
+    return not_before, not_before + spread
+
+
+def step_window(
+    started_at: datetime,
+    cumulative_days: int,
+    tz_name: Optional[str],
+    send_time: Optional[dt_time] = None,
+    window: Optional[Dict[str, Any]] = None,
+    spread: timedelta = timedelta(minutes=60),
+):
+    """(start, end) of the span one step's sends are spread over, for contacts in `tz_name`"""
+    tz = get_zone(tz_name)
+    local_start = started_at.astimezone(tz)
+    local_day = local_start + timedelta(days=cumulative_days)
+    if send_time is None and not window:
+        return local_day, local_day + spread
+    return _next_window(local_day, local_start, send_time, window, spread)
+
+
+def assign_send_slots(
+    contacts: Sequence[Dict[str, Any]],
+    started_at: datetime,
+    cumulative_days: int,
+    send_time: Optional[str] = None,
+    window: Optional[Dict[str, Any]] = None,
+    default_tz: Optional[str] = None,
+    spread_minutes: int = 60,
+    rng: Optional[random.Random] = None,
+) -> List[datetime]:
+    """
+    Compute a UTC send time for every contact of one step, in bulk.
+
+    `send_time` and the business-hours `window` ({"start": "09:00", "end": "17:00",
+    "days": [0..4]}) are interpreted in each contact's own timezone (falling back
+    to `default_tz`). Contacts sharing a timezone are spread evenly across their
+    window with stratified jitter, so a large step never becomes due in the same
+    second. Slots never fall before `started_at`.
+    """
+    rng = rng or random.Random()
+    spread = timedelta(minutes=max(spread_minutes, 0))
+    send_t = parse_hhmm(send_time)
+
+    groups: Dict[str, List[int]] = {}
+    for idx, c in enumerate(contacts):
+        groups.setdefault(c.get("timezone") or default_tz or "UTC", []).append(idx)
+
+    slots: List[Optional[datetime]] = [None] * len(contacts)
+    for tz_name, indices in groups.items():
+        start, end = step_window(started_at, cumulative_days, tz_name, send_t, window, spread)
+        span = (end - start).total_seconds()
+        n = len(indices)
+        order = list(range(n))
+        rng.shuffle(order)
+        for pos, idx in zip(order, indices):
+            offset = (pos + rng.random()) / n * span if span > 0 else 0.0
+            slots[idx] = (start + timedelta(seconds=offset)).astimezone(timezone.utc)
+    return slots
@@ -0,0 +1,200 @@
+"""
+Persistent lead-score store with incremental re-scoring
+
+Scores live in the `lead_scores` collection keyed by normalized email. A
+repeat request with unchanged inputs is served from the store; when only the
+MX check has aged past its TTL, just the DNS lookup is redone. MX results are
+shared by every lead on the same domain.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from services.suppression import DUPLICATE_KEY_ERROR, normalize_email
+
+logger = logging.getLogger(__name__)
+
+INPUT_FIELDS = ("email", "domain", "linkedin_url", "title", "company")
+
+
+def lead_inputs(lead: Dict[str, Any]) -> Dict[str, Any]:
+    inputs = {k: (lead.get(k) or None) for k in INPUT_FIELDS}
+    inputs["email"] = inputs["email"] or ""
+    inputs["domain"] = (inputs["domain"] or "").strip().lower()
+    return inputs
+
+
+def input_fingerprint(inputs: Dict[str, Any]) -> str:
+    """Stable hash of everything except the MX result"""
+    payload = json.dumps([inputs.get(k) or "" for k in INPUT_FIELDS], separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class LeadScoreStore:
+    """Caches confidence scores in MongoDB and only recomputes stale components"""
+
+    def __init__(self, db, scorer_factory: Callable, mx_ttl_hours: float = 24 * 7, dns_concurrency: int = 32):
+        self.collection = db.lead_scores
+        self.scorer_factory = scorer_factory
+        self.mx_ttl = timedelta(hours=mx_ttl_hours)
+        self.dns_concurrency = dns_concurrency
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("email", unique=True)
+        await self.collection.create_index([("domain", 1), ("mx_checked_at", -1)])
+        await self.collection.create_index("mx_checked_at")
+
+    def _cutoff_iso(self) -> str:
+        return (datetime.now(timezone.utc) - self.mx_ttl).isoformat()
+
+    async def _verify_domains(self, domains: Iterable[str]) -> Dict[str, bool]:
+        scorer = self.scorer_factory()
+        sem = asyncio.Semaphore(self.dns_concurrency)
+
+        async def check(domain: str):
+            async with sem:
+                return domain, await asyncio.to_thread(scorer.verify_domain, domain)
+
+        return dict(await asyncio.gather(*(check(d) for d in set(domains) if d)))
+
+    async def _fresh_mx(self, domains: Iterable[str]) -> Dict[str, bool]:
+        """
+        Latest MX result still within TTL, taken from any lead on the same
+        domain. One `find_one` per domain reads a single `(domain,
+        mx_checked_at)` index entry, however many leads share the domain.
+        """
+        cutoff = self._cutoff_iso()
+
+        async def latest(domain: str):
+            doc = await self.collection.find_one(
+                {"domain": domain, "mx_checked_at": {"$gte": cutoff}},
+                {"_id": 0, "domain_valid": 1},
+                sort=[("mx_checked_at", -1)],
+            )
+            return domain, doc
+
+        found = await asyncio.gather(*(latest(d) for d in set(domains) if d))
+        return {domain: bool(doc.get("domain_valid")) for domain, doc in found if doc is not None}
+
+    async def score_many(self, leads: List[Dict[str, Any]], force: bool = False) -> List[Dict[str, Any]]:
+        """Score leads, reusing stored results; returns results in input order"""
+        scorer = self.scorer_factory()
+        now_iso = datetime.now(timezone.utc).isoformat()
+        cutoff = self._cutoff_iso()
+        prepared = []
+        for lead in leads:
+            inputs = lead_inputs(lead)
+            prepared.append((normalize_email(inputs["email"]), inputs, input_fingerprint(inputs)))
+
+        keys = list({key for key, _, _ in prepared if key})
+        stored: Dict[str, Dict[str, Any]] = {}
+        if keys:
+            async for doc in self.collection.find({"email": {"$in": keys}}, {"_id": 0}):
+                stored[doc["email"]] = doc
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(prepared)
+        pending = []
+        for idx, (key, inputs, fp) in enumerate(prepared):
+            doc = stored.get(key)
+            if not force and doc and doc.get("fingerprint") == fp and (not inputs["domain"] or (doc.get("mx_checked_at") or "") >= cutoff):
+                results[idx] = {**doc["result"], "cached": True}
+            else:
+                pending.append((idx, key, inputs, fp, doc))
+
+        if pending:
+            # one MX lookup per unique stale/unknown domain
+            needed = {inputs["domain"] for _, _, inputs, _, _ in pending if inputs["domain"]}
+            mx = {} if force else await self._fresh_mx(needed)
+            mx.update(await self._verify_domains(needed - set(mx)))
+            inserts, updates = [], []
+            seen_keys = set()
+            for idx, key, inputs, fp, doc in pending:
+                domain_valid = mx.get(inputs["domain"]) if inputs["domain"] else None
+                result = scorer.calculate_confidence_score(**inputs, domain_valid=domain_valid)
+                results[idx] = {**result, "cached": False}
+                if not key or key in seen_keys:
+                    continue
+                seen_keys.add(key)
+                record = {
+                    "email": key,
+                    "inputs": inputs,
+                    "fingerprint": fp,
+                    "domain": inputs["domain"],
+                    "domain_valid": domain_valid,
+                    "mx_checked_at": now_iso if inputs["domain"] else None,
+                    "result": result,
+                    "scored_at": now_iso,
+                }
+                if doc is None:
+                    inserts.append(record)
+                else:
+                    updates.append(UpdateOne({"email": key}, {"$set": record}))
+            await self._write(inserts, updates)
+        return results
+
+    async def _write(self, inserts: List[Dict[str, Any]], updates: List[UpdateOne]):
+        """Plain inserts for new emails avoid a per-document upsert lookup"""
+        if inserts:
+            try:
+                await self.collection.insert_many(inserts, ordered=False)
+            except BulkWriteError as e:
+                # a concurrent request stored the same email first; its score is equivalent
+                errors = e.details.get("writeErrors", [])
+                if any(err.get("code") != DUPLICATE_KEY_ERROR for err in errors):
+                    raise
+        if updates:
+            await self.collection.bulk_write(updates, ordered=False)
+
+    async def score(self, lead: Dict[str, Any], force: bool = False) -> Dict[str, Any]:
+        return (await self.score_many([lead], force=force))[0]
+
+    async def refresh_stale_domains(self, max_domains: int = 500) -> int:
+        """Re-verify aging domains in bulk and rescore the leads on them"""
+        scorer = self.scorer_factory()
+        cutoff = self._cutoff_iso()
+        pipeline = [
+            {"$match": {"domain": {"$nin": [None, ""]}, "mx_checked_at": {"$lt": cutoff}}},
+            {"$group": {"_id": "$domain"}},
+            {"$limit": max_domains},
+        ]
+        domains = [row["_id"] async for row in self.collection.aggregate(pipeline)]
+        if not domains:
+            return 0
+        mx = await self._verify_domains(domains)
+        now_iso = datetime.now(timezone.utc).isoformat()
+        ops = []
+        cursor = self.collection.find(
+            {"domain": {"$in": domains}, "mx_checked_at": {"$lt": cutoff}},
+            {"_id": 0, "email": 1, "inputs": 1, "domain": 1},
+        ).batch_size(1000)
+        async for doc in cursor:
+            valid = mx.get(doc["domain"], False)
+            result = scorer.calculate_confidence_score(**doc["inputs"], domain_valid=valid)
+            ops.append(UpdateOne(
+                {"email": doc["email"]},
+                {"$set": {"domain_valid": valid, "mx_checked_at": now_iso, "result": result, "scored_at": now_iso}},
+            ))
+            if len(ops) >= 1000:
+                await self.collection.bulk_write(ops, ordered=False)
+                ops = []
+        if ops:
+            await self.collection.bulk_write(ops, ordered=False)
+        logger.info(f"Refreshed MX for {len(domains)} domains")
+        return len(domains)
+
+    async def refresh_loop(self, interval_seconds: float, max_domains: int = 500):
+        while True:
+            try:
+                refreshed = await self.refresh_stale_domains(max_domains)
+                if refreshed >= max_domains:
+                    continue
+            except Exception as e:
+                logger.error(f"Lead score refresh error: {e}")
+            await asyncio.sleep(interval_seconds)
@@ -0,0 +1,71 @@
+"""
+Bridge blocking provider streams (LLM SDK iterators) into asyncio
+
+The SDK iterator runs in a daemon thread and hands chunks to the event loop
+through a queue. Callers get an async iterator that raises `StreamStalled`
+when the first chunk, or any later one, takes longer than its timeout.
+"""
+
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Iterator
+
+
+class StreamStalled(Exception):
+    """The provider produced nothing within the allowed time"""
+
+
+class _Failure:
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+_DONE = object()
+
+
+async def iterate_in_thread(
+    make_iter: Callable[[], Iterator[str]],
+    first_timeout: float,
+    stall_timeout: float,
+) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # the loop is gone (shutdown); nothing left to deliver to
+            stop.set()
+
+    def pump():
+        try:
+            for chunk in make_iter():
+                if stop.is_set():
+                    return
+                put(chunk)
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+
+    # a daemon thread, not the default executor: a hung provider must not tie up shared workers
+    threading.Thread(target=pump, name="llm-stream", daemon=True).start()
+    timeout = first_timeout
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                raise StreamStalled(f"no output for {timeout:g}s")
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+            timeout = stall_timeout
+    finally:
+        # stops the pump at its next chunk; the SDK call itself cannot be interrupted
+        stop.set()
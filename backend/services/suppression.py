@@ -0,0 +1,244 @@
+"""
+Suppression list and cross-sequence contact dedupe index
+
+Both are mirrored in memory for bulk reads (planning, stats), but MongoDB is
+the source of truth: enqueue and send-time checks read the collections, so
+suppressions and claims written by other API replicas or workers count at
+once, and the in-memory copies are corrected from what those reads return.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import AbstractSet, Dict, Iterable, List, Mapping, Optional, Set
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Bulk writes are flushed in chunks so a multi-million row import never
+# builds one giant request or holds every pending op in memory.
+WRITE_CHUNK_SIZE = 5000
+DUPLICATE_KEY_ERROR = 11000
+
+
+def normalize_email(email: Optional[str]) -> str:
+    """Normalize an email for dedupe/suppression lookups"""
+    if not email:
+        return ""
+    return str(email).strip().lower()
+
+
+class SuppressionIndex:
+    """Hash-set of suppressed emails mirrored in the `suppression_list` collection"""
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.suppression_list
+        self._emails: Set[str] = set()
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("email", unique=True)
+
+    async def load(self) -> int:
+        """Load every suppressed email into memory"""
+        emails: Set[str] = set()
+        cursor = self.collection.find({}, {"_id": 0, "email": 1}).batch_size(WRITE_CHUNK_SIZE)
+        async for doc in cursor:
+            emails.add(doc["email"])
+        self._emails = emails
+        logger.info(f"Loaded {len(emails)} suppressed emails")
+        return len(emails)
+
+    def __len__(self) -> int:
+        return len(self._emails)
+
+    def is_suppressed(self, email: Optional[str]) -> bool:
+        """In-memory answer; may lag suppressions added by other processes"""
+        return normalize_email(email) in self._emails
+
+    async def check(self, email: Optional[str]) -> bool:
+        """Authoritative lookup for one address (send time)"""
+        norm = normalize_email(email)
+        if not norm:
+            return False
+        found = await self.collection.find_one({"email": norm}, {"_id": 1}) is not None
+        if found:
+            self._emails.add(norm)
+        else:
+            self._emails.discard(norm)
+        return found
+
+    async def suppressed_among(self, emails: Iterable[str]) -> Set[str]:
+        """Which of these normalized emails are suppressed, read from MongoDB in chunks (enqueue time)"""
+        emails = list(dict.fromkeys(e for e in emails if e))
+        found: Set[str] = set()
+        for i in range(0, len(emails), WRITE_CHUNK_SIZE):
+            chunk = emails[i:i + WRITE_CHUNK_SIZE]
+            async for doc in self.collection.find({"email": {"$in": chunk}}, {"_id": 0, "email": 1}):
+                found.add(doc["email"])
+        self._emails.difference_update(set(emails) - found)
+        self._emails.update(found)
+        return found
+
+    @property
+    def emails(self) -> AbstractSet[str]:
+        """Read-only view for bulk membership tests (e.g. dry-run planning)"""
+        return self._emails
+
+    async def add_many(self, emails: Iterable[str], reason: str = "manual") -> int:
+        """Suppress emails; returns how many were not already suppressed"""
+        added = 0
+        batch: List[str] = []
+        pending: Set[str] = set()
+        for email in emails:
+            norm = normalize_email(email)
+            if not norm or norm in self._emails or norm in pending:
+                continue
+            pending.add(norm)
+            batch.append(norm)
+            if len(batch) >= WRITE_CHUNK_SIZE:
+                added += await self._persist(batch, reason)
+                pending.clear()
+                batch = []
+        if batch:
+            added += await self._persist(batch, reason)
+        return added
+
+    async def _persist(self, batch: List[str], reason: str) -> int:
+        now_iso = datetime.now(timezone.utc).isoformat()
+        ops = [
+            UpdateOne(
+                {"email": e},
+                {"$setOnInsert": {"email": e, "reason": reason, "created_at": now_iso}},
+                upsert=True,
+            )
+            for e in batch
+        ]
+        await self.collection.bulk_write(ops, ordered=False)
+        self._emails.update(batch)
+        # pull already-queued sends for these recipients out of the scheduler's way
+        await self.db.sequence_queue.update_many(
+            {"email_norm": {"$in": batch}, "status": {"$in": ["pending", "pending_paused"]}},
+            {"$set": {"status": "suppressed", "last_error": "Recipient suppressed", "failed_at": now_iso}},
+        )
+        return len(batch)
+
+    async def remove(self, email: str) -> bool:
+        norm = normalize_email(email)
+        res = await self.collection.delete_one({"email": norm})
+        self._emails.discard(norm)
+        return bool(res.deleted_count)
+
+
+class ContactClaimIndex:
+    """Tracks which sequence currently owns each contact email"""
+
+    def __init__(self, db):
+        self.collection = db.contact_claims
+        self._owners: Dict[str, str] = {}
+        self._by_sequence: Dict[str, Set[str]] = {}
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("email", unique=True)
+        await self.collection.create_index("sequence_id")
+
+    async def load(self) -> int:
+        self._owners = {}
+        self._by_sequence = {}
+        cursor = self.collection.find({}, {"_id": 0, "email": 1, "sequence_id": 1}).batch_size(WRITE_CHUNK_SIZE)
+        async for doc in cursor:
+            self._remember(doc["email"], doc["sequence_id"])
+        logger.info(f"Loaded {len(self._owners)} contact claims")
+        return len(self._owners)
+
+    def _remember(self, email: str, sequence_id: str):
+        previous = self._owners.get(email)
+        if previous is not None and previous != sequence_id:
+            self._by_sequence.get(previous, set()).discard(email)
+        self._owners[email] = sequence_id
+        self._by_sequence.setdefault(sequence_id, set()).add(email)
+
+    def _forget(self, email: str):
+        previous = self._owners.pop(email, None)
+        if previous is not None:
+            self._by_sequence.get(previous, set()).discard(email)
+
+    def owner(self, email: Optional[str]) -> Optional[str]:
+        """In-memory answer; may lag claims made or released by other processes"""
+        return self._owners.get(normalize_email(email))
+
+    async def current_owner(self, email: Optional[str]) -> Optional[str]:
+        norm = normalize_email(email)
+        if not norm:
+            return None
+        doc = await self.collection.find_one({"email": norm}, {"_id": 0, "sequence_id": 1})
+        if doc:
+            self._remember(norm, doc["sequence_id"])
+            return doc["sequence_id"]
+        self._forget(norm)
+        return None
+
+    @property
+    def owners(self) -> Mapping[str, str]:
+        """Normalized email -> owning sequence, read-only"""
+        return self._owners
+
+    async def claim_many(self, emails: Iterable[str], sequence_id: str) -> Set[str]:
+        """
+        Claim normalized emails for a sequence.
+
+        Returns the subset now owned by `sequence_id`; emails owned by another
+        sequence (here or in another process) are left out. Existing claims are
+        read from MongoDB per chunk, so the in-memory map never decides.
+        """
+        emails = list(dict.fromkeys(emails))
+        owned: Set[str] = set()
+        now_iso = datetime.now(timezone.utc).isoformat()
+        for i in range(0, len(emails), WRITE_CHUNK_SIZE):
+            chunk = emails[i:i + WRITE_CHUNK_SIZE]
+            current = {
+                doc["email"]: doc["sequence_id"]
+                async for doc in self.collection.find({"email": {"$in": chunk}}, {"_id": 0, "email": 1, "sequence_id": 1})
+            }
+            for email in chunk:
+                if email in current:
+                    self._remember(email, current[email])
+                else:
+                    self._forget(email)
+            owned.update(e for e, sid in current.items() if sid == sequence_id)
+            new_claims = [e for e in chunk if e not in current]
+            if not new_claims:
+                continue
+            docs = [{"email": e, "sequence_id": sequence_id, "claimed_at": now_iso} for e in new_claims]
+            lost: Set[int] = set()
+            try:
+                await self.collection.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                lost = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") == DUPLICATE_KEY_ERROR}
+                if len(lost) != len(e.details.get("writeErrors", [])):
+                    raise
+            for idx, email in enumerate(new_claims):
+                if idx not in lost:
+                    self._remember(email, sequence_id)
+                    owned.add(email)
+            if lost:
+                # claimed concurrently elsewhere; cache the winning owner
+                taken = [new_claims[idx] for idx in lost]
+                async for doc in self.collection.find({"email": {"$in": taken}}, {"_id": 0}):
+                    self._remember(doc["email"], doc["sequence_id"])
+                    if doc["sequence_id"] == sequence_id:
+                        owned.add(doc["email"])
+        return owned
+
+    async def release(self, email: str, sequence_id: str):
+        """Release one contact once its last step in `sequence_id` is done"""
+        await self.collection.delete_one({"email": email, "sequence_id": sequence_id})
+        if self._owners.get(email) == sequence_id:
+            self._forget(email)
+
+    async def release_sequence(self, sequence_id: str):
+        await self.collection.delete_many({"sequence_id": sequence_id})
+        for email in self._by_sequence.pop(sequence_id, set()):
+            if self._owners.get(email) == sequence_id:
+                del self._owners[email]
@@ -0,0 +1,141 @@
+"""
+Standalone scheduler worker
+
+Runs only the dispatch loop, so sending scales (and fails) independently of
+the API. Run the API with SCHEDULER_ENABLED=false when using this.
+
+    python worker.py --batch-size 100 --concurrency 8 --health-port 8081
+"""
+
+import asyncio
+import logging
+import os
+import signal
+from datetime import datetime, timezone
+
+import typer
+import uvicorn
+from fastapi import FastAPI, Response
+
+import server
+from server import (
+    client,
+    domain_enrich_interval,
+    domain_enricher,
+    init_storage,
+    lead_score_refresh_seconds,
+    lead_score_store,
+    queue_archive_interval,
+    queue_archiver,
+    reply_train_interval,
+    reply_trainer,
+    scheduler_loop,
+    scheduler_state,
+)
+from services import metrics
+
+logger = logging.getLogger("worker")
+
+cli = typer.Typer(help="Run the sequence scheduler without the API")
+
+
+def build_health_app(interval: float) -> FastAPI:
+    health = FastAPI(title="scheduler-worker")
+
+    @health.get("/healthz")
+    async def healthz(response: Response):
+        last = scheduler_state.get("last_iteration_at")
+        stale = False
+        if last:
+            age = (datetime.now(timezone.utc) - datetime.fromisoformat(last)).total_seconds()
+            # the loop sleeps `interval` between batches; allow a few missed beats
+            stale = age > max(interval * 3, 60)
+        if stale or scheduler_state.get("draining"):
+            response.status_code = 503
+        return {"status": "draining" if scheduler_state.get("draining") else ("stale" if stale else "ok"), **scheduler_state}
+
+    @health.get("/metrics")
+    async def worker_metrics():
+        body, content_type = metrics.render_latest()
+        return Response(content=body, media_type=content_type)
+
+    return health
+
+
+async def run_worker(batch_size: int, concurrency: int, interval: float, health_port: int, drain_timeout: float):
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def request_stop(signame: str):
+        if not stop_event.is_set():
+            logger.info(f"{signame} received, draining in-flight sends")
+            scheduler_state["draining"] = True
+            stop_event.set()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, request_stop, sig.name)
+
+    await init_storage()
+
+    health_server = None
+    health_task = None
+    if health_port:
+        config = uvicorn.Config(build_health_app(interval), host="0.0.0.0", port=health_port, log_level="warning")
+        health_server = uvicorn.Server(config)
+        # signals are handled above; keep uvicorn from replacing our handlers
+        health_server.install_signal_handlers = lambda: None
+        health_task = asyncio.create_task(health_server.serve())
+
+    logger.info(f"Scheduler worker started (batch_size={batch_size}, concurrency={concurrency}, interval={interval}s)")
+    loop_task = asyncio.create_task(scheduler_loop(stop_event, batch_size, concurrency, interval))
+    background = []
+    if queue_archive_interval > 0:
+        background.append(asyncio.create_task(queue_archiver.run_loop(queue_archive_interval)))
+    if reply_train_interval > 0:
+        background.append(asyncio.create_task(reply_trainer.run_loop(reply_train_interval)))
+    if domain_enrich_interval > 0:
+        background.append(asyncio.create_task(domain_enricher.run_loop(domain_enrich_interval)))
+    if lead_score_refresh_seconds > 0:
+        background.append(asyncio.create_task(lead_score_store.refresh_loop(lead_score_refresh_seconds)))
+    await stop_event.wait()
+    try:
+        await asyncio.wait_for(loop_task, timeout=drain_timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Drain exceeded {drain_timeout}s, cancelling remaining sends")
+        loop_task.cancel()
+        try:
+            await loop_task
+        except asyncio.CancelledError:
+            pass
+    for task in background:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    await domain_enricher.close()
+
+    if health_server is not None:
+        health_server.should_exit = True
+        await health_task
+    client.close()
+    logger.info("Scheduler worker stopped")
+
+
+@cli.command()
+def run(
+    batch_size: int = typer.Option(int(os.getenv("SCHEDULER_BATCH_SIZE", "50")), help="Items claimed per iteration"),
+    concurrency: int = typer.Option(int(os.getenv("SCHEDULER_CONCURRENCY", "1")), help="Sends in flight at once"),
+    interval: float = typer.Option(float(os.getenv("SCHEDULER_INTERVAL_SECONDS", "30")), help="Seconds between idle polls"),
+    health_port: int = typer.Option(int(os.getenv("WORKER_HEALTH_PORT", "8081")), help="Port for /healthz and /metrics (0 disables)"),
+    drain_timeout: float = typer.Option(float(os.getenv("WORKER_DRAIN_TIMEOUT", "60")), help="Max seconds to finish in-flight sends on SIGTERM"),
+):
+    """Run the dispatch loop until SIGTERM/SIGINT"""
+    if server.scheduler_enabled:
+        logger.warning("SCHEDULER_ENABLED is not false; API replicas may also be dispatching")
+    asyncio.run(run_worker(batch_size, concurrency, interval, health_port, drain_timeout))
+
+
+if __name__ == "__main__":
+    cli()
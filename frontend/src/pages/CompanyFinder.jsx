@@ -15,14 +15,33 @@ const CompanyFinder = () => {
   const [results, setResults] = useState([]);
   const [hasSearched, setHasSearched] = useState(false);
 
-  const handleSearch = () => {
-    // Filter mock companies based on search params
-    const filtered = mockCompanies.filter((company) => {
+  const backend = process.env.REACT_APP_BACKEND_URL;
+
+  const filterMock = () =>
+    mockCompanies.filter((company) => {
       const matchesIndustry = !searchParams.industry || company.industry.toLowerCase().includes(searchParams.industry.toLowerCase());
       const matchesLocation = !searchParams.location || company.location.toLowerCase().includes(searchParams.location.toLowerCase());
       return matchesIndustry && matchesLocation;
     });
-    setResults(filtered);
+
+  const handleSearch = async () => {
+    // Server-side full-text search; falls back to the bundled sample data if the API is unreachable
+    const q = [searchParams.industry, searchParams.location].filter(Boolean).join(' ');
+    try {
+      const res = await fetch(`${backend}/api/companies?${new URLSearchParams({ q, page_size: '50' })}`);
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const data = await res.json();
+      setResults(
+        data.items.map((c) => ({
+          ...c,
+          employeeCount: c.employee_count,
+          confidence: Math.round(c.confidence || 0),
+        }))
+      );
+    } catch (e) {
+      console.error(e);
+      setResults(filterMock());
+    }
     setHasSearched(true);
   };
 
@@ -44,10 +44,10 @@ const EmailGenerator = () => {
       const company = mockCompanies.find((c) => c.id === contact?.companyId);
 
       if (contact && company) {
-        // Try to call the AI backend API
+        // Stream from the AI backend so text appears as the model writes it
         try {
           const response = await fetch(
-            `${process.env.REACT_APP_BACKEND_URL}/api/ai/generate-content`,
+            `${process.env.REACT_APP_BACKEND_URL}/api/ai/generate-content/stream`,
             {
               method: "POST",
               headers: {
@@ -66,18 +66,45 @@ const EmailGenerator = () => {
             }
           );
 
-          if (response.ok) {
-            const data = await response.json();
-            console.log("AI Response:", data);
-            setSubject(data.subject || "");
-            setBody(data.content);
-            toast({
-              title: "✨ AI Content Generated!",
-              description: `Created ${channel} content with ${tone} tone`,
-            });
-          } else {
+          if (!response.ok || !response.body) {
             throw new Error("API call failed");
           }
+
+          setSubject("");
+          setBody("");
+          const reader = response.body.getReader();
+          const decoder = new TextDecoder();
+          let buffer = "";
+          let finished = false;
+          while (!finished) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            // SSE events are separated by a blank line
+            let sep;
+            while ((sep = buffer.indexOf("\n\n")) !== -1) {
+              const block = buffer.slice(0, sep);
+              buffer = buffer.slice(sep + 2);
+              const event = (block.match(/^event: (.*)$/m) || [])[1];
+              const dataLine = (block.match(/^data: (.*)$/m) || [])[1];
+              if (!event || !dataLine) continue;
+              const data = JSON.parse(dataLine);
+              if (event === "subject") {
+                setSubject(data.text);
+              } else if (event === "content") {
+                setBody((prev) => prev + data.text);
+              } else if (event === "done" || event === "fallback") {
+                // the final event carries the complete text; fallback replaces a stalled stream
+                setSubject(data.subject || "");
+                setBody(data.content);
+                finished = true;
+              }
+            }
+          }
+          toast({
+            title: "✨ AI Content Generated!",
+            description: `Created ${channel} content with ${tone} tone`,
+          });
         } catch (apiError) {
           console.log("API not available, using fallback generation");
           // Fallback to template-based generation
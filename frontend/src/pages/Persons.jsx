@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useEffect, useState } from "react";
 import { Card, CardContent } from "../components/ui/card";
 import { Button } from "../components/ui/button";
 import { Input } from "../components/ui/input";
@@ -25,8 +25,47 @@ import {
 const Persons = () => {
   const [searchTerm, setSearchTerm] = useState("");
   const [contacts, setContacts] = useState(mockContacts);
+  const backend = process.env.REACT_APP_BACKEND_URL;
 
-  const getCompanyName = (companyId) => {
+  // Server-side search (debounced); the sample contacts stay until the API has data
+  useEffect(() => {
+    const timer = setTimeout(async () => {
+      try {
+        const params = new URLSearchParams({ page_size: "50" });
+        if (searchTerm) params.set("q", searchTerm);
+        const res = await fetch(`${backend}/api/persons?${params}`);
+        if (!res.ok) return;
+        const data = await res.json();
+        if (!data.total && !searchTerm) return;
+        setContacts(
+          data.items.map((p) => ({
+            id: p.id,
+            companyId: p.company_id,
+            companyName: p.company,
+            name: p.name,
+            title: p.title || "",
+            email: p.email || "",
+            linkedin: p.linkedin_url,
+            phone: p.phone,
+            emailVerified: p.confidence_status === "Valid",
+            confidenceScore: Math.round(p.confidence_score || 0),
+            confidenceReason: "",
+            verificationStatus: p.confidence_status,
+            engagementScore: Math.round(p.engagement_score || 0),
+            potentialLabel:
+              p.confidence_score >= 80 ? "High" : p.confidence_score >= 50 ? "Medium" : "Low",
+            linkedinActivity: 0,
+          }))
+        );
+      } catch (e) {
+        console.error(e);
+      }
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [searchTerm, backend]);
+
+  const getCompanyName = (companyId, companyName) => {
+    if (companyName) return companyName;
     const company = mockCompanies.find((c) => c.id === companyId);
     return company ? company.name : "Unknown Company";
   };
@@ -121,7 +160,7 @@ const Persons = () => {
                             {contact.title}
                           </p>
                           <p className="text-gray-500 text-sm">
-                            {getCompanyName(contact.companyId)}
+                            {getCompanyName(contact.companyId, contact.companyName)}
                           </p>
                         </div>
                         <div className="flex items-center gap-2 flex-wrap justify-end">
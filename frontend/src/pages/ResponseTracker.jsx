@@ -38,32 +38,63 @@ const ResponseTracker = () => {
   });
   const backend = process.env.REACT_APP_BACKEND_URL;
   useEffect(() => {
+    const applySummary = (sum) => {
+      setTrackerData({
+        totalSent: sum.sent || 0,
+        opened: sum.opened || 0,
+        replied: sum.replied || 0,
+        positive: sum.positive || 0,
+        // still use placeholders for these until backend tracks them
+        neutral: 0,
+        negative: 0,
+        bounced: 0,
+        highEngagement: 0,
+      });
+    };
+
+    // one stream instead of polling: a snapshot first, then deltas as sends/replies are recorded
+    let source = null;
+    const connect = () => {
+      source = new EventSource(`${backend}/api/tracker/stream`);
+      source.addEventListener("snapshot", (e) => {
+        const data = JSON.parse(e.data);
+        applySummary(data.summary || {});
+      });
+      source.addEventListener("metrics", (e) => {
+        const { delta } = JSON.parse(e.data);
+        setTrackerData((prev) => ({
+          ...prev,
+          totalSent: prev.totalSent + (delta.sent || 0),
+          opened: prev.opened + (delta.opened || 0),
+          replied: prev.replied + (delta.replied || 0),
+          positive: prev.positive + (delta.positive || 0),
+        }));
+      });
+      source.addEventListener("resync", () => {
+        // we fell behind; reconnecting delivers a fresh snapshot
+        source.close();
+        connect();
+      });
+    };
+
     const load = async () => {
       try {
         const res = await fetch(`${backend}/api/tracker/summary`);
         const data = await res.json();
-        const sum = data.summary || {
-          sent: 0,
-          opened: 0,
-          replied: 0,
-          positive: 0,
-        };
-        setTrackerData({
-          totalSent: sum.sent || 0,
-          opened: sum.opened || 0,
-          replied: sum.replied || 0,
-          positive: sum.positive || 0,
-          // still use placeholders for these until backend tracks them
-          neutral: 0,
-          negative: 0,
-          bounced: 0,
-          highEngagement: 0,
-        });
+        applySummary(data.summary || {});
       } catch (e) {
         console.error(e);
       }
     };
-    load();
+
+    if (typeof EventSource !== "undefined") {
+      connect();
+    } else {
+      load();
+    }
+    return () => {
+      if (source) source.close();
+    };
   }, []);
 
   const responses = [
@@ -0,0 +1,189 @@
+"""Domain probes against a local HTTP stand-in server"""
+
+import asyncio
+import ipaddress
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from services import enrichment
+from services.enrichment import DomainEnricher
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Answers from `routes`: path -> (status, headers); unknown paths are 404"""
+
+    routes = {}
+    connections = 0
+    requests = []
+
+    def setup(self):
+        type(self).connections += 1
+        super().setup()
+
+    def _answer(self):
+        type(self).requests.append((self.command, self.path))
+        status, headers = self.routes.get((self.command, self.path), self.routes.get(self.path, (404, {})))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_HEAD = do_GET = _answer
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    StandIn.routes, StandIn.connections, StandIn.requests = {}, 0, []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def make_enricher(**kwargs):
+    db = AsyncMongoMockClient()["enrichment_test"]
+    return DomainEnricher(db, lambda domain: True, timeout_seconds=2, connect_timeout_seconds=1, **kwargs)
+
+
+@pytest.mark.anyio
+async def test_probe_reports_a_live_site(site):
+    StandIn.routes = {"/": (200, {})}
+    enricher = make_enricher(allow_private=True)
+    try:
+        result = (await enricher.enrich([f"http://www.127.0.0.1:{site}/about"]))[f"127.0.0.1:{site}"]
+    finally:
+        await enricher.close()
+    assert result["mx_valid"] is True
+    assert result["website_status"] is True
+    assert result["website_http_status"] == 200
+    assert result["website_url"] == f"http://127.0.0.1:{site}"
+    assert ("HEAD", "/") in StandIn.requests
+
+
+@pytest.mark.anyio
+async def test_head_not_allowed_falls_back_to_get(site):
+    StandIn.routes = {("HEAD", "/"): (405, {}), ("GET", "/"): (403, {})}
+    enricher = make_enricher(allow_private=True)
+    try:
+        result = (await enricher.enrich([f"127.0.0.1:{site}"]))[f"127.0.0.1:{site}"]
+    finally:
+        await enricher.close()
+    # turned away, but the site exists
+    assert result["website_status"] is True
+    assert result["website_http_status"] == 403
+    assert StandIn.requests[-2:] == [("HEAD", "/"), ("GET", "/")]
+
+
+@pytest.mark.anyio
+async def test_private_targets_are_never_contacted(site):
+    enricher = make_enricher()
+    try:
+        results = await enricher.enrich([f"127.0.0.1:{site}", f"localhost:{site}"])
+    finally:
+        await enricher.close()
+    for result in results.values():
+        assert result["website_status"] is False
+        assert result["website_error"] == "http: BlockedAddressError"
+    assert StandIn.connections == 0
+
+
+@pytest.mark.anyio
+async def test_every_redirect_target_is_checked(site, monkeypatch):
+    # let this test's stand-in through, nothing else that is private
+    monkeypatch.setattr(enrichment, "is_public_address", lambda address: ipaddress.ip_address(address).is_loopback)
+    StandIn.routes = {
+        "/": (301, {"Location": "/landing"}),
+        "/landing": (200, {}),
+        "/metadata": (302, {"Location": "http://169.254.169.254/latest/meta-data/"}),
+    }
+    enricher = make_enricher()
+    try:
+        followed = await enricher._request("HEAD", f"http://localhost:{site}/")
+        assert followed.status_code == 200
+        assert str(followed.url) == f"http://localhost:{site}/landing"
+
+        with pytest.raises(enrichment.BlockedAddressError):
+            await enricher._request("HEAD", f"http://localhost:{site}/metadata")
+    finally:
+        await enricher.close()
+
+
+@pytest.mark.anyio
+async def test_redirect_loops_stop(site):
+    StandIn.routes = {"/": (302, {"Location": "/"})}
+    enricher = make_enricher(allow_private=True)
+    try:
+        result = (await enricher.enrich([f"127.0.0.1:{site}"]))[f"127.0.0.1:{site}"]
+    finally:
+        await enricher.close()
+    assert result["website_status"] is False
+    assert result["website_error"] == "http: TooManyRedirects"
+    # the https attempt fails at the handshake; plain http gets the first request plus MAX_REDIRECTS hops
+    assert len(StandIn.requests) == enrichment.MAX_REDIRECTS + 1
+
+
+@pytest.mark.anyio
+async def test_unusable_domains_are_stamped_so_passes_make_progress():
+    enricher = make_enricher(allow_private=True)
+    db_persons = enricher.targets[0]
+    await db_persons.insert_many([{"id": "1", "domain": "https://"}, {"id": "2", "domain": "www."}])
+    passes = []
+    for _ in range(3):
+        passes.append(await enricher.enrich_pending(max_domains=1))
+    assert passes == [{"domains": 1, "updated": 1}, {"domains": 1, "updated": 1}, {"domains": 0, "updated": 0}]
+    stamped = await db_persons.find({}, {"_id": 0}).to_list(None)
+    assert all(doc["enriched_at"] and doc["mx_valid"] is False for doc in stamped)
+
+
+@pytest.mark.anyio
+async def test_connections_go_to_the_checked_address(site, monkeypatch):
+    monkeypatch.setattr(enrichment, "is_public_address", lambda address: ipaddress.ip_address(address).is_loopback)
+    StandIn.routes = {"/": (200, {})}
+    loop = asyncio.get_running_loop()
+    lookups = []
+    real_getaddrinfo = loop.getaddrinfo
+
+    async def getaddrinfo(host, *args, **kwargs):
+        # the name only resolves through the check; a second lookup at connect time would fail
+        if host == "rebind.test":
+            lookups.append(host)
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", 0))]
+        return await real_getaddrinfo(host, *args, **kwargs)
+
+    monkeypatch.setattr(loop, "getaddrinfo", getaddrinfo)
+    enricher = make_enricher()
+    try:
+        response = await enricher._request("HEAD", f"http://rebind.test:{site}/")
+    finally:
+        await enricher.close()
+    assert response.status_code == 200
+    assert lookups == ["rebind.test"]
+
+
+@pytest.mark.anyio
+async def test_uncached_domains_can_be_probed_in_the_background(site):
+    StandIn.routes = {"/": (200, {})}
+    enricher = make_enricher(allow_private=True)
+    domain = f"127.0.0.1:{site}"
+    try:
+        assert await enricher.enrich([domain], wait=False) == {}
+        await asyncio.gather(*enricher._background)
+        cached = await enricher.enrich([domain], wait=False)
+    finally:
+        await enricher.close()
+    assert cached[domain]["website_status"] is True
@@ -0,0 +1,119 @@
+"""Streaming content generation with the offline `fake` provider"""
+
+import json
+
+import httpx
+import pytest
+
+from benchmarks import harness
+
+REQUEST = {
+    "recipient_name": "Ada Lovelace",
+    "company": "Analytical Engines",
+    "role": "CTO",
+    "industry": "Technology",
+    "product_info": "lead scoring",
+}
+
+
+@pytest.fixture(scope="module")
+def server():
+    harness.configure_environment()
+    module, _ = harness.load_server()
+    return module
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def stream(server, payload):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/api/ai/generate-content/stream", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    return parse_sse(response.text)
+
+
+def test_splitter_emits_subject_then_body_across_chunk_boundaries():
+    from services.ai_services import SubjectBodySplitter
+
+    splitter = SubjectBodySplitter("email", "Fallback")
+    events = []
+    for chunk in ["Subject: Quick", " question\n", "\nHi Ada,", " more"]:
+        events += splitter.feed(chunk)
+    events += splitter.finish()
+    assert events == [("subject", "Quick question"), ("content", "Hi Ada,"), ("content", " more")]
+    assert splitter.result("friendly") == {"subject": "Quick question", "content": "Hi Ada, more", "length": 12, "tone": "friendly"}
+
+
+def test_splitter_falls_back_without_a_blank_line():
+    from services.ai_services import SubjectBodySplitter
+
+    splitter = SubjectBodySplitter("email", "Fallback")
+    assert splitter.feed("no subject line here") == []
+    assert splitter.finish() == [("subject", "Fallback"), ("content", "no subject line here")]
+
+    long_text = "x" * (SubjectBodySplitter.MAX_SUBJECT_CHARS + 1)
+    splitter = SubjectBodySplitter("email", "Fallback")
+    assert splitter.feed(long_text) == [("subject", "Fallback"), ("content", long_text)]
+
+
+def test_splitter_passes_linkedin_text_straight_through():
+    from services.ai_services import SubjectBodySplitter
+
+    splitter = SubjectBodySplitter("linkedin", "Fallback")
+    assert splitter.feed("Hi\n\nthere") == [("content", "Hi\n\nthere")]
+    assert splitter.finish() == []
+    assert splitter.result("casual")["subject"] == ""
+
+
+@pytest.mark.anyio
+async def test_stream_route_matches_the_non_streaming_result(server):
+    from services import metrics
+
+    timed = metrics.AI_ROUTE_SECONDS["generate-content-stream"]
+    before = timed._sum.get()
+    events = await stream(server, REQUEST)
+
+    names = [name for name, _ in events]
+    assert names[0] == "subject"
+    assert names[-1] == "done"
+    assert set(names[1:-1]) == {"content"}
+    done = events[-1][1]
+    assert done["provider"] == "fake"
+    assert done["subject"] == events[0][1]["text"]
+    assert done["content"] == "".join(data["text"] for name, data in events if name == "content")
+    assert timed._sum.get() > before
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        plain = (await client.post("/api/ai/generate-content", json=REQUEST)).json()
+    assert (plain["subject"], plain["content"]) == (done["subject"], done["content"])
+
+
+@pytest.mark.anyio
+async def test_stream_route_falls_back_to_the_template_on_provider_errors(server, monkeypatch):
+    from services.ai_services import get_content_generator
+
+    def broken(**kwargs):
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(get_content_generator(), "stream_email_content", broken)
+    events = await stream(server, REQUEST)
+
+    assert [name for name, _ in events] == ["fallback"]
+    fallback = events[0][1]
+    assert fallback["provider"] == "template"
+    assert "provider down" in fallback["reason"]
+    assert fallback["subject"] and fallback["content"]